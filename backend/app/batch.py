@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Variables d'environnement chargées avant les modules internes qui lisent leur configuration à l'import
+load_dotenv()
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.database import SessionLocal, engine
+from app.fiche import (
+    CHAMPS_PRODUIT, FORMAT_REPONSE, FUSION_MODEL, FUSION_PROMPT_VERSION, FUSION_SYSTEM_PROMPT,
+    extraire_fiche, rendre_fiche,
+)
+from app.gateway import Passerelle
+from app.migrations import migrer
+
+# Ré-analyse hors ligne des produits existants par l'API Batch d'OpenAI (coût réduit, délai 24 h) :
+#   python -m app.batch preparer   fichiers JSONL seulement (contrôle avant envoi)
+#   python -m app.batch lancer     préparation, envoi, suivi puis écriture des résultats
+#   python -m app.batch suivre ID  reprise d'un batch déjà soumis
+# Serveur de test local : uvicorn app.batch_stub:app --port 8089 puis OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+
+# ========== CONFIGURATION ==========
+
+BATCH_DIR = os.getenv("OBJEX_BATCH_DIR", "batch_data")
+BATCH_MAX_REQUETES = int(os.getenv("OBJEX_BATCH_MAX_REQUETES", "50000"))  # ➡️ Limite OpenAI par fichier
+BATCH_MAX_OCTETS = int(os.getenv("OBJEX_BATCH_MAX_OCTETS", str(190 * 1024 * 1024)))  # ➡️ Limite : 200 Mo
+BATCH_LECTURE = 1000  # ➡️ Produits lus par requête SQL
+BATCH_ECRITURE = int(os.getenv("OBJEX_BATCH_ECRITURE", "1000"))  # ➡️ Résultats appliqués par commit
+BATCH_POLL_MIN = float(os.getenv("OBJEX_BATCH_POLL_MIN", "10"))
+BATCH_POLL_MAX = float(os.getenv("OBJEX_BATCH_POLL_MAX", "300"))
+BATCH_FENETRE = "24h"
+BATCH_STATUTS_FINAUX = ("completed", "failed", "expired", "cancelled")
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Colonnes de product_analyses renseignées pour chaque ré-analyse
+CHAMPS_ANALYSE = ("marque", "modele", "puissance", "numero_serie")
+
+
+# ========== PRÉPARATION DES FICHIERS JSONL ==========
+
+def requete_batch(product) -> dict:
+    # Même prompt et même format que la fusion interactive ; les indices d'origine sont dans resume_ia
+    return {
+        "custom_id": f"product-{product.id}",
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": FUSION_MODEL,
+            "messages": [
+                {"role": "system", "content": FUSION_SYSTEM_PROMPT},
+                {"role": "user", "content": product.resume_ia},
+            ],
+            "response_format": FORMAT_REPONSE,
+        },
+    }
+
+
+def produits_a_reanalyser(db: Session, depuis_id: int = 0, limite: Optional[int] = None) -> Iterator:
+    # Parcours par clé (id croissant) : mémoire constante quelle que soit la taille de la table
+    curseur = depuis_id
+    restant = limite
+    while restant is None or restant > 0:
+        taille = BATCH_LECTURE if restant is None else min(BATCH_LECTURE, restant)
+        lot = (
+            db.query(models.Product.id, models.Product.resume_ia)
+            .filter(models.Product.id > curseur, models.Product.resume_ia.isnot(None), models.Product.resume_ia != "")
+            .order_by(models.Product.id)
+            .limit(taille)
+            .all()
+        )
+        if not lot:
+            return
+        yield from lot
+        curseur = lot[-1].id
+        if restant is not None:
+            restant -= len(lot)
+
+
+def preparer_fichiers(db: Session, dossier: str, depuis_id: int = 0, limite: Optional[int] = None) -> List[Tuple[str, int]]:
+    # Découpe en fichiers respectant les limites de l'API Batch ; renvoie [(chemin, nombre de requêtes)]
+    os.makedirs(dossier, exist_ok=True)
+    fichiers = []
+    sortie = None
+    nombre = octets = 0
+
+    try:
+        for product in produits_a_reanalyser(db, depuis_id, limite):
+            ligne = (json.dumps(requete_batch(product), ensure_ascii=False) + "\n").encode("utf-8")
+            if sortie is None or nombre >= BATCH_MAX_REQUETES or octets + len(ligne) > BATCH_MAX_OCTETS:
+                if sortie is not None:
+                    sortie.close()
+                    fichiers[-1] = (fichiers[-1][0], nombre)
+                chemin = os.path.join(dossier, f"requetes-{len(fichiers) + 1:04d}.jsonl")
+                sortie = open(chemin, "wb")
+                fichiers.append((chemin, 0))
+                nombre = octets = 0
+            sortie.write(ligne)
+            nombre += 1
+            octets += len(ligne)
+    finally:
+        if sortie is not None:
+            sortie.close()
+            fichiers[-1] = (fichiers[-1][0], nombre)
+
+    return fichiers
+
+
+# ========== SOUMISSION ET SUIVI ==========
+
+async def soumettre(passerelle: Passerelle, chemin: str):
+    client = passerelle.client
+    with open(chemin, "rb") as f:
+        fichier = await passerelle.appeler(client.files.create, idempotent=False, file=f, purpose="batch")
+    return await passerelle.appeler(
+        client.batches.create,
+        idempotent=False,
+        input_file_id=fichier.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_FENETRE,
+        metadata={"objex": "reanalyse", "prompt_version": FUSION_PROMPT_VERSION},
+    )
+
+
+async def attendre(passerelle: Passerelle, batch_id: str):
+    # Un batch prend de quelques minutes à 24 h : intervalle de polling croissant, borné
+    intervalle = BATCH_POLL_MIN
+    while True:
+        batch = await passerelle.appeler(passerelle.client.batches.retrieve, batch_id)
+        compteurs = batch.request_counts
+        if compteurs is not None:
+            print(f"Batch {batch_id} : {batch.status} ({compteurs.completed}/{compteurs.total}, {compteurs.failed} en échec)")
+        else:
+            print(f"Batch {batch_id} : {batch.status}")
+        if batch.status in BATCH_STATUTS_FINAUX:
+            return batch
+        await asyncio.sleep(intervalle)
+        intervalle = min(intervalle * 1.5, BATCH_POLL_MAX)
+
+
+# ========== ÉCRITURE DES RÉSULTATS ==========
+
+def lire_resultats(texte: str) -> Iterator[Tuple[int, Optional[str]]]:
+    # Lignes de sortie de l'API Batch → (id produit, contenu de la réponse ou None si la requête a échoué)
+    for ligne in texte.splitlines():
+        if not ligne.strip():
+            continue
+        resultat = json.loads(ligne)
+        product_id = int(resultat["custom_id"].removeprefix("product-"))
+        reponse = resultat.get("response") or {}
+        if resultat.get("error") or reponse.get("status_code") != 200:
+            yield product_id, None
+            continue
+        yield product_id, reponse["body"]["choices"][0]["message"]["content"]
+
+
+def reference_analyse(batch_id: str, product_id: int) -> str:
+    # Clé (batch, produit) de la ligne product_analyses : rend l'application du batch rejouable
+    return f"batch:{batch_id}:product-{product_id}"
+
+
+def appliquer_lot(db: Session, batch_id: str, lot: List[Tuple[int, str]]) -> int:
+    # Produits supprimés depuis la soumission : ignorés
+    existants = {
+        row.id for row in db.query(models.Product.id).filter(models.Product.id.in_([pid for pid, _ in lot]))
+    }
+    # Résultats déjà appliqués (commande relancée, reprise après une coupure) : ni nouvelle ligne ni mise à jour
+    deja = {
+        row.image_filename for row in db.query(models.ProductAnalysis.image_filename).filter(
+            models.ProductAnalysis.image_filename.in_([reference_analyse(batch_id, pid) for pid, _ in lot])
+        )
+    }
+    maintenant = datetime.utcnow()
+    produits = []
+    analyses = []
+    for product_id, contenu in lot:
+        if product_id not in existants or reference_analyse(batch_id, product_id) in deja:
+            continue
+        fiche = extraire_fiche(contenu)
+        # Seuls les champs trouvés remplacent l'existant ; resume_ia (les indices d'origine) est conservé
+        maj = {champ: fiche[champ] for champ in CHAMPS_PRODUIT if fiche.get(champ)}
+        if maj:
+            produits.append({"id": product_id, **maj})
+        analyses.append({
+            "image_filename": reference_analyse(batch_id, product_id),
+            **{champ: fiche.get(champ) for champ in CHAMPS_ANALYSE},
+            "resume_ia": rendre_fiche(fiche),
+            "created_at": maintenant,
+        })
+
+    crud.apply_reanalyses_bulk(db, produits, analyses)
+    return len(analyses)
+
+
+async def appliquer(passerelle: Passerelle, batch) -> dict:
+    bilan = {"batch_id": batch.id, "statut": batch.status, "appliques": 0, "echecs": 0}
+    if not batch.output_file_id:
+        return bilan
+
+    with SessionLocal() as db:
+        # Ancien format (une référence pour tout le batch) : déjà appliqué en entier
+        if db.query(models.ProductAnalysis.id).filter(models.ProductAnalysis.image_filename == f"batch:{batch.id}").first():
+            bilan["deja_applique"] = True
+            return bilan
+
+    contenu = await passerelle.appeler(passerelle.client.files.content, batch.output_file_id)
+    with SessionLocal() as db:
+        lot = []
+        for product_id, reponse in lire_resultats(contenu.text):
+            if reponse is None:
+                bilan["echecs"] += 1
+                continue
+            lot.append((product_id, reponse))
+            if len(lot) >= BATCH_ECRITURE:
+                bilan["appliques"] += appliquer_lot(db, batch.id, lot)
+                lot = []
+        if lot:
+            bilan["appliques"] += appliquer_lot(db, batch.id, lot)
+
+    if batch.error_file_id:
+        erreurs = await passerelle.appeler(passerelle.client.files.content, batch.error_file_id)
+        bilan["echecs"] += sum(1 for ligne in erreurs.text.splitlines() if ligne.strip())
+    return bilan
+
+
+# ========== LIGNE DE COMMANDE ==========
+
+async def suivre(passerelle: Passerelle, batch_ids: List[str], attendre_fin: bool = True):
+    for batch_id in batch_ids:
+        if attendre_fin:
+            batch = await attendre(passerelle, batch_id)
+        else:
+            batch = await passerelle.appeler(passerelle.client.batches.retrieve, batch_id)
+        print(json.dumps(await appliquer(passerelle, batch), ensure_ascii=False))
+
+
+async def lancer(args) -> None:
+    dossier = os.path.join(BATCH_DIR, datetime.utcnow().strftime("%Y%m%d-%H%M%S"))
+    with SessionLocal() as db:
+        fichiers = preparer_fichiers(db, dossier, args.depuis_id, args.limite)
+    if not fichiers:
+        print("Aucun produit à ré-analyser")
+        return
+    for chemin, nombre in fichiers:
+        print(f"{chemin} : {nombre} requêtes")
+    if args.commande == "preparer":
+        return
+
+    passerelle = Passerelle(api_key=os.getenv("OPENAI_API_KEY"))
+    try:
+        batches = [await soumettre(passerelle, chemin) for chemin, _ in fichiers]
+        # Identifiants conservés sur disque : « suivre » reprend si ce processus s'arrête
+        with open(os.path.join(dossier, "batches.json"), "w") as f:
+            json.dump([batch.id for batch in batches], f)
+        print("Batches soumis :", " ".join(batch.id for batch in batches))
+        if not args.sans_attente:
+            await suivre(passerelle, [batch.id for batch in batches])
+    finally:
+        await passerelle.fermer()
+
+
+async def reprendre(args) -> None:
+    passerelle = Passerelle(api_key=os.getenv("OPENAI_API_KEY"))
+    try:
+        await suivre(passerelle, args.batch_ids, attendre_fin=args.commande == "suivre")
+    finally:
+        await passerelle.fermer()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.batch", description="Ré-analyse des produits via l'API Batch")
+    commandes = parser.add_subparsers(dest="commande", required=True)
+    for nom in ("preparer", "lancer"):
+        commande = commandes.add_parser(nom)
+        commande.add_argument("--depuis-id", type=int, default=0, help="ne reprend que les produits d'id supérieur")
+        commande.add_argument("--limite", type=int, default=None, help="nombre maximum de produits")
+        commande.add_argument("--sans-attente", action="store_true", help="soumettre sans attendre les résultats")
+    for nom in ("suivre", "appliquer"):
+        commande = commandes.add_parser(nom)
+        commande.add_argument("batch_ids", nargs="+")
+    args = parser.parse_args(argv)
+
+    migrer(engine)
+    debut = time.perf_counter()
+    asyncio.run(lancer(args) if args.commande in ("preparer", "lancer") else reprendre(args))
+    print(f"Terminé en {time.perf_counter() - debut:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
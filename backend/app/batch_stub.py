@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+
+from fastapi import APIRouter, FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import Response
+
+from app.fiche import CHAMPS_FICHE, parser_texte
+
+# Faux serveur OpenAI (fichiers + API Batch) pour tester app.batch sans compte ni coût :
+#   uvicorn app.batch_stub:app --port 8089
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub python -m app.batch lancer
+# Les réponses sont déduites du texte de la requête (repli texte libre), sans appel de modèle.
+
+STUB_DELAI = float(os.getenv("OBJEX_BATCH_STUB_DELAI", "2"))  # ➡️ Durée simulée du traitement
+
+router = APIRouter()
+fichiers = {}
+batches = {}
+taches = set()
+compteur = itertools.count(1)
+
+
+def nouvel_id(prefixe: str) -> str:
+    return f"{prefixe}_stub{next(compteur):06d}"
+
+
+def objet_fichier(file_id: str) -> dict:
+    fichier = fichiers[file_id]
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(fichier["contenu"]),
+        "created_at": fichier["created_at"],
+        "filename": fichier["filename"],
+        "purpose": fichier["purpose"],
+        "status": "processed",
+    }
+
+
+def enregistrer_fichier(filename: str, contenu: bytes, purpose: str) -> str:
+    file_id = nouvel_id("file")
+    fichiers[file_id] = {"filename": filename, "contenu": contenu, "purpose": purpose, "created_at": int(time.time())}
+    return file_id
+
+
+def completion(requete: dict) -> dict:
+    # Fiche JSON au format demandé, remplie à partir des lignes « Libellé : valeur » des messages
+    texte = "\n".join(
+        message["content"] for message in requete["body"]["messages"]
+        if message["role"] == "user" and isinstance(message["content"], str)
+    )
+    fiche = {champ: None for champ in CHAMPS_FICHE}
+    fiche.update(parser_texte(texte))
+    fiche["title"] = fiche["title"] or texte.strip().split("\n")[0][:80]
+    fiche["fiche_technique"] = fiche["fiche_technique"] or texte.strip()
+    return {
+        "id": nouvel_id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": requete["body"]["model"],
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(fiche, ensure_ascii=False)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": len(texte) // 4, "completion_tokens": 200, "total_tokens": len(texte) // 4 + 200},
+    }
+
+
+async def traiter(batch_id: str):
+    batch = batches[batch_id]
+    batch["status"] = "in_progress"
+    batch["in_progress_at"] = int(time.time())
+    await asyncio.sleep(STUB_DELAI)
+
+    sorties = []
+    erreurs = []
+    for ligne in fichiers[batch["input_file_id"]]["contenu"].decode("utf-8").splitlines():
+        if not ligne.strip():
+            continue
+        requete = json.loads(ligne)
+        messages = requete.get("body", {}).get("messages") or []
+        if not any(message.get("role") == "user" and message.get("content") for message in messages):
+            erreurs.append({
+                "id": nouvel_id("batch_req"), "custom_id": requete.get("custom_id"), "response": None,
+                "error": {"code": "invalid_request", "message": "aucun message utilisateur"},
+            })
+            continue
+        sorties.append({
+            "id": nouvel_id("batch_req"), "custom_id": requete["custom_id"], "error": None,
+            "response": {"status_code": 200, "request_id": nouvel_id("req"), "body": completion(requete)},
+        })
+
+    def jsonl(lignes):
+        return "".join(json.dumps(ligne, ensure_ascii=False) + "\n" for ligne in lignes).encode("utf-8")
+
+    batch["output_file_id"] = enregistrer_fichier("batch_output.jsonl", jsonl(sorties), "batch_output")
+    if erreurs:
+        batch["error_file_id"] = enregistrer_fichier("batch_errors.jsonl", jsonl(erreurs), "batch_output")
+    batch["request_counts"] = {"total": len(sorties) + len(erreurs), "completed": len(sorties), "failed": len(erreurs)}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+@router.post("/v1/files")
+async def creer_fichier(file: UploadFile = File(...), purpose: str = Form(...)):
+    return objet_fichier(enregistrer_fichier(file.filename, await file.read(), purpose))
+
+
+@router.get("/v1/files/{file_id}")
+async def lire_fichier(file_id: str):
+    if file_id not in fichiers:
+        raise HTTPException(status_code=404, detail="Fichier inconnu")
+    return objet_fichier(file_id)
+
+
+@router.get("/v1/files/{file_id}/content")
+async def contenu_fichier(file_id: str):
+    if file_id not in fichiers:
+        raise HTTPException(status_code=404, detail="Fichier inconnu")
+    return Response(fichiers[file_id]["contenu"], media_type="application/jsonl")
+
+
+@router.delete("/v1/files/{file_id}")
+async def supprimer_fichier(file_id: str):
+    fichiers.pop(file_id, None)
+    return {"id": file_id, "object": "file", "deleted": True}
+
+
+@router.post("/v1/batches")
+async def creer_batch(request: Request):
+    corps = await request.json()
+    if corps.get("input_file_id") not in fichiers:
+        raise HTTPException(status_code=400, detail="input_file_id inconnu")
+    batch_id = nouvel_id("batch")
+    batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": corps["endpoint"],
+        "input_file_id": corps["input_file_id"],
+        "completion_window": corps["completion_window"],
+        "metadata": corps.get("metadata"),
+        "status": "validating",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+    }
+    tache = asyncio.create_task(traiter(batch_id))
+    taches.add(tache)
+    tache.add_done_callback(taches.discard)
+    return batches[batch_id]
+
+
+@router.get("/v1/batches/{batch_id}")
+async def lire_batch(batch_id: str):
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail="Batch inconnu")
+    return batches[batch_id]
+
+
+app = FastAPI(title="Stub OpenAI Batch")
+app.include_router(router)
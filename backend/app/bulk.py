@@ -0,0 +1,94 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+from typing import Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+
+# ========== CONFIGURATION ==========
+
+BULK_CHUNK = max(1, int(os.getenv("OBJEX_BULK_CHUNK", "2000")))
+BULK_MAX_OCTETS = int(os.getenv("OBJEX_BULK_MAX_OCTETS", str(512 * 1024 * 1024)))
+BULK_MAX_ERREURS = 1000  # ➡️ Au-delà, les erreurs sont comptées mais plus détaillées
+
+
+# ========== LECTURE NDJSON / CSV ==========
+
+def lire_ndjson(f) -> Iterator[Tuple[int, object]]:
+    for numero, ligne in enumerate(f, start=1):
+        if not ligne.strip():
+            continue
+        try:
+            yield numero, json.loads(ligne)
+        except json.JSONDecodeError as e:
+            yield numero, e
+
+
+def lire_csv(f) -> Iterator[Tuple[int, object]]:
+    lecteur = csv.DictReader(f)
+    for enregistrement in lecteur:
+        # Cellule vide = champ absent, pour que les optionnels restent à None
+        yield lecteur.line_num, {cle: valeur for cle, valeur in enregistrement.items() if cle and valeur != ""}
+
+
+# ========== IMPORT PAR LOTS ==========
+
+def valider_lot(lot) -> Tuple[List[Tuple[int, dict]], List[dict]]:
+    valides = []
+    erreurs = []
+    for numero, brut in lot:
+        if isinstance(brut, Exception):
+            erreurs.append({"ligne": numero, "erreurs": [f"JSON invalide : {brut}"]})
+            continue
+        try:
+            produit = schemas.ProductCreate.model_validate(brut)
+        except ValidationError as e:
+            erreurs.append({
+                "ligne": numero,
+                "erreurs": [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()],
+            })
+            continue
+        valides.append((numero, produit.model_dump()))
+    return valides, erreurs
+
+
+def importer_fichier(db: Session, path: str, format: str) -> dict:
+    debut = time.perf_counter()
+    inseres = 0
+    nombre_erreurs = 0
+    erreurs = []
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        enregistrements = lire_csv(f) if format == "csv" else lire_ndjson(f)
+
+        while lot := list(islice(enregistrements, BULK_CHUNK)):
+            valides, erreurs_lot = valider_lot(lot)
+            if valides:
+                ajoutes, erreurs_insertion = crud.create_products_bulk(db, valides)
+                inseres += ajoutes
+                erreurs_lot += erreurs_insertion
+
+            nombre_erreurs += len(erreurs_lot)
+            erreurs.extend(erreurs_lot[:BULK_MAX_ERREURS - len(erreurs)])
+
+    duree = time.perf_counter() - debut
+    return {
+        "inserted": inseres,
+        "failed": nombre_erreurs,
+        "errors": erreurs,
+        "duree_s": round(duree, 3),
+        "lignes_par_seconde": round((inseres + nombre_erreurs) / duree) if duree else None,
+    }
+
+
+def detecter_format(content_type: str, format: str = None) -> str:
+    if format in ("csv", "ndjson"):
+        return format
+    if content_type and "csv" in content_type:
+        return "csv"
+    return "ndjson"
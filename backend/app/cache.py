@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from app import models
+from app.database import SessionLocal
+
+# ========== CONFIGURATION ==========
+
+CACHE_MAX_ENTREES = int(os.getenv("OBJEX_CACHE_MAX_ENTREES", "5000"))
+CACHE_MAX_OCTETS = int(os.getenv("OBJEX_CACHE_MAX_OCTETS", str(200 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("OBJEX_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+def cle_contenu(content: bytes, *versions: str) -> str:
+    return cle_empreinte(hashlib.sha256(content), *versions)
+
+
+def cle_empreinte(empreinte, *versions: str) -> str:
+    # Empreinte sha256 du fichier (déjà calculée), complétée par le modèle / la version du prompt
+    h = empreinte.copy()
+    for version in versions:
+        h.update(b"\0" + version.encode())
+    return h.hexdigest()
+
+
+# ========== CACHE SQLITE (LRU + TTL) ==========
+
+class AnalysisCache:
+    def __init__(self, session_factory=SessionLocal, max_entrees: int = CACHE_MAX_ENTREES,
+                 max_octets: int = CACHE_MAX_OCTETS, ttl: float = CACHE_TTL):
+        self.session_factory = session_factory
+        self.max_entrees = max_entrees
+        self.max_octets = max_octets
+        self.ttl = timedelta(seconds=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Les accès SQLite sont courts mais bloquants : ils tournent hors de la boucle asyncio
+    async def get(self, cle: str) -> Optional[str]:
+        resultat = await asyncio.to_thread(self._get, cle)
+        if resultat is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return resultat
+
+    async def set(self, cle: str, kind: str, resultat: str):
+        await asyncio.to_thread(self._set, cle, kind, resultat)
+
+    async def contient(self, cles: List[str]) -> Dict[str, bool]:
+        presentes = await asyncio.to_thread(self._contient, cles)
+        return {cle: cle in presentes for cle in cles}
+
+    def _get(self, cle: str) -> Optional[str]:
+        db = self.session_factory()
+        try:
+            entree = db.get(models.AnalysisCacheEntry, cle)
+            if entree is None:
+                return None
+
+            maintenant = datetime.utcnow()
+            if entree.created_at < maintenant - self.ttl:
+                db.delete(entree)
+                db.commit()
+                return None
+
+            entree.last_access = maintenant
+            db.commit()
+            return entree.resultat
+        finally:
+            db.close()
+
+    def _contient(self, cles: List[str]) -> set:
+        db = self.session_factory()
+        try:
+            limite = datetime.utcnow() - self.ttl
+            rows = (
+                db.query(models.AnalysisCacheEntry.cle)
+                .filter(models.AnalysisCacheEntry.cle.in_(cles))
+                .filter(models.AnalysisCacheEntry.created_at >= limite)
+                .all()
+            )
+            return {row.cle for row in rows}
+        finally:
+            db.close()
+
+    def _set(self, cle: str, kind: str, resultat: str):
+        db = self.session_factory()
+        try:
+            maintenant = datetime.utcnow()
+            db.merge(models.AnalysisCacheEntry(
+                cle=cle,
+                kind=kind,
+                resultat=resultat,
+                taille=len(resultat.encode()),
+                created_at=maintenant,
+                last_access=maintenant,
+            ))
+            db.commit()
+            self._evincer(db)
+        finally:
+            db.close()
+
+    def _evincer(self, db):
+        Entry = models.AnalysisCacheEntry
+
+        # Entrées expirées d'abord, puis les moins récemment utilisées au-delà des bornes
+        expirees = db.query(Entry).filter(Entry.created_at < datetime.utcnow() - self.ttl).delete()
+        self.evictions += expirees
+
+        nombre, octets = db.query(func.count(Entry.cle), func.coalesce(func.sum(Entry.taille), 0)).one()
+        if nombre > self.max_entrees or octets > self.max_octets:
+            a_supprimer = []
+            for entree in db.query(Entry.cle, Entry.taille).order_by(Entry.last_access).all():
+                if nombre <= self.max_entrees and octets <= self.max_octets:
+                    break
+                a_supprimer.append(entree.cle)
+                nombre -= 1
+                octets -= entree.taille
+
+            db.query(Entry).filter(Entry.cle.in_(a_supprimer)).delete(synchronize_session=False)
+            self.evictions += len(a_supprimer)
+
+        db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# ========== SINGLE-FLIGHT ==========
+
+class Diffusion:
+    # Morceaux d'une génération en flux : chaque lecteur rejoue ceux déjà produits puis suit les suivants
+    def __init__(self):
+        self.morceaux: List[str] = []
+        self.termine = False
+        self._nouveau = asyncio.Event()
+
+    def publier(self, morceau: str):
+        self.morceaux.append(morceau)
+        self._nouveau.set()
+        self._nouveau = asyncio.Event()
+
+    def clore(self):
+        self.termine = True
+        self._nouveau.set()
+
+    async def lire(self):
+        position = 0
+        while True:
+            while position < len(self.morceaux):
+                yield self.morceaux[position]
+                position += 1
+            if self.termine:
+                return
+            await self._nouveau.wait()
+
+
+class SingleFlight:
+    # Les appels concurrents sur la même clé partagent une seule exécution
+    def __init__(self):
+        self._en_cours: Dict[str, asyncio.Future] = {}
+        self._diffusions: Dict[str, Diffusion] = {}
+        self.partages = 0
+
+    def en_cours(self, cle: str) -> bool:
+        return cle in self._en_cours
+
+    def diffusion(self, cle: str) -> Optional[Diffusion]:
+        return self._diffusions.get(cle)
+
+    def lancer(self, cle: str, fabrique, diffusion: Optional[Diffusion] = None):
+        # Démarre l'exécution, ou rejoint celle déjà en vol, sans l'attendre : renvoie (tâche, partagé)
+        tache = self._en_cours.get(cle)
+        if tache is not None:
+            self.partages += 1
+            return tache, True
+
+        tache = asyncio.ensure_future(fabrique())
+        self._en_cours[cle] = tache
+        if diffusion is not None:
+            self._diffusions[cle] = diffusion
+
+        def terminer(_):
+            self._en_cours.pop(cle, None)
+            termine = self._diffusions.pop(cle, None)
+            if termine is not None:
+                termine.clore()
+
+        tache.add_done_callback(terminer)
+        return tache, False
+
+    async def executer(self, cle: str, fabrique):
+        # Renvoie (résultat, partagé) ; partagé vaut True si un appel identique était déjà en vol
+        tache, partage = self.lancer(cle, fabrique)
+        # shield : l'annulation d'un appelant n'interrompt pas les autres
+        return await asyncio.shield(tache), partage
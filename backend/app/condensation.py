@@ -0,0 +1,173 @@
+import asyncio
+import math
+import os
+import re
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+# ========== CONFIGURATION ==========
+
+# Budget de jetons accordé aux textes PDF dans le prompt de fusion (~4 caractères par jeton)
+CONDENSATION_BUDGET = int(os.getenv("OBJEX_CONDENSATION_BUDGET", "6000"))
+CONDENSATION_MORCEAU = int(os.getenv("OBJEX_CONDENSATION_MORCEAU", "300"))  # ➡️ Jetons par morceau
+# Passe map-reduce facultative : les meilleurs morceaux (budget × facteur) sont résumés en parallèle
+# par un modèle économique avant la fusion
+CONDENSATION_MAP_REDUCE = os.getenv("OBJEX_CONDENSATION_MAP_REDUCE", "0") == "1"
+CONDENSATION_MAP_FACTEUR = max(1, int(os.getenv("OBJEX_CONDENSATION_MAP_FACTEUR", "4")))
+CONDENSATION_MAP_GROUPE = int(os.getenv("OBJEX_CONDENSATION_MAP_GROUPE", "3000"))  # ➡️ Jetons par appel map
+CONDENSATION_MAP_CONCURRENCE = max(1, int(os.getenv("OBJEX_CONDENSATION_MAP_CONCURRENCE", "4")))
+
+MAP_MODEL = "gpt-4o-mini"
+MAP_SYSTEM_PROMPT = (
+    "Tu reçois des extraits d'une notice technique. Recopie uniquement les informations utiles à une fiche "
+    "produit (marque, modèle, référence, puissance, tension, dimensions, poids, indice IP, numéro de série, "
+    "certifications, pays de fabrication), valeurs et unités exactes, une par ligne. Rien d'autre."
+)
+
+# À incrémenter à chaque changement du classement ou du prompt map : entre dans la clé de fusion
+CONDENSATION_VERSION = "1"
+
+CARACTERES_PAR_JETON = 4
+SEPARATEUR = "\n[…]\n"
+
+
+def signature() -> str:
+    # Le résultat de la fusion dépend aussi du budget et du mode : clé de mémoïsation distincte
+    return f"condensation-{CONDENSATION_VERSION}-{CONDENSATION_BUDGET}-{CONDENSATION_MORCEAU}-" \
+           f"{CONDENSATION_MAP_REDUCE and CONDENSATION_MAP_FACTEUR}"
+
+
+# ========== CLASSEMENT LOCAL ==========
+
+# Indices des champs de la fiche et leur poids ; un même indice répété rapporte de moins en moins
+INDICES = [
+    (re.compile(r"\b\d+(?:[.,]\d+)?\s?(?:k?W|kVA|VA|V|mA|A|Hz|tr/min|rpm|bar|kg|l/min|m³/h)\b", re.I), 3.0),
+    (re.compile(r"\b\d+(?:[.,]\d+)?\s?[x×]\s?\d+(?:[.,]\d+)?(?:\s?[x×]\s?\d+(?:[.,]\d+)?)?\s?(?:mm|cm|m)\b", re.I), 3.0),
+    (re.compile(r"\bIP\s?[0-6X][0-9X]\b"), 4.0),
+    (re.compile(r"\b(?:S/?N|N°\s*(?:de\s*)?s[ée]rie|num[ée]ro\s*de\s*s[ée]rie|serial(?:\s*n(?:o|umber))?)\b", re.I), 4.0),
+    (re.compile(r"\b(?:CE|NF|UL|RoHS|TÜV|VDE|CSA|ATEX|EN\s?\d{3,5}|IEC\s?\d{3,5}|ISO\s?\d{3,5})\b"), 2.0),
+    (re.compile(r"\b(?:marque|mod[èe]le|r[ée]f[ée]rence|r[ée]f\.|type|made\s+in|fabriqu[ée]\s+en|origine)\b", re.I), 2.0),
+    (re.compile(r"\b(?:puissance|tension|intensit[ée]|fr[ée]quence|dimensions?|poids|encombrement|"
+                r"caract[ée]ristiques\s+techniques|sp[ée]cifications?|donn[ée]es\s+techniques)\b", re.I), 1.5),
+]
+BONUS_DEBUT = 2.0  # ➡️ La première page porte souvent la désignation du produit
+
+
+def jetons(texte: str) -> int:
+    return len(texte) // CARACTERES_PAR_JETON + 1
+
+
+def decouper(texte: str, taille: int = CONDENSATION_MORCEAU) -> List[str]:
+    # Morceaux de lignes entières (les tableaux de caractéristiques restent groupés)
+    limite = taille * CARACTERES_PAR_JETON
+    morceaux, courant, longueur = [], [], 0
+    for ligne in texte.splitlines():
+        ligne = ligne.strip()
+        if not ligne:
+            continue
+        # Ligne démesurée (texte sans retours) : coupée à la limite
+        while len(ligne) > limite:
+            if courant:
+                morceaux.append("\n".join(courant))
+                courant, longueur = [], 0
+            morceaux.append(ligne[:limite])
+            ligne = ligne[limite:]
+        if longueur + len(ligne) > limite and courant:
+            morceaux.append("\n".join(courant))
+            courant, longueur = [], 0
+        courant.append(ligne)
+        longueur += len(ligne) + 1
+    if courant:
+        morceaux.append("\n".join(courant))
+    return morceaux
+
+
+def score(morceau: str, position: int) -> float:
+    total = BONUS_DEBUT if position == 0 else 0.0
+    for motif, poids in INDICES:
+        occurrences = sum(1 for _ in motif.finditer(morceau))
+        if occurrences:
+            total += poids * math.log1p(occurrences)
+    # Densité : à score égal, le morceau le plus court coûte moins de budget
+    return total / math.sqrt(max(1, jetons(morceau)) / CONDENSATION_MORCEAU)
+
+
+def selectionner(morceaux: List[Tuple[int, int, str]], budget: int) -> List[Tuple[int, int, str]]:
+    # Meilleurs morceaux dans la limite du budget, rendus dans l'ordre du document ;
+    # un morceau sans aucun indice n'est jamais retenu (le premier a toujours son bonus)
+    classes = sorted(((score(m[2], m[1]), m) for m in morceaux), key=lambda c: c[0], reverse=True)
+    retenus, utilises = [], 0
+    for valeur, morceau in classes:
+        if valeur <= 0:
+            break
+        cout = jetons(morceau[2])
+        if utilises + cout > budget:
+            continue
+        retenus.append(morceau)
+        utilises += cout
+    return sorted(retenus, key=lambda m: (m[0], m[1]))
+
+
+def recomposer(morceaux: List[Tuple[int, int, str]], nb_sources: int) -> List[str]:
+    # Un texte par document source ; "[…]" marque les passages écartés
+    textes = []
+    for source in range(nb_sources):
+        parties, precedent = [], None
+        for _, position, contenu in (m for m in morceaux if m[0] == source):
+            if precedent is not None and position != precedent + 1:
+                parties.append(SEPARATEUR)
+            elif parties:
+                parties.append("\n")
+            parties.append(contenu)
+            precedent = position
+        if parties:
+            textes.append("".join(parties))
+    return textes
+
+
+# ========== CONDENSATION ==========
+
+Resumeur = Callable[[str], Awaitable[str]]
+
+
+async def condenser(textes: List[str], resumer: Optional[Resumeur] = None,
+                    budget: int = CONDENSATION_BUDGET) -> List[str]:
+    # Sous le budget : textes intacts (cas courant d'une plaque ou d'une notice courte)
+    if budget <= 0 or sum(jetons(texte) for texte in textes) <= budget:
+        return textes
+
+    morceaux = [
+        (source, position, contenu)
+        for source, texte in enumerate(textes)
+        for position, contenu in enumerate(decouper(texte))
+    ]
+    if resumer is None:
+        return recomposer(selectionner(morceaux, budget), len(textes))
+
+    # Map : groupes de morceaux pertinents résumés en parallèle ; reduce : la fusion elle-même
+    candidats = selectionner(morceaux, budget * CONDENSATION_MAP_FACTEUR)
+    groupes, courant, taille = [], [], 0
+    for morceau in candidats:
+        if courant and taille + jetons(morceau[2]) > CONDENSATION_MAP_GROUPE:
+            groupes.append(courant)
+            courant, taille = [], 0
+        courant.append(morceau)
+        taille += jetons(morceau[2])
+    if courant:
+        groupes.append(courant)
+
+    semaphore = asyncio.Semaphore(CONDENSATION_MAP_CONCURRENCE)
+
+    async def resumer_groupe(groupe) -> str:
+        async with semaphore:
+            return await resumer("\n\n".join(contenu for _, _, contenu in groupe))
+
+    resumes = await asyncio.gather(*(resumer_groupe(groupe) for groupe in groupes), return_exceptions=True)
+    if any(isinstance(resume, BaseException) for resume in resumes):
+        # Repli sans appel supplémentaire : la sélection locale suffit à tenir le budget
+        erreur = next(resume for resume in resumes if isinstance(resume, BaseException))
+        print("Erreur condensation map-reduce:", erreur)
+        return recomposer(selectionner(morceaux, budget), len(textes))
+
+    resume = "\n".join(texte.strip() for texte in resumes if texte and texte.strip())
+    limite = budget * CARACTERES_PAR_JETON
+    return [resume[:limite]] if resume else recomposer(selectionner(morceaux, budget), len(textes))
@@ -1,15 +1,104 @@
+from sqlalchemy import delete, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from app import models, schemas
+from typing import List, Optional, Tuple
+from datetime import datetime
+from app import models, schemas, vecteurs
+from app.metrics import mesurer
+
+COLLECTIONS = ("products",)
+
+def ensure_collection_versions(db: Session):
+    for name in COLLECTIONS:
+        if db.get(models.CollectionVersion, name) is None:
+            db.add(models.CollectionVersion(name=name, version=0, updated_at=datetime.utcnow()))
+    db.commit()
+
+def bump_collection_version(db: Session, name: str = "products"):
+    # Dans la même transaction que l'écriture : ETag et données changent ensemble
+    db.query(models.CollectionVersion).filter(models.CollectionVersion.name == name).update({
+        models.CollectionVersion.version: models.CollectionVersion.version + 1,
+        models.CollectionVersion.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
 
 def create_product(db: Session, product: schemas.ProductCreate):
     db_product = models.Product(**product.dict())
     db.add(db_product)
-    db.commit()
+    bump_collection_version(db)
+    with mesurer("db_commit"):
+        db.commit()
     db.refresh(db_product)
+    # Ajout incrémental à l'index des vecteurs (calcul groupé en tâche de fond)
+    vecteurs.signaler("products", [db_product.id])
     return db_product
 
-def get_products(db: Session):
-    return db.query(models.Product).all()
+def create_products_bulk(db: Session, products: List[Tuple[int, dict]]):
+    # products : (numéro de ligne, champs validés). Un seul INSERT multi-lignes et un seul commit par lot
+    try:
+        db.execute(models.Product.__table__.insert(), [data for _, data in products])
+        bump_collection_version(db)
+        with mesurer("db_commit"):
+            db.commit()
+        # Ids inconnus ici (INSERT multi-lignes) : l'indexeur les trouve en reprenant après son curseur
+        vecteurs.signaler("products", [])
+        return len(products), []
+    except SQLAlchemyError:
+        db.rollback()
+
+    # Lot refusé : repli ligne à ligne (savepoints) pour isoler les enregistrements fautifs
+    inseres = 0
+    erreurs = []
+    for numero, data in products:
+        try:
+            with db.begin_nested():
+                db.execute(models.Product.__table__.insert(), [data])
+            inseres += 1
+        except SQLAlchemyError as e:
+            erreurs.append({"ligne": numero, "erreurs": [str(getattr(e, "orig", e))]})
+    bump_collection_version(db)
+    with mesurer("db_commit"):
+        db.commit()
+    vecteurs.signaler("products", [])
+    return inseres, erreurs
+
+def apply_reanalyses_bulk(db: Session, products: List[dict], analyses: List[dict]):
+    # products : dicts avec l'id et les seuls champs à mettre à jour ; analyses : lignes product_analyses.
+    # UPDATE par clé primaire en executemany + INSERT multi-lignes, un seul commit pour le lot
+    if products:
+        db.execute(update(models.Product), products)
+        ids = [product["id"] for product in products]
+        # Version de chaque fiche modifiée : invalide son ETag, sans toucher aux autres fiches
+        db.execute(
+            update(models.Product)
+            .where(models.Product.id.in_(ids))
+            .values(version=models.Product.version + 1, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        # Vecteurs périmés supprimés dans la même transaction : recalculés au prochain passage de l'indexeur
+        db.execute(delete(models.Embedding).where(models.Embedding.source == "products",
+                                                  models.Embedding.item_id.in_(ids)))
+    if analyses:
+        db.execute(models.ProductAnalysis.__table__.insert(), analyses)
+    bump_collection_version(db)
+    with mesurer("db_commit"):
+        db.commit()
+    if products:
+        vecteurs.signaler("products", ids)
+
+def get_products(db: Session, cursor: Optional[int] = None, limit: Optional[int] = None,
+                 fields: Optional[List[str]] = None):
+    # fields : colonnes à sélectionner (lignes légères) ; sinon objets Product complets
+    colonnes = [getattr(models.Product, field) for field in fields] if fields else [models.Product]
+    query = db.query(*colonnes)
+
+    # Pagination par clé : on repart après le dernier id vu, via l'index de la clé primaire
+    if cursor is not None:
+        query = query.filter(models.Product.id > cursor)
+    query = query.order_by(models.Product.id)
+
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 def get_product(db: Session, product_id: int):
     return db.query(models.Product).filter(models.Product.id == product_id).first()
\ No newline at end of file
@@ -0,0 +1,60 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from datetime import datetime
+from app import models, schemas, vecteurs
+from app.metrics import mesurer
+
+# Mêmes opérations que crud.py, pour les routes asynchrones (AsyncSessionLocal)
+
+async def create_product(db: AsyncSession, product: schemas.ProductCreate):
+    db_product = models.Product(**product.model_dump())
+    db.add(db_product)
+    await bump_collection_version(db)
+    with mesurer("db_commit"):
+        await db.commit()
+    # expire_on_commit=False : l'id et les valeurs par défaut sont déjà chargés, pas de refresh
+    vecteurs.signaler("products", [db_product.id])
+    return db_product
+
+async def get_products(db: AsyncSession, cursor: Optional[int] = None, limit: Optional[int] = None,
+                       fields: Optional[List[str]] = None):
+    colonnes = [getattr(models.Product, field) for field in fields] if fields else [models.Product]
+    query = select(*colonnes)
+
+    if cursor is not None:
+        query = query.where(models.Product.id > cursor)
+    query = query.order_by(models.Product.id)
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    result = await db.execute(query)
+    return result.all() if fields else result.scalars().all()
+
+async def get_product(db: AsyncSession, product_id: int):
+    return await db.get(models.Product, product_id)
+
+async def bump_collection_version(db: AsyncSession, name: str = "products"):
+    await db.execute(
+        update(models.CollectionVersion)
+        .where(models.CollectionVersion.name == name)
+        .values(version=models.CollectionVersion.version + 1, updated_at=datetime.utcnow())
+    )
+
+async def get_collection_version(db: AsyncSession, name: str = "products") -> Tuple[int, datetime]:
+    # Lecture par clé primaire : coût constant, quelle que soit la taille de la collection
+    row = (await db.execute(
+        select(models.CollectionVersion.version, models.CollectionVersion.updated_at)
+        .where(models.CollectionVersion.name == name)
+    )).first()
+    if row is None:
+        return 0, datetime(1970, 1, 1)
+    return row.version, row.updated_at
+
+async def get_rows_by_ids(db: AsyncSession, table, ids: List[int], fields: List[str]):
+    # Lignes légères pour compléter des résultats déjà classés (l'ordre est rétabli par l'appelant)
+    if not ids:
+        return []
+    colonnes = [table.id] + [getattr(table, field) for field in fields]
+    return (await db.execute(select(*colonnes).where(table.id.in_(ids)))).all()
@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from sqlalchemy.orm import declarative_base
@@ -7,7 +9,101 @@ from sqlalchemy.orm import declarative_base
 # ✅ Déclaration correcte de la base
 Base = declarative_base()
 
-DATABASE_URL = "sqlite:///./objex.db"
+# SQLite par défaut ; PostgreSQL : postgresql://… (psycopg2 pour le moteur synchrone, asyncpg pour l'asynchrone)
+DATABASE_URL = os.getenv("OBJEX_DATABASE_URL", "sqlite:///./objex.db")
+
+# SQLite : réglages appliqués à chaque connexion
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("OBJEX_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("OBJEX_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KIB = int(os.getenv("OBJEX_SQLITE_CACHE_KIB", "65536"))
+
+# PostgreSQL (ou autre serveur) : pool de connexions
+DB_POOL_SIZE = int(os.getenv("OBJEX_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("OBJEX_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("OBJEX_DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("OBJEX_DB_POOL_RECYCLE", "1800"))
+
+
+def _configurer_sqlite(dbapi_connection, connection_record):
+    # WAL : les lecteurs ne bloquent plus l'écrivain ; NORMAL suffit en WAL (pas de corruption possible)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KIB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def creer_engine(url: str = DATABASE_URL):
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(engine, "connect", _configurer_sqlite)
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,  # ➡️ Connexions coupées par le serveur détectées avant usage
+        pool_use_lifo=True,  # ➡️ Les connexions en trop vieillissent et sont recyclées
+    )
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def url_async(url: str) -> str:
+    # Même base, pilote asynchrone : aiosqlite pour SQLite, asyncpg pour PostgreSQL
+    schema, reste = url.split("://", 1)
+    dialecte = schema.split("+", 1)[0]
+    pilote = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}.get(dialecte, schema)
+    return f"{pilote}://{reste}"
+
+
+def creer_engine_async(url: str = DATABASE_URL):
+    url = url_async(url)
+    if url.startswith("sqlite"):
+        engine = create_async_engine(
+            url,
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(engine.sync_engine, "connect", _configurer_sqlite)
+        return engine
+
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        pool_use_lifo=True,
+    )
+
+
+def pool_stats(engine) -> dict:
+    pool = getattr(engine, "sync_engine", engine).pool
+    stats = {"dialect": engine.dialect.name, "pool": type(pool).__name__, "status": pool.status()}
+    for mesure in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, mesure):
+            stats[mesure] = getattr(pool, mesure)()
+    return stats
+
+
+engine = creer_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Sessions asynchrones pour les routes : les I/O base partagent la boucle asyncio au lieu du threadpool
+async_engine = creer_engine_async()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
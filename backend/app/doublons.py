@@ -0,0 +1,223 @@
+import asyncio
+import os
+import re
+import string
+from typing import Iterable, List, Optional, Set
+
+from PIL import Image, ImageOps
+from sqlalchemy import bindparam, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import images, models
+from app.fiche import parser_texte
+from app.metrics import mesurer
+
+# ========== CONFIGURATION ==========
+
+# Recherche d'un produit existant avant la vision et la fusion : un objet déjà connu est renvoyé sans appel modèle
+DOUBLONS_ACTIFS = os.getenv("OBJEX_DOUBLONS", "1") == "1"
+# Bits différents tolérés entre deux empreintes ; au-delà de BANDES - 1, les bandes ne garantissent plus le rappel
+DOUBLON_DISTANCE = int(os.getenv("OBJEX_DOUBLON_DISTANCE", "3"))
+# Même marque et même modèle suffisent : désactivé par défaut, deux exemplaires d'un même modèle
+# sont des objets distincts (seuls l'image et le numéro de série court-circuitent alors l'analyse)
+DOUBLON_MODELE = os.getenv("OBJEX_DOUBLON_MODELE", "0") == "1"
+SERIE_MIN = 5  # ➡️ Un numéro de série plus court n'est pas assez discriminant
+
+BANDES = 4
+BITS_PAR_BANDE = 64 // BANDES
+
+
+# ========== NORMALISATION ==========
+
+# Même normalisation en Python et en SQL : séparateurs retirés, majuscules ASCII (upper() de SQLite)
+SEPARATEURS = " -./"
+_SANS_SEPARATEURS = str.maketrans("", "", SEPARATEURS)
+_MAJUSCULES = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+
+
+def normaliser(valeur: Optional[str]) -> str:
+    return valeur.translate(_SANS_SEPARATEURS).translate(_MAJUSCULES) if valeur else ""
+
+
+def _sql_normalise(colonne: str) -> str:
+    expression = colonne
+    for separateur in SEPARATEURS:
+        expression = f"replace({expression}, '{separateur}', '')"
+    return f"upper({expression})"
+
+
+SQL_SERIE = _sql_normalise("numero_serie")
+SQL_MARQUE = _sql_normalise("marque")
+SQL_MODELE = _sql_normalise("modele")
+
+# Index sur expression : les requêtes ci-dessous reprennent exactement les mêmes expressions
+DDL_DOUBLONS = [
+    f"CREATE INDEX IF NOT EXISTS ix_products_serie_norm ON products (({SQL_SERIE}))",
+    f"CREATE INDEX IF NOT EXISTS ix_products_marque_modele_norm ON products (({SQL_MARQUE}), ({SQL_MODELE}))",
+]
+
+
+def initialiser_doublons(engine):
+    # Idempotent, comme initialiser_recherche
+    with engine.begin() as conn:
+        for ddl in DDL_DOUBLONS:
+            conn.execute(text(ddl))
+
+
+# ========== IDENTIFIANTS DANS LES TEXTES ==========
+
+# « S/N : 1234-56 », « SN12345678 » (préfixe collé), « Serial number: X12345 » dans un texte libre ;
+# la valeur contient au moins un chiffre (jamais « number », « see label »…)
+_SERIE_LIBRE = re.compile(
+    r"\b(S/?N|serial(?:\s+(?:number|no\.?|n°))?)\s*[:#°]?\s*((?=[A-Z./-]*\d)[A-Z0-9][A-Z0-9./-]{3,})",
+    re.IGNORECASE,
+)
+
+
+def variantes_serie(valeur: Optional[str]) -> Set[str]:
+    # Le préfixe « SN » est stocké tantôt avec, tantôt sans la valeur : les deux formes sont cherchées
+    serie = normaliser(valeur)
+    variantes = {serie}
+    if serie.startswith("SN"):
+        variantes.add(serie[2:])
+    return {variante for variante in variantes if len(variante) >= SERIE_MIN}
+
+
+def identifiants(textes: Iterable[str]) -> dict:
+    # Libellés « Marque : … » (réponses vision, notices) puis numéros de série en texte libre
+    series, marque, modele = set(), None, None
+    for texte in textes:
+        if not texte:
+            continue
+        fiche = parser_texte(texte)
+        series |= variantes_serie(fiche.get("numero_serie"))
+        marque = marque or fiche.get("marque")
+        modele = modele or fiche.get("modele")
+        for match in _SERIE_LIBRE.finditer(texte):
+            series |= variantes_serie(match.group(2))
+            if not match.group(1).upper().startswith("SERIAL"):
+                series |= variantes_serie("SN" + match.group(2))
+    return {"series": series, "marque": normaliser(marque), "modele": normaliser(modele)}
+
+
+# ========== EMPREINTES PERCEPTUELLES ==========
+
+def _signe(empreinte: int) -> int:
+    return empreinte - (1 << 64) if empreinte >= 1 << 63 else empreinte
+
+
+def bandes(empreinte: int) -> List[int]:
+    brute = empreinte & ((1 << 64) - 1)
+    masque = (1 << BITS_PAR_BANDE) - 1
+    return [(brute >> (BITS_PAR_BANDE * i)) & masque for i in range(BANDES)]
+
+
+def distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+
+def empreinte_perceptuelle(path: str) -> int:
+    # dHash : gradients horizontaux d'une vignette 9x8 en niveaux de gris (insensible à la taille,
+    # à la compression et aux variations d'exposition)
+    with Image.open(path) as image:
+        image.draft("L", (64, 64))  # ➡️ JPEG : décodage directement à basse résolution
+        vignette = ImageOps.exif_transpose(image).convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(vignette.getdata())
+    valeur = 0
+    for ligne in range(8):
+        for colonne in range(8):
+            valeur = (valeur << 1) | (pixels[ligne * 9 + colonne] > pixels[ligne * 9 + colonne + 1])
+    return _signe(valeur)
+
+
+async def empreintes_images(paths: List[str]) -> List[int]:
+    # Calcul dans le pool du pré-traitement d'images ; une image illisible est simplement ignorée
+    loop = asyncio.get_running_loop()
+    resultats = await asyncio.gather(
+        *(loop.run_in_executor(images.get_pool(), empreinte_perceptuelle, path) for path in paths),
+        return_exceptions=True,
+    )
+    empreintes = []
+    for resultat in resultats:
+        if isinstance(resultat, Exception):
+            print("Erreur empreinte image:", resultat)
+        else:
+            empreintes.append(resultat)
+    return empreintes
+
+
+# ========== RECHERCHE ==========
+
+async def par_empreintes(db: AsyncSession, empreintes: List[int]):
+    # Candidats partageant au moins une bande (index), puis distance exacte
+    colonnes = (models.ProductImageHash.bande_0, models.ProductImageHash.bande_1,
+                models.ProductImageHash.bande_2, models.ProductImageHash.bande_3)
+    meilleur = None
+    for empreinte in empreintes:
+        lignes = (await db.execute(
+            select(models.ProductImageHash.product_id, models.ProductImageHash.empreinte)
+            .where(or_(*(colonne == bande for colonne, bande in zip(colonnes, bandes(empreinte)))))
+        )).all()
+        for ligne in lignes:
+            ecart = distance(empreinte, ligne.empreinte)
+            if ecart <= DOUBLON_DISTANCE and (meilleur is None or ecart < meilleur[1]):
+                meilleur = (ligne.product_id, ecart)
+    return meilleur
+
+
+async def par_serie(db: AsyncSession, series: Set[str]) -> Optional[int]:
+    if not series:
+        return None
+    requete = text(f"SELECT min(id) FROM products WHERE {SQL_SERIE} IN :series").bindparams(
+        bindparam("series", expanding=True)
+    )
+    return (await db.execute(requete, {"series": sorted(series)})).scalar()
+
+
+async def par_modele(db: AsyncSession, marque: str, modele: str) -> Optional[int]:
+    if not marque or len(modele) < 3:
+        return None
+    # min(id) plutôt que ORDER BY id : SQLite garde l'index sur expression au lieu de parcourir la clé primaire
+    requete = text(f"SELECT min(id) FROM products WHERE {SQL_MARQUE} = :marque AND {SQL_MODELE} = :modele")
+    return (await db.execute(requete, {"marque": marque, "modele": modele})).scalar()
+
+
+async def rechercher_doublon(db: AsyncSession, empreintes: List[int], textes: List[str]) -> Optional[dict]:
+    # Du critère le plus sûr au moins sûr : photo quasi identique, numéro de série, marque + modèle
+    with mesurer("doublons", images=len(empreintes), textes=len(textes)):
+        correspondance = None
+        if empreintes:
+            trouve = await par_empreintes(db, empreintes)
+            if trouve:
+                correspondance = {"product_id": trouve[0], "critere": "image", "distance": trouve[1]}
+
+        if correspondance is None and textes:
+            cles = identifiants(textes)
+            product_id = await par_serie(db, cles["series"])
+            if product_id:
+                correspondance = {"product_id": product_id, "critere": "numero_serie", "distance": None}
+            elif DOUBLON_MODELE:
+                product_id = await par_modele(db, cles["marque"], cles["modele"])
+                if product_id:
+                    correspondance = {"product_id": product_id, "critere": "modele", "distance": None}
+
+        if correspondance is None:
+            return None
+        produit = await db.get(models.Product, correspondance["product_id"])
+        return {**correspondance, "produit": produit} if produit else None
+
+
+async def ajouter_empreintes(db: AsyncSession, product_id: int, empreintes: List[int]):
+    # Les photos d'un produit enregistré serviront aux prochaines recherches ; pas de doublon exact
+    existantes = set((await db.execute(
+        select(models.ProductImageHash.empreinte).where(models.ProductImageHash.product_id == product_id)
+    )).scalars())
+    nouvelles = [empreinte for empreinte in dict.fromkeys(empreintes) if empreinte not in existantes]
+    for empreinte in nouvelles:
+        db.add(models.ProductImageHash(
+            product_id=product_id, empreinte=empreinte,
+            **{f"bande_{i}": bande for i, bande in enumerate(bandes(empreinte))},
+        ))
+    if nouvelles:
+        with mesurer("db_commit"):
+            await db.commit()
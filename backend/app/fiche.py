@@ -0,0 +1,164 @@
+import json
+import re
+from typing import Dict, Optional
+
+from app import schemas
+
+# ========== PROMPT DE FUSION ==========
+
+FUSION_MODEL = "gpt-4o"
+FUSION_SYSTEM_PROMPT = (
+    "Tu es un expert en analyse d'objets industriels, techniques et électroniques. "
+    "Réponds avec la fiche produit au format JSON demandé : titre, description, caractéristiques "
+    "(marque, modèle, puissance, dimensions, indice IP, numéro de série, certifications, pays de fabrication ; "
+    "null si non précisé) et fiche technique complète en texte."
+)
+# À incrémenter à chaque changement du prompt système ou du format : invalide la mémoïsation
+FUSION_PROMPT_VERSION = "2"
+
+
+# ========== SCHÉMA DE SORTIE STRUCTURÉE ==========
+
+# Champs de ProductCreate demandés au modèle ; resume_ia est rempli côté serveur
+CHAMPS_PRODUIT = [champ for champ in schemas.ProductCreate.model_fields if champ != "resume_ia"]
+CHAMPS_FICHE = CHAMPS_PRODUIT + ["fiche_technique"]
+
+VALEURS_VIDES = {"", "non précisé", "non precise", "inconnu", "n/a", "na", "-", "null", "none"}
+
+FICHE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        champ: {"type": "string"} if champ in ("title", "fiche_technique") else {"type": ["string", "null"]}
+        for champ in CHAMPS_FICHE
+    },
+    # Mode strict : toutes les propriétés sont requises, l'absence s'exprime par null
+    "required": CHAMPS_FICHE,
+    "additionalProperties": False,
+}
+
+FORMAT_REPONSE = {
+    "type": "json_schema",
+    "json_schema": {"name": "fiche_produit", "strict": True, "schema": FICHE_SCHEMA},
+}
+
+
+# ========== PARSING ==========
+
+# Libellés reconnus dans une réponse en texte libre → champ de ProductCreate
+LIBELLES = {
+    "title": r"titre",
+    "description": r"description",
+    "fiche_technique": r"fiche\s+technique",
+    "marque": r"marque|fabricant",
+    "modele": r"mod[eè]le|r[ée]f[ée]rence",
+    "puissance": r"puissance",
+    "dimensions": r"dimensions?",
+    "indice_ip": r"indice\s+(?:de\s+protection|ip)|ip",
+    "numero_serie": r"num[ée]ro\s+de\s+s[ée]rie|n°\s*de\s+s[ée]rie",
+    "certifications": r"certifications?",
+    "pays_fabrication": r"pays\s+de\s+fabrication",
+}
+
+# Un seul motif compilé : chaque ligne « Libellé : valeur » (puces et gras Markdown tolérés)
+_LIGNE = re.compile(
+    r"^[ \t>#*•-]*(?:" + "|".join(f"(?P<{champ}>{motif})" for champ, motif in LIBELLES.items()) + r")"
+    r"[ \t]*\**[ \t]*[:\-–][ \t]*\**[ \t]*(?P<valeur>.*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# Chaîne JSON complète "cle": "valeur" dans une sortie encore partielle
+_CHAINE_JSON = re.compile(r'"(?P<cle>\w+)"\s*:\s*"(?P<valeur>(?:[^"\\]|\\.)*)"')
+
+
+def nettoyer(valeur: Optional[str]) -> Optional[str]:
+    if valeur is None:
+        return None
+    valeur = valeur.strip().strip("*").strip()
+    return None if valeur.lower() in VALEURS_VIDES else valeur
+
+
+def parser_texte(texte: str) -> Dict[str, Optional[str]]:
+    # Repli texte libre : un seul passage sur la réponse, la première occurrence de chaque libellé gagne
+    fiche = {}
+    for match in _LIGNE.finditer(texte):
+        champ = next(nom for nom in LIBELLES if match.group(nom) is not None)
+        if champ in fiche:
+            continue
+        if champ == "fiche_technique":
+            # Section entière, jusqu'à la fin du texte
+            fiche[champ] = (match.group("valeur") + texte[match.end():]).strip()
+        else:
+            fiche[champ] = nettoyer(match.group("valeur"))
+    return fiche
+
+
+def parser_json(texte: str) -> Optional[Dict[str, Optional[str]]]:
+    try:
+        donnees = json.loads(texte)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(donnees, dict):
+        return None
+    return {champ: nettoyer(donnees.get(champ)) if isinstance(donnees.get(champ), str) else None
+            for champ in CHAMPS_FICHE}
+
+
+def extraire_fiche(texte: str) -> Dict[str, Optional[str]]:
+    fiche = parser_json(texte) if texte.lstrip().startswith("{") else None
+    if fiche is None:
+        fiche = parser_texte(texte)
+    return {champ: fiche.get(champ) for champ in CHAMPS_FICHE}
+
+
+def rendre_fiche(fiche: Dict[str, Optional[str]]) -> str:
+    # Texte lisible (affichage, resume_ia, index plein texte) reconstruit depuis la sortie structurée
+    return (
+        f"**Titre** : {fiche.get('title') or ''}\n"
+        f"**Description** : {fiche.get('description') or ''}\n"
+        f"**Fiche Technique** :\n{fiche.get('fiche_technique') or ''}"
+    ).strip()
+
+
+def produit_depuis(fiche: Dict[str, Optional[str]], resume_ia: str) -> dict:
+    produit = {champ: fiche.get(champ) for champ in CHAMPS_PRODUIT}
+    produit["title"] = produit["title"] or "Produit sans titre"
+    produit["resume_ia"] = resume_ia
+    return schemas.ProductCreate.model_validate(produit).model_dump()
+
+
+class ParseurIncremental:
+    # Ne renvoie que les champs nouvellement complets ; le texte déjà analysé n'est jamais relu
+    def __init__(self):
+        self.texte = ""
+        self.position = 0
+        self.json = None
+        self.emis = {}
+
+    def feed(self, morceau: str) -> dict:
+        self.texte += morceau
+        if self.json is None:
+            debut = self.texte.lstrip()
+            if not debut:
+                return {}
+            self.json = debut.startswith("{")
+
+        nouveaux = {}
+        if self.json:
+            for match in _CHAINE_JSON.finditer(self.texte, self.position):
+                self.position = match.end()
+                champ = match.group("cle")
+                if champ in CHAMPS_FICHE and champ not in self.emis:
+                    valeur = nettoyer(json.loads(f'"{match.group("valeur")}"'))
+                    if valeur:
+                        self.emis[champ] = nouveaux[champ] = valeur
+            return nouveaux
+
+        # Texte libre : seules les lignes complètes sont analysées
+        fin = self.texte.rfind("\n")
+        if fin < self.position:
+            return {}
+        for champ, valeur in parser_texte(self.texte[self.position:fin]).items():
+            if valeur and champ != "fiche_technique" and champ not in self.emis:
+                self.emis[champ] = nouveaux[champ] = valeur
+        self.position = fin + 1
+        return nouveaux
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+# ========== CONFIGURATION ==========
+
+# Connexions HTTP partagées par tous les appels OpenAI (vision, fusion, nettoyage)
+OPENAI_MAX_CONNEXIONS = int(os.getenv("OBJEX_OPENAI_MAX_CONNEXIONS", "20"))
+OPENAI_KEEPALIVE = int(os.getenv("OBJEX_OPENAI_KEEPALIVE", "10"))
+OPENAI_TIMEOUT = float(os.getenv("OBJEX_OPENAI_TIMEOUT", "60"))
+OPENAI_TIMEOUT_CONNEXION = float(os.getenv("OBJEX_OPENAI_TIMEOUT_CONNEXION", "5"))
+
+# Budgets du compte : requêtes et jetons par minute (0 = illimité)
+OPENAI_RPM = float(os.getenv("OBJEX_OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OBJEX_OPENAI_TPM", "300000"))
+OPENAI_ATTENTE_MAX = float(os.getenv("OBJEX_OPENAI_ATTENTE_MAX", "30"))  # ➡️ Au-delà, refus immédiat
+
+# Nouvelles tentatives : backoff exponentiel avec jitter complet
+OPENAI_TENTATIVES = max(1, int(os.getenv("OBJEX_OPENAI_TENTATIVES", "4")))
+OPENAI_BACKOFF_BASE = float(os.getenv("OBJEX_OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OBJEX_OPENAI_BACKOFF_MAX", "20"))
+
+# Disjoncteur : échecs consécutifs avant ouverture, pause avant l'essai suivant
+OPENAI_DISJONCTEUR_SEUIL = max(1, int(os.getenv("OBJEX_OPENAI_DISJONCTEUR_SEUIL", "5")))
+OPENAI_DISJONCTEUR_PAUSE = float(os.getenv("OBJEX_OPENAI_DISJONCTEUR_PAUSE", "30"))
+
+
+class OpenAIIndisponible(Exception):
+    # Refus immédiat (disjoncteur ouvert ou budget saturé) : à renvoyer en 503 avec Retry-After
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ========== SEAU À JETONS ==========
+
+class SeauJetons:
+    # Capacité d'une minute, remplie en continu ; les appelants attendent leur tour dans l'ordre d'arrivée
+    def __init__(self, par_minute: float):
+        self.capacite = par_minute
+        self.debit = par_minute / 60.0
+        self.jetons = par_minute
+        self.maj = time.monotonic()
+        self._verrou = asyncio.Lock()
+
+    def _remplir(self):
+        maintenant = time.monotonic()
+        self.jetons = min(self.capacite, self.jetons + (maintenant - self.maj) * self.debit)
+        self.maj = maintenant
+
+    async def prendre(self, quantite: float, attente_max: float = OPENAI_ATTENTE_MAX):
+        if not self.capacite or quantite <= 0:
+            return
+        # Une demande plus grosse que le seau entier attend seulement qu'il soit plein
+        quantite = min(quantite, self.capacite)
+        async with self._verrou:
+            self._remplir()
+            attente = (quantite - self.jetons) / self.debit
+            if attente > attente_max:
+                raise OpenAIIndisponible(f"budget OpenAI saturé (attente estimée {attente:.0f}s)", attente)
+            if attente > 0:
+                await asyncio.sleep(attente)
+                self._remplir()
+            self.jetons -= quantite
+
+    def ajuster(self, delta: float):
+        # Consommation réelle connue après coup (usage) : le seau peut passer en dette
+        if self.capacite:
+            self._remplir()
+            self.jetons = min(self.capacite, self.jetons - delta)
+
+
+# ========== DISJONCTEUR ==========
+
+class Disjoncteur:
+    def __init__(self, seuil: int = OPENAI_DISJONCTEUR_SEUIL, pause: float = OPENAI_DISJONCTEUR_PAUSE):
+        self.seuil = seuil
+        self.pause = pause
+        self.echecs = 0
+        self.ouvert_jusqua = 0.0
+        self._essai_en_cours = False
+        self.ouvertures = 0
+
+    @property
+    def etat(self) -> str:
+        if self.echecs < self.seuil:
+            return "ferme"
+        return "ouvert" if time.monotonic() < self.ouvert_jusqua else "semi-ouvert"
+
+    def verifier(self):
+        etat = self.etat
+        if etat == "ouvert":
+            raise OpenAIIndisponible("OpenAI indisponible (disjoncteur ouvert)", self.ouvert_jusqua - time.monotonic())
+        if etat == "semi-ouvert":
+            # Un seul appel d'essai à la fois ; les autres échouent tout de suite
+            if self._essai_en_cours:
+                raise OpenAIIndisponible("OpenAI indisponible (essai en cours)", 1.0)
+            self._essai_en_cours = True
+
+    def succes(self):
+        self.echecs = 0
+        self._essai_en_cours = False
+
+    def echec(self):
+        self._essai_en_cours = False
+        self.echecs += 1
+        if self.echecs >= self.seuil:
+            if time.monotonic() >= self.ouvert_jusqua:
+                self.ouvertures += 1
+            self.ouvert_jusqua = time.monotonic() + self.pause
+
+    def liberer(self):
+        # Erreur sans rapport avec la santé d'OpenAI (requête invalide…) : l'essai ne compte pas
+        self._essai_en_cours = False
+
+
+# ========== PASSERELLE ==========
+
+def estimer_tokens(messages, max_sortie: int = 1000) -> int:
+    # ~4 caractères par jeton, plus la réponse attendue : suffisant pour réguler le débit
+    caracteres = sum(len(str(message.get("content", ""))) for message in messages)
+    return caracteres // 4 + max_sortie
+
+
+def _delai_retry_after(erreur) -> Optional[float]:
+    reponse = getattr(erreur, "response", None)
+    if reponse is None:
+        return None
+    try:
+        return float(reponse.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _reessayable(erreur, idempotent: bool) -> bool:
+    # 429 : la requête n'a pas été traitée, on peut toujours la rejouer.
+    # 5xx / coupure / timeout : l'opération a pu aboutir, on ne rejoue que si elle est idempotente.
+    import openai
+
+    if isinstance(erreur, openai.RateLimitError):
+        return True
+    if isinstance(erreur, (openai.APIConnectionError, openai.InternalServerError)):
+        return idempotent
+    if isinstance(erreur, openai.APIStatusError):
+        return idempotent and erreur.status_code in (408, 409, 502, 503, 504)
+    return False
+
+
+def _panne(erreur) -> bool:
+    # Ce qui compte pour le disjoncteur : indisponibilité du fournisseur, pas nos requêtes invalides
+    import openai
+
+    if isinstance(erreur, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(erreur, openai.APIStatusError) and erreur.status_code >= 500
+
+
+def statut_http(erreur) -> Optional[int]:
+    # Erreur OpenAI remontée à un client HTTP : 503 si le fournisseur est indisponible, 502 sinon ;
+    # None pour une erreur qui n'est pas d'OpenAI (bug à laisser en 500)
+    import openai
+
+    if _panne(erreur):
+        return 503
+    return 502 if isinstance(erreur, openai.APIError) else None
+
+
+class Passerelle:
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+        self._http = None
+        self._client = None
+        self.rpm = SeauJetons(OPENAI_RPM)
+        self.tpm = SeauJetons(OPENAI_TPM)
+        self.disjoncteur = Disjoncteur()
+        self.appels = 0
+        self.tentatives = 0
+        self.refus = 0
+        self.echecs = 0
+
+    @property
+    def client(self):
+        # SDK OpenAI importé et client créé au premier usage (ou au préchauffage) : l'import de l'application
+        # et le démarrage d'un worker n'en paient plus le coût
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=OPENAI_MAX_CONNEXIONS, max_keepalive_connections=OPENAI_KEEPALIVE),
+                timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_TIMEOUT_CONNEXION),
+            )
+            # Nouvelles tentatives du SDK désactivées : elles passent par appeler() pour respecter les budgets
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=self._http, max_retries=0)
+        return self._client
+
+    @property
+    def http(self):
+        self.client
+        return self._http
+
+    async def fermer(self):
+        if self._http is not None:
+            await self._http.aclose()
+
+    def verifier(self):
+        try:
+            self.disjoncteur.verifier()
+            self.disjoncteur.liberer()
+        except OpenAIIndisponible:
+            self.refus += 1
+            raise
+
+    async def appeler(self, fonction, *args, tokens: int = 0, idempotent: bool = True, **kwargs):
+        self.appels += 1
+        for tentative in range(1, OPENAI_TENTATIVES + 1):
+            try:
+                self.disjoncteur.verifier()
+            except OpenAIIndisponible:
+                self.refus += 1
+                raise
+            try:
+                await self.rpm.prendre(1)
+                await self.tpm.prendre(tokens)
+            except OpenAIIndisponible:
+                self.disjoncteur.liberer()
+                self.refus += 1
+                raise
+            except BaseException:
+                # Annulation pendant l'attente d'un budget : l'essai semi-ouvert ne doit pas rester réservé
+                self.disjoncteur.liberer()
+                raise
+
+            self.tentatives += 1
+            try:
+                resultat = await fonction(*args, **kwargs)
+            except Exception as e:
+                if _panne(e):
+                    self.disjoncteur.echec()
+                else:
+                    self.disjoncteur.liberer()
+                if tentative == OPENAI_TENTATIVES or not _reessayable(e, idempotent):
+                    self.echecs += 1
+                    raise
+                attente = _delai_retry_after(e)
+                if attente is None:
+                    attente = random.uniform(0, OPENAI_BACKOFF_BASE * 2 ** tentative)
+                attente = min(attente, OPENAI_BACKOFF_MAX)
+                print(f"Appel OpenAI en échec (tentative {tentative}/{OPENAI_TENTATIVES}), nouvel essai dans {attente:.1f}s:", e)
+                await asyncio.sleep(attente)
+                continue
+            except BaseException:
+                # CancelledError (client parti, timeout) : ni succès ni panne, l'essai est rendu
+                self.disjoncteur.liberer()
+                raise
+
+            self.disjoncteur.succes()
+            usage = getattr(resultat, "usage", None)
+            if tokens and usage is not None and getattr(usage, "total_tokens", None):
+                self.tpm.ajuster(usage.total_tokens - tokens)
+            return resultat
+
+    def stats(self) -> dict:
+        return {
+            "appels": self.appels,
+            "tentatives": self.tentatives,
+            "refus": self.refus,
+            "echecs": self.echecs,
+            "disjoncteur": self.disjoncteur.etat,
+            "ouvertures_disjoncteur": self.disjoncteur.ouvertures,
+            "rpm_disponibles": round(self.rpm.jetons, 1),
+            "tpm_disponibles": round(self.tpm.jetons),
+        }
@@ -0,0 +1,73 @@
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request
+
+# ========== CONFIGURATION ==========
+
+HTTP_CACHE_ENTREES = int(os.getenv("OBJEX_HTTP_CACHE_ENTREES", "512"))
+
+
+# ========== CACHE DE RÉPONSES EN MÉMOIRE ==========
+
+class ResponseCache:
+    # Corps JSON déjà sérialisés, indexés par (clé de requête, version de la collection ou de la ligne)
+    def __init__(self, max_entrees: int = HTTP_CACHE_ENTREES):
+        self.max_entrees = max_entrees
+        self._entrees: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cle: str, version: int) -> Optional[Tuple[bytes, dict]]:
+        entree = self._entrees.get((cle, version))
+        if entree is None:
+            self.misses += 1
+            return None
+        self._entrees.move_to_end((cle, version))
+        self.hits += 1
+        return entree
+
+    def set(self, cle: str, version: int, corps: bytes, headers: dict):
+        self._entrees[(cle, version)] = (corps, headers)
+        self._entrees.move_to_end((cle, version))
+        while len(self._entrees) > self.max_entrees:
+            self._entrees.popitem(last=False)
+
+    def invalider(self, prefixe: str = ""):
+        # Entrées dont la clé commence par prefixe (toutes par défaut) ; les versions dans les clés
+        # suffisent à la justesse, ceci libère seulement la place des entrées périmées
+        for entree in [e for e in self._entrees if e[0].startswith(prefixe)]:
+            del self._entrees[entree]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entrees": len(self._entrees),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# ========== VALIDATION CONDITIONNELLE ==========
+
+def etag_pour(cle: str, version: int) -> str:
+    return 'W/"' + hashlib.sha1(f"{cle}|{version}".encode()).hexdigest()[:20] + '"'
+
+
+def http_date(moment: datetime) -> str:
+    return format_datetime(moment.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def non_modifie(request: Request, etag: str) -> bool:
+    # Seul l'ETag (version de la ressource) valide : Last-Modified, à la seconde près, laisserait passer
+    # une écriture faite dans la même seconde qu'une lecture. If-Modified-Since est donc ignoré (RFC 9110 le permet)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    etags = [valeur.strip().removeprefix("W/") for valeur in if_none_match.split(",")]
+    return "*" in etags or etag.removeprefix("W/") in etags
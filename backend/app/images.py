@@ -0,0 +1,136 @@
+import asyncio
+import io
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from PIL import Image, ImageFilter, ImageOps
+
+# ========== CONFIGURATION ==========
+
+# gpt-4o (detail high) ramène l'image dans 2048x2048 puis son petit côté à 768 px :
+# au-delà, les pixels envoyés sont payés en upload sans être vus par le modèle
+IMAGE_MAX_COTE = int(os.getenv("OBJEX_IMAGE_MAX_COTE", "2048"))
+IMAGE_MAX_PETIT_COTE = int(os.getenv("OBJEX_IMAGE_MAX_PETIT_COTE", "768"))
+IMAGE_QUALITE_JPEG = int(os.getenv("OBJEX_IMAGE_QUALITE_JPEG", "85"))
+IMAGE_RECADRAGE = os.getenv("OBJEX_IMAGE_RECADRAGE", "0") == "1"
+IMAGE_WORKERS = max(1, int(os.getenv("OBJEX_IMAGE_WORKERS", "4")))
+
+# À incrémenter si le pré-traitement change : le résultat vision dépend de l'image envoyée
+IMAGE_PRETRAITEMENT_VERSION = f"1-{IMAGE_MAX_COTE}-{IMAGE_MAX_PETIT_COTE}-{int(IMAGE_RECADRAGE)}"
+
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+)
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_pool() -> ThreadPoolExecutor:
+    # Pillow relâche le GIL pendant le décodage, le redimensionnement et l'encodage
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="objex-image")
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ========== FORMAT ==========
+
+def detecter_format(entete: bytes) -> Tuple[str, str]:
+    for signature, mime, extension in SIGNATURES:
+        if entete.startswith(signature):
+            return mime, extension
+    if entete[:4] == b"RIFF" and entete[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    return "application/octet-stream", ""
+
+
+# ========== PRÉ-TRAITEMENT ==========
+
+def _recadrer_zone_utile(image: Image.Image) -> Image.Image:
+    # Garde la zone qui concentre les contours (plaque, étiquette) et retire le fond uniforme
+    apercu = image.convert("L")
+    apercu.thumbnail((512, 512))
+    contours = apercu.filter(ImageFilter.FIND_EDGES).point(lambda v: 255 if v > 60 else 0)
+    boite = contours.getbbox()
+    if boite is None:
+        return image
+
+    echelle_x = image.width / apercu.width
+    echelle_y = image.height / apercu.height
+    marge = 8
+    gauche, haut, droite, bas = boite
+    boite = (
+        max(0, int((gauche - marge) * echelle_x)),
+        max(0, int((haut - marge) * echelle_y)),
+        min(image.width, int((droite + marge) * echelle_x)),
+        min(image.height, int((bas + marge) * echelle_y)),
+    )
+    # Un recadrage qui ne gagne presque rien ne vaut pas le risque de couper du texte
+    if (boite[2] - boite[0]) * (boite[3] - boite[1]) > 0.9 * image.width * image.height:
+        return image
+    return image.crop(boite)
+
+
+def _echelle(taille: Tuple[int, int]) -> float:
+    return min(1.0, IMAGE_MAX_COTE / max(taille), IMAGE_MAX_PETIT_COTE / min(taille))
+
+
+def _preparer(path: str) -> Tuple[bytes, str, str]:
+    with Image.open(path) as image:
+        echelle = _echelle(image.size)
+        if echelle < 1.0 and not IMAGE_RECADRAGE:
+            # JPEG : décodage directement à une résolution réduite (aucun effet sur les autres formats)
+            image.draft("RGB", (math.ceil(image.width * echelle), math.ceil(image.height * echelle)))
+
+        # Applique l'orientation EXIF avant de jeter les métadonnées
+        image = ImageOps.exif_transpose(image)
+        if IMAGE_RECADRAGE:
+            image = _recadrer_zone_utile(image)
+
+        echelle = _echelle(image.size)
+        if echelle < 1.0:
+            taille = (max(1, round(image.width * echelle)), max(1, round(image.height * echelle)))
+            image = image.resize(taille, Image.LANCZOS)
+
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            # Transparence aplatie sur fond blanc (un fond noir masquerait le texte sombre)
+            image = image.convert("RGBA")
+            fond = Image.new("RGB", image.size, "white")
+            fond.paste(image, mask=image.getchannel("A"))
+            image = fond
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        sortie = io.BytesIO()
+        # Ré-encodage sans EXIF ni profil : seules les données d'image partent vers OpenAI
+        image.save(sortie, format="JPEG", quality=IMAGE_QUALITE_JPEG, optimize=True)
+        return sortie.getvalue(), "image/jpeg", ".jpg"
+
+
+async def preparer_image(path: str, filename: str) -> Tuple[str, bytes, str]:
+    # Renvoie (nom, contenu, type MIME) prêts pour files.create
+    loop = asyncio.get_running_loop()
+    base = os.path.splitext(filename)[0]
+    try:
+        content, mime, extension = await loop.run_in_executor(get_pool(), _preparer, path)
+    except Exception as e:
+        # Image illisible par Pillow : envoyée telle quelle, avec son vrai type
+        print("Erreur pré-traitement image:", e)
+        with open(path, "rb") as f:
+            content = f.read()
+        mime, extension = detecter_format(content[:16])
+        if not extension:
+            extension = os.path.splitext(filename)[1]
+    return base + extension, content, mime
@@ -0,0 +1,187 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.metrics import mesurer
+from app.vecteurs import (
+    EMBEDDINGS_DIMENSIONS, KMEANS_ECHANTILLON, KMEANS_ITERATIONS, VECTEURS_LISTES, VECTEURS_RECENTS_MAX,
+    VECTEURS_SEUIL_IVF, VECTEURS_SONDES,
+)
+
+# Partie numpy de l'index des vecteurs : importée par l'indexeur au démarrage de sa tâche,
+# jamais à l'import de l'application (crud, routes)
+
+
+def normaliser(vecteurs: np.ndarray) -> np.ndarray:
+    # Vecteurs unitaires : le produit scalaire est la similarité cosinus
+    normes = np.linalg.norm(vecteurs, axis=-1, keepdims=True)
+    return (vecteurs / np.maximum(normes, 1e-12)).astype(np.float32, copy=False)
+
+
+def depuis_octets(blocs: Sequence[bytes], dimensions: int) -> np.ndarray:
+    # Vecteurs enregistrés (float32 petit-boutiste) convertis d'un bloc en matrice
+    return np.frombuffer(b"".join(blocs), dtype="<f4").reshape(len(blocs), dimensions)
+
+
+def depuis_liste(vecteurs: List[List[float]]) -> np.ndarray:
+    return normaliser(np.asarray(vecteurs, dtype=np.float32))
+
+
+# ========== INDEX EN MÉMOIRE ==========
+
+def _affecter(vecteurs: np.ndarray, centroides: np.ndarray, taille: int = 16384) -> np.ndarray:
+    # Par blocs : la matrice de scores lignes × listes reste petite
+    return np.concatenate([
+        np.argmax(vecteurs[debut:debut + taille] @ centroides.T, axis=1)
+        for debut in range(0, len(vecteurs), taille)
+    ]) if len(vecteurs) else np.empty(0, np.int64)
+
+
+def _kmeans(vecteurs: np.ndarray, listes: int, graine: int = 0) -> np.ndarray:
+    # k-means sphérique sur un échantillon : suffisant pour des listes équilibrées
+    alea = np.random.default_rng(graine)
+    echantillon = vecteurs[alea.choice(len(vecteurs), min(len(vecteurs), listes * KMEANS_ECHANTILLON), replace=False)]
+    centroides = echantillon[alea.choice(len(echantillon), listes, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        affectations = _affecter(echantillon, centroides)
+        sommes = np.zeros_like(centroides)
+        np.add.at(sommes, affectations, echantillon)
+        vides = np.bincount(affectations, minlength=listes) == 0
+        if vides.any():
+            # Liste vide : réensemencée sur une ligne tirée au hasard
+            sommes[vides] = echantillon[alea.choice(len(echantillon), int(vides.sum()))]
+        centroides = normaliser(sommes)
+    return centroides
+
+
+class IndexVecteurs:
+    # Matrice float32 contiguë. Avec l'IVF, les lignes [0, n_ivf) sont rangées liste par liste
+    # (chaque liste est une tranche, sans copie) ; les ajouts suivants, au-delà, sont parcourus en entier
+    def __init__(self, dimensions: int = EMBEDDINGS_DIMENSIONS):
+        self.dimensions = dimensions
+        self._verrou = threading.Lock()
+        self.matrice = np.empty((0, dimensions), np.float32)
+        self.ids = np.empty(0, np.int64)
+        self.n = 0
+        self.positions: Dict[int, int] = {}
+        self.centroides: Optional[np.ndarray] = None
+        self.debuts: Optional[np.ndarray] = None
+        self.n_ivf = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def ivf(self) -> bool:
+        return self.centroides is not None
+
+    def ajouter(self, ids: Sequence[int], vecteurs: np.ndarray):
+        # Ajout incrémental ; un id déjà présent est mis à jour sur place
+        with self._verrou:
+            nouveaux = []
+            for i, item_id in enumerate(ids):
+                position = self.positions.get(int(item_id))
+                if position is None:
+                    nouveaux.append(i)
+                else:
+                    self.matrice[position] = vecteurs[i]
+            if not nouveaux:
+                return
+
+            fin = self.n + len(nouveaux)
+            if fin > len(self.matrice):
+                # Capacité doublée : coût amorti constant par ajout
+                capacite = max(fin, 2 * len(self.matrice), 1024)
+                matrice = np.empty((capacite, self.dimensions), np.float32)
+                matrice[:self.n] = self.matrice[:self.n]
+                identifiants = np.empty(capacite, np.int64)
+                identifiants[:self.n] = self.ids[:self.n]
+                self.matrice, self.ids = matrice, identifiants
+
+            self.matrice[self.n:fin] = vecteurs[nouveaux]
+            self.ids[self.n:fin] = np.asarray(ids, dtype=np.int64)[nouveaux]
+            for decalage, i in enumerate(nouveaux):
+                self.positions[int(ids[i])] = self.n + decalage
+            self.n = fin
+
+    def vecteur(self, item_id: int) -> Optional[np.ndarray]:
+        with self._verrou:
+            position = self.positions.get(item_id)
+            return None if position is None else self.matrice[position].copy()
+
+    def a_reconstruire(self) -> bool:
+        if self.n < VECTEURS_SEUIL_IVF:
+            return False
+        return not self.ivf or self.n - self.n_ivf > VECTEURS_RECENTS_MAX * self.n_ivf
+
+    def construire_ivf(self):
+        # Hors verrou pour l'essentiel (k-means, affectations) : les recherches continuent pendant ce temps
+        with self._verrou:
+            n, matrice = self.n, self.matrice
+        listes = min(n, VECTEURS_LISTES or max(1, int(np.sqrt(n))))
+        with mesurer("vecteurs_ivf", lignes=n, listes=listes):
+            centroides = _kmeans(matrice[:n], listes)
+            affectations = _affecter(matrice[:n], centroides)
+            ordre = np.argsort(affectations, kind="stable")
+            debuts = np.searchsorted(affectations[ordre], np.arange(listes + 1))
+
+            with self._verrou:
+                # Lignes ajoutées pendant le calcul : recopiées à la suite, hors IVF
+                nouvelle = np.empty_like(self.matrice)
+                nouvelle[:n] = self.matrice[ordre]
+                nouvelle[n:self.n] = self.matrice[n:self.n]
+                identifiants = np.empty_like(self.ids)
+                identifiants[:n] = self.ids[ordre]
+                identifiants[n:self.n] = self.ids[n:self.n]
+                self.matrice, self.ids = nouvelle, identifiants
+                self.positions = dict(zip(identifiants[:self.n].tolist(), range(self.n)))
+                self.centroides, self.debuts, self.n_ivf = centroides, debuts, n
+
+    def rechercher(self, requete: np.ndarray, limite: int, exact: bool = False,
+                   exclure: Optional[int] = None) -> List[Tuple[int, float]]:
+        with self._verrou:
+            matrice, ids, n = self.matrice, self.ids, self.n
+            centroides, debuts, n_ivf = self.centroides, self.debuts, self.n_ivf
+        if n == 0:
+            return []
+
+        if exact or centroides is None:
+            # Mode exhaustif : référence de justesse pour l'IVF
+            tranches = [(0, n)]
+        else:
+            sondes = min(VECTEURS_SONDES, len(centroides))
+            proches = np.argpartition(-(centroides @ requete), sondes - 1)[:sondes]
+            tranches = [(int(debuts[liste]), int(debuts[liste + 1])) for liste in proches] + [(n_ivf, n)]
+
+        # Meilleurs candidats de chaque tranche, puis classement final
+        garder = limite + (exclure is not None)
+        scores, positions = [], []
+        for debut, fin in tranches:
+            if fin <= debut:
+                continue
+            valeurs = matrice[debut:fin] @ requete
+            meilleurs = np.argpartition(-valeurs, garder - 1)[:garder] if len(valeurs) > garder else np.arange(len(valeurs))
+            scores.append(valeurs[meilleurs])
+            positions.append(meilleurs + debut)
+        if not scores:
+            return []
+        scores, positions = np.concatenate(scores), np.concatenate(positions)
+
+        resultats = []
+        for i in np.argsort(-scores):
+            item_id = int(ids[positions[i]])
+            if item_id == exclure:
+                continue
+            resultats.append((item_id, float(scores[i])))
+            if len(resultats) == limite:
+                break
+        return resultats
+
+    def stats(self) -> dict:
+        return {
+            "lignes": self.n,
+            "listes": 0 if self.centroides is None else len(self.centroides),
+            "hors_ivf": self.n - self.n_ivf if self.ivf else self.n,
+            "memoire_mo": round(self.matrice.nbytes / 1_000_000, 1),
+        }
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import and_, or_
+
+from app import models
+from app.database import SessionLocal
+from app.uploads import FichierDepose
+
+# ========== CONFIGURATION ==========
+
+JOBS_WORKERS = max(1, int(os.getenv("OBJEX_JOBS_WORKERS", "2")))
+JOBS_MAX_PENDING = max(1, int(os.getenv("OBJEX_JOBS_MAX_PENDING", "100")))
+JOBS_MAX_ATTEMPTS = max(1, int(os.getenv("OBJEX_JOBS_MAX_ATTEMPTS", "3")))
+JOBS_RETRY_DELAY = float(os.getenv("OBJEX_JOBS_RETRY_DELAY", "10"))
+JOBS_POLL = float(os.getenv("OBJEX_JOBS_POLL", "2"))
+# Durée du bail d'un worker : un job "running" dont le bail a expiré est repris (redémarrage, crash)
+JOBS_LEASE = float(os.getenv("OBJEX_JOBS_LEASE", "900"))
+# Le bail est prolongé à cet intervalle tant que le job tourne : seul un worker arrêté le laisse expirer
+JOBS_HEARTBEAT = float(os.getenv("OBJEX_JOBS_HEARTBEAT", str(JOBS_LEASE / 3)))
+JOBS_DIR = os.getenv("OBJEX_JOBS_DIR", "./jobs_data")
+
+
+class QueuePleine(Exception):
+    pass
+
+
+# ========== FILE D'ATTENTE SQLITE ==========
+
+class JobQueue:
+    def __init__(self, executer: Callable[..., Awaitable[dict]],
+                 session_factory=SessionLocal, workers: int = JOBS_WORKERS):
+        self.executer = executer
+        self.session_factory = session_factory
+        self.nombre_workers = workers
+        self._workers: List[asyncio.Task] = []
+        self._reveil = asyncio.Event()
+
+    async def demarrer(self):
+        # Les jobs interrompus par un arrêt propre sont déjà revenus dans la file ; après un crash, ils sont
+        # repris dès que leur bail expire
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._boucle()) for _ in range(self.nombre_workers)]
+
+    async def arreter(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # ========== API ==========
+
+    async def soumettre(self, fichiers: List[FichierDepose], texts: List[str], priority: int = 0,
+                        options: Optional[dict] = None) -> str:
+        # options : paramètres de la requête d'origine, repassés tels quels à executer()
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._soumettre, job_id, fichiers, texts, priority, options or {})
+        self._reveil.set()
+        return job_id
+
+    async def lire(self, job_id: str) -> Optional[models.AnalysisJob]:
+        return await asyncio.to_thread(self._lire, job_id)
+
+    def _soumettre(self, job_id: str, fichiers: List[FichierDepose], texts, priority: int, options: dict):
+        db = self.session_factory()
+        try:
+            en_attente = db.query(models.AnalysisJob).filter(models.AnalysisJob.status == "queued").count()
+            if en_attente >= JOBS_MAX_PENDING:
+                raise QueuePleine(f"{en_attente} analyses en attente")
+
+            # Les fichiers déposés sont déplacés dans le dossier du job pour survivre à un redémarrage
+            dossier = os.path.join(JOBS_DIR, job_id)
+            references = []
+            for i, fichier in enumerate(fichiers):
+                fichier.deplacer(dossier, f"{i:03d}")
+                references.append({"filename": fichier.filename, "path": fichier.path})
+
+            db.add(models.AnalysisJob(
+                id=job_id,
+                priority=priority,
+                max_attempts=JOBS_MAX_ATTEMPTS,
+                payload=json.dumps({"texts": texts, "fichiers": references, "options": options}, ensure_ascii=False),
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def _lire(self, job_id: str) -> Optional[models.AnalysisJob]:
+        db = self.session_factory()
+        try:
+            return db.get(models.AnalysisJob, job_id)
+        finally:
+            db.close()
+
+    # ========== WORKERS ==========
+
+    async def _boucle(self):
+        while True:
+            # Aucune erreur (base verrouillée, écriture du résultat...) ne doit faire disparaître le worker
+            try:
+                job = await asyncio.to_thread(self._reserver)
+                if job is not None:
+                    await self._traiter(*job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Erreur file d'analyses:", e)
+
+            self._reveil.clear()
+            try:
+                await asyncio.wait_for(self._reveil.wait(), timeout=JOBS_POLL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _reserver(self):
+        Job = models.AnalysisJob
+        db = self.session_factory()
+        try:
+            maintenant = datetime.utcnow()
+            self._abandonner_epuises(db, maintenant)
+            bail_expire = and_(Job.status == "running", Job.lease_until < maintenant, Job.attempts < Job.max_attempts)
+            candidats = (
+                db.query(Job.id)
+                .filter(or_(
+                    and_(Job.status == "queued", Job.available_at <= maintenant),
+                    bail_expire,
+                ))
+                .order_by(Job.priority.desc(), Job.created_at)
+                .limit(5)
+                .all()
+            )
+
+            for (job_id,) in candidats:
+                # UPDATE conditionnel : un seul worker (ou processus) obtient le job
+                reserve = (
+                    db.query(Job)
+                    .filter(Job.id == job_id)
+                    .filter(or_(Job.status == "queued", bail_expire))
+                    .update({
+                        Job.status: "running",
+                        Job.attempts: Job.attempts + 1,
+                        Job.lease_until: maintenant + timedelta(seconds=JOBS_LEASE),
+                        Job.updated_at: maintenant,
+                    }, synchronize_session=False)
+                )
+                db.commit()
+                if reserve:
+                    job = db.get(Job, job_id)
+                    return job.id, json.loads(job.payload)
+
+            return None
+        finally:
+            db.close()
+
+    def _abandonner_epuises(self, db, maintenant: datetime):
+        # Bail expiré sans tentative restante (le job fait tomber son worker) : échec définitif, pas de reprise
+        Job = models.AnalysisJob
+        epuises = [
+            job_id for (job_id,) in db.query(Job.id).filter(
+                Job.status == "running", Job.lease_until < maintenant, Job.attempts >= Job.max_attempts,
+            )
+        ]
+        if not epuises:
+            return
+        (
+            db.query(Job)
+            .filter(Job.id.in_(epuises), Job.status == "running", Job.lease_until < maintenant)
+            .update({
+                Job.status: "failed",
+                Job.error: "bail expiré : tentatives épuisées",
+                Job.lease_until: None,
+                Job.updated_at: maintenant,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        for job_id in epuises:
+            shutil.rmtree(os.path.join(JOBS_DIR, job_id), ignore_errors=True)
+
+    def _prolonger(self, job_id: str):
+        Job = models.AnalysisJob
+        db = self.session_factory()
+        try:
+            maintenant = datetime.utcnow()
+            (
+                db.query(Job)
+                .filter(Job.id == job_id, Job.status == "running")
+                .update({Job.lease_until: maintenant + timedelta(seconds=JOBS_LEASE), Job.updated_at: maintenant},
+                        synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _battement(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOBS_HEARTBEAT)
+            try:
+                await asyncio.to_thread(self._prolonger, job_id)
+            except Exception as e:
+                print(f"Erreur prolongation du bail du job {job_id}:", e)
+
+    async def _traiter(self, job_id: str, payload: dict):
+        battement = asyncio.create_task(self._battement(job_id))
+        try:
+            fichiers = await asyncio.to_thread(self._charger_fichiers, payload["fichiers"])
+            # Jobs antérieurs sans options : valeurs par défaut de l'exécuteur
+            resultat = await self.executer(fichiers, payload["texts"], **payload.get("options", {}))
+        except asyncio.CancelledError:
+            # Arrêt du worker (déploiement) : le job est rendu à la file pour être repris dès le redémarrage,
+            # l'expiration du bail ne couvre plus que les crashs
+            battement.cancel()
+            await asyncio.shield(asyncio.to_thread(self._remettre, job_id))
+            raise
+        except Exception as e:
+            print(f"Erreur job {job_id}:", e)
+            await asyncio.to_thread(self._echec, job_id, str(e))
+            return
+        finally:
+            battement.cancel()
+
+        await asyncio.to_thread(self._terminer, job_id, resultat)
+
+    def _charger_fichiers(self, references: List[dict]) -> List[FichierDepose]:
+        return [FichierDepose.depuis_chemin(ref["filename"], ref["path"]) for ref in references]
+
+    def _terminer(self, job_id: str, resultat: dict):
+        db = self.session_factory()
+        try:
+            job = db.get(models.AnalysisJob, job_id)
+            job.status = "done"
+            job.result = json.dumps(resultat, ensure_ascii=False, default=str)
+            job.error = None
+            job.lease_until = None
+            db.commit()
+        finally:
+            db.close()
+        shutil.rmtree(os.path.join(JOBS_DIR, job_id), ignore_errors=True)
+
+    def _remettre(self, job_id: str):
+        # Un arrêt n'est pas un échec : la tentative n'est pas décomptée
+        Job = models.AnalysisJob
+        db = self.session_factory()
+        try:
+            maintenant = datetime.utcnow()
+            (
+                db.query(Job)
+                .filter(Job.id == job_id, Job.status == "running")
+                .update({
+                    Job.status: "queued",
+                    Job.attempts: Job.attempts - 1,
+                    Job.lease_until: None,
+                    Job.available_at: maintenant,
+                    Job.updated_at: maintenant,
+                }, synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _echec(self, job_id: str, erreur: str):
+        db = self.session_factory()
+        try:
+            job = db.get(models.AnalysisJob, job_id)
+            job.error = erreur
+            job.lease_until = None
+            if job.attempts < job.max_attempts:
+                # Nouvel essai avec un délai croissant
+                job.status = "queued"
+                job.available_at = datetime.utcnow() + timedelta(seconds=JOBS_RETRY_DELAY * job.attempts)
+            else:
+                job.status = "failed"
+            db.commit()
+            definitif = job.status == "failed"
+        finally:
+            db.close()
+        if definitif:
+            shutil.rmtree(os.path.join(JOBS_DIR, job_id), ignore_errors=True)
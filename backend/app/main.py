@@ -1,32 +1,119 @@
 # ========== IMPORTS ==========
 
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import AsyncIterator, Callable, List, Optional
 import os
-import io
+import asyncio
+import json
 import time
-import pdfplumber
-import requests
+from contextlib import asynccontextmanager
+from datetime import datetime
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
-import openai
-import re
+
+# Variables d'environnement chargées avant les modules internes qui lisent leur configuration à l'import
+load_dotenv()
 
 # App interne
-from app import models, schemas, crud
-from app.database import SessionLocal, engine
+from app import models, schemas, crud_async, images, pdf
+from app.database import AsyncSessionLocal, SessionLocal, async_engine, engine, pool_stats
+from app.vision import VisionAssistantManager, ROUND_TRIPS_ECONOMISES, VISION_MODEL, VISION_PROMPT_VERSION
+from app.pdf import stream_pdf_pages
+from app.images import IMAGE_PRETRAITEMENT_VERSION, preparer_image
+from app.cache import AnalysisCache, Diffusion, SingleFlight, cle_contenu, cle_empreinte
+from app.jobs import JobQueue, QueuePleine
+from app.uploads import FichierDepose, recevoir_corps, recevoir_formulaire, supprimer_fichiers
+from app.bulk import BULK_MAX_OCTETS, importer_fichier, detecter_format as detecter_format_import
+from app.search import rechercher
+from app.http_cache import ResponseCache, etag_pour, http_date, non_modifie
+from app.gateway import OpenAIIndisponible, Passerelle, estimer_tokens, statut_http
+from app.metrics import (
+    METRICS_CONTENT_TYPE, DOUBLONS, DUREE_ETAPE, FUSIONS, CollecteurStats, compter_tokens, debug_echantillonne,
+    enregistrer_collecteur, exposer, mesurer,
+)
+from app.doublons import (
+    DOUBLONS_ACTIFS, ajouter_empreintes, empreintes_images, rechercher_doublon,
+)
+from app.vecteurs import VECTEURS_ACTIFS, IndexeurVecteurs
+from app.migrations import MIGRATIONS_AU_DEMARRAGE, migrer
+from app.condensation import (
+    CONDENSATION_MAP_REDUCE, MAP_MODEL, MAP_SYSTEM_PROMPT, condenser, signature as signature_condensation,
+)
+from app.fiche import (
+    FORMAT_REPONSE, FUSION_MODEL, FUSION_PROMPT_VERSION, FUSION_SYSTEM_PROMPT,
+    ParseurIncremental, extraire_fiche, produit_depuis, rendre_fiche,
+)
 
 # ========== ENVIRONNEMENT & OPENAI ==========
 
-load_dotenv()
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Client OpenAI unique derrière la passerelle (pool HTTP, budgets RPM/TPM, nouvelles tentatives, disjoncteur)
+passerelle = Passerelle(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Nombre maximum de fichiers analysés en parallèle pour une même requête /analyse
+ANALYSE_CONCURRENCY = max(1, int(os.getenv("OBJEX_ANALYSE_CONCURRENCY", "4")))
+
+# Version de l'extraction PDF, incluse dans la clé de cache
+PDF_EXTRACTION_VERSION = "pdfplumber-2"
+
+vision = VisionAssistantManager(passerelle)
+cache = AnalysisCache()
+fusion_flight = SingleFlight()
+response_cache = ResponseCache()
+indexeur_vecteurs = IndexeurVecteurs(passerelle)
+enregistrer_collecteur(CollecteurStats(
+    caches={"analyse": cache.stats, "http": response_cache.stats},
+    openai_stats=passerelle.stats,
+))
 
 # ========== INIT FASTAPI APP ==========
 
-app = FastAPI()
-models.Base.metadata.create_all(bind=engine)
+async def prechauffer():
+    # Après l'ouverture du port : le worker répond pendant que les dépendances lourdes se chargent
+    with mesurer("prechauffage"):
+        # Import du SDK OpenAI et pool HTTP (hors de la boucle d'événements)
+        await asyncio.to_thread(lambda: passerelle.client)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, pdf.prechauffer)
+        except Exception as e:
+            print("Erreur préchauffage PDF:", e)
+        try:
+            await vision.demarrer()
+        except Exception as e:
+            # L'assistant sera créé à la première analyse si OpenAI est injoignable au démarrage
+            print("Erreur initialisation assistant vision:", e)
+        # Première page du catalogue : pool de connexions, sérialisation et cache HTTP amorcés
+        try:
+            import httpx
+
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://prechauffage") as local:
+                await local.get("/products")
+        except Exception as e:
+            print("Erreur préchauffage routes:", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schéma créé une seule fois (verrou entre workers) avant d'accepter des requêtes
+    if MIGRATIONS_AU_DEMARRAGE:
+        await asyncio.to_thread(migrer, engine)
+    await jobs.demarrer()
+    await indexeur_vecteurs.demarrer()
+    prechauffage = asyncio.create_task(prechauffer())
+    yield
+    prechauffage.cancel()
+    await indexeur_vecteurs.arreter()
+    await jobs.arreter()
+    await vision.arreter()
+    await passerelle.fermer()
+    pdf.shutdown_pool()
+    await async_engine.dispose()
+    images.shutdown_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # ========== CORS POLICY ==========
 origins = [
@@ -41,8 +128,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
+@app.exception_handler(OpenAIIndisponible)
+async def openai_indisponible(request: Request, exc: OpenAIIndisponible):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
 # ========== BASE DB DEPENDENCY ==========
 
 def get_db():
@@ -52,209 +148,742 @@ def get_db():
     finally:
         db.close()
 
-# ========== UTILS ==========
-
-import re
-
-def parser_reponse_ia(texte):
-    titre = ""
-    description = ""
-    fiche_technique = ""
-
-    try:
-        titre_match = re.search(r"Titre\s*\*\*?\s*[:\-]\s*(.*)", texte, re.IGNORECASE)
-        description_match = re.search(r"Description\s*\*\*?\s*[:\-]\s*(.*)", texte, re.IGNORECASE)
-        fiche_match = re.search(r"Fiche Technique\s*\*\*?\s*[:\-]([\s\S]*)", texte, re.IGNORECASE)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
-        if titre_match:
-            titre = titre_match.group(1).strip()
+# ========== UTILS ==========
 
-        if description_match:
-            description = description_match.group(1).strip()
+def cle_image(fichier: FichierDepose) -> str:
+    return cle_empreinte(fichier.empreinte, VISION_MODEL, VISION_PROMPT_VERSION, IMAGE_PRETRAITEMENT_VERSION)
 
-        if fiche_match:
-            fiche_technique = fiche_match.group(1).strip()
-        
-    except Exception as e:
-        print("Erreur parsing IA:", e)
+def cle_pdf(fichier: FichierDepose) -> str:
+    return cle_empreinte(fichier.empreinte, PDF_EXTRACTION_VERSION)
 
-    return {
-        "titre": titre,
-        "description": description,
-        "fiche_technique": fiche_technique
-    }
-
-async def extract_text_from_pdf(content: bytes) -> str:
+async def extract_text_from_pdf(fichier: FichierDepose, sur_page: Optional[Callable[[int, str], None]] = None) -> str:
     try:
-        text_content = ""
-        with pdfplumber.open(io.BytesIO(content)) as pdf:
-            for page in pdf.pages:
-                if page.extract_text():
-                    text_content += page.extract_text()
-        return text_content.strip()
+        cle = cle_pdf(fichier)
+        en_cache = await cache.get(cle)
+        if en_cache is not None:
+            return en_cache
+
+        # Les processus pdfplumber lisent le fichier déposé : aucun contenu recopié entre processus ;
+        # chaque page est signalée dès que son lot est extrait (flux SSE)
+        pages = []
+        with mesurer("pdf", taille=fichier.taille):
+            async for texte in stream_pdf_pages(fichier.path):
+                pages.append(texte)
+                if sur_page is not None and texte:
+                    sur_page(len(pages), texte)
+        text_content = "\n".join(texte for texte in pages if texte).strip()
+        await cache.set(cle, "pdf", text_content)
+        return text_content
     except Exception as e:
         print("Erreur lecture PDF:", e)
         return ""
 
-async def analyse_image_with_openai(file_content: bytes, filename: str) -> str:
+async def analyse_image_with_openai(fichier: FichierDepose, file_id: str = None) -> str:
+    # file_id pré-téléversé par lancer_analyses : supprimé ici tant qu'il n'est pas confié à vision.analyser
+    # (résultat mis en cache entre-temps par une requête identique, erreur avant l'analyse)
+    confie = False
     try:
-        uploaded_file = openai.files.create(
-            file=(filename, io.BytesIO(file_content), "image/jpeg"),
-            purpose="assistants"
-        )
+        cle = cle_image(fichier)
+        en_cache = await cache.get(cle)
+        if en_cache is not None:
+            return en_cache
+
+        if file_id is None:
+            image = await preparer_image(fichier.path, fichier.filename.lower())
+            with mesurer("vision_upload", fichiers=1):
+                [file_id] = await vision.televerser([image])
+
+        confie = True
+        with mesurer("vision"):
+            final_response = await vision.analyser(file_id)
+        await cache.set(cle, "image", final_response)
+        return final_response
 
-        assistant = openai.beta.assistants.create(
-            name="Objex Vision Assistant",
-            instructions=(
-                "Tu es un expert en analyse de produits industriels. "
-                "Analyse précisément les fichiers et textes fournis. "
-                "Structure stricte : Titre, Description, Fiche Technique."
-            ),
-            model="gpt-4o",
-            tools=[{"type": "code_interpreter"}]
+    except Exception as e:
+        print("Erreur analyse image:", e)
+        return f"Erreur d'analyse OpenAI : {str(e)}"
+    finally:
+        if not confie:
+            vision.planifier_nettoyage(file_id=file_id)
+
+def normaliser_indices(texts: List[str]) -> List[str]:
+    # Espaces compactés, textes vides retirés, ordre canonique : pour la clé seulement,
+    # le prompt garde l'ordre des fichiers et les retours à la ligne
+    return sorted({" ".join(text.split()) for text in texts if text and text.strip()})
+
+def cle_fusion(image_texts: List[str], ocr_texts: List[str], user_texts: List[str]) -> str:
+    canonique = json.dumps(
+        [normaliser_indices(image_texts), normaliser_indices(ocr_texts), normaliser_indices(user_texts)],
+        ensure_ascii=False,
+    )
+    return cle_contenu(canonique.encode(), FUSION_MODEL, FUSION_PROMPT_VERSION, signature_condensation())
+
+async def resumer_extraits(extraits: str) -> str:
+    # Passe map de la condensation : modèle économique, sans effet de bord (rejouable)
+    messages = [{"role": "system", "content": MAP_SYSTEM_PROMPT}, {"role": "user", "content": extraits}]
+    with mesurer("condensation_map"):
+        chat_completion = await passerelle.appeler(
+            passerelle.client.chat.completions.create,
+            tokens=estimer_tokens(messages, max_sortie=500),
+            model=MAP_MODEL,
+            messages=messages,
+            max_tokens=500,
         )
+    compter_tokens(MAP_MODEL, getattr(chat_completion, "usage", None))
+    return chat_completion.choices[0].message.content or ""
 
-        thread = openai.beta.threads.create()
+async def condenser_ocr(ocr_texts: List[str]) -> List[str]:
+    # Notices longues : seuls les passages pertinents entrent dans le budget du prompt de fusion
+    with mesurer("condensation", textes=len(ocr_texts)):
+        return await condenser(ocr_texts, resumer_extraits if CONDENSATION_MAP_REDUCE else None)
 
-        openai.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=[
-                {"type": "text", "text": "Merci d'analyser cette image industrielle."},
-                {"type": "image_file", "image_file": {"file_id": uploaded_file.id}}
-            ]
-        )
+def messages_fusion(image_texts: List[str], ocr_texts: List[str], user_texts: List[str]) -> List[dict]:
+    messages = [{"role": "system", "content": FUSION_SYSTEM_PROMPT}]
+
+    for text in image_texts + ocr_texts + user_texts:
+        if text and text.strip():
+            messages.append({"role": "user", "content": text})
+
+    debug_echantillonne("Contenu fusionné envoyé à OpenAI :", messages)
+    return messages
+
+async def completion_fusion(image_texts: List[str], ocr_texts: List[str], user_texts: List[str]) -> str:
+    messages = messages_fusion(image_texts, await condenser_ocr(ocr_texts), user_texts)
 
-        run = openai.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=assistant.id,
+    # Sans effet de bord côté OpenAI : rejouable en cas de coupure ou de 5xx
+    with mesurer("fusion", messages=len(messages)):
+        chat_completion = await passerelle.appeler(
+            passerelle.client.chat.completions.create,
+            tokens=estimer_tokens(messages),
+            model=FUSION_MODEL,
+            messages=messages,
+            response_format=FORMAT_REPONSE,
         )
 
-        while run.status not in ["completed", "failed"]:
-            time.sleep(2)
-            run = openai.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+    compter_tokens(FUSION_MODEL, getattr(chat_completion, "usage", None))
+    return chat_completion.choices[0].message.content
 
-        messages = openai.beta.threads.messages.list(thread_id=thread.id)
-        final_response = messages.data[0].content[0].text.value
+async def fusion_memoisee(image_texts: List[str], ocr_texts: List[str], user_texts: List[str]):
+    cle = cle_fusion(image_texts, ocr_texts, user_texts)
 
-        return final_response
+    if not fusion_flight.en_cours(cle):
+        en_cache = await cache.get(cle)
+        if en_cache is not None:
+            return en_cache, "hit"
+
+    async def calculer():
+        texte_ia = await completion_fusion(image_texts, ocr_texts, user_texts)
+        await cache.set(cle, "fusion", texte_ia)
+        return texte_ia
+
+    texte_ia, partage = await fusion_flight.executer(cle, calculer)
+    return texte_ia, "partage" if partage else "miss"
+
+def resultat_fusion(texte_ia: str, statut_memo: str) -> dict:
+    # Sortie JSON structurée ; le texte libre (ancien format, modèle sans json_schema) passe par le repli
+    FUSIONS.labels(statut_memo).inc()
+    with mesurer("parsing"):
+        fiche = extraire_fiche(texte_ia)
+    analyse_globale = rendre_fiche(fiche) if texte_ia.lstrip().startswith("{") else texte_ia
+
+    return {
+        "details": {
+            "analyse_globale": analyse_globale,
+            "fusion_cache": statut_memo,
+        },
+        "title": fiche["title"] or "",
+        "description": fiche["description"] or "",
+        "fiche_technique": fiche["fiche_technique"] or "",
+        "produit": produit_depuis(fiche, analyse_globale),
+    }
+
+def resultat_fusion_erreur(e: Exception) -> dict:
+    print("Erreur analyse fusionnée:", e)
+    return {
+        "details": {
+            "analyse_globale": f"Erreur pendant l'analyse fusionnée : {str(e)}",
+            "fusion_cache": "miss",
+        },
+        "title": "",
+        "description": "",
+        "fiche_technique": "",
+        "produit": None,
+    }
+
+async def generer_fusion(cle: str, diffusion: Diffusion, image_texts: List[str], ocr_texts: List[str],
+                         user_texts: List[str]) -> str:
+    # Génération en flux publiée dans la diffusion : les requêtes identiques la suivent au lieu de relancer OpenAI
+    messages = messages_fusion(image_texts, await condenser_ocr(ocr_texts), user_texts)
+    # Seule l'ouverture du flux est rejouée ; une coupure en cours de génération remonte en erreur
+    debut = time.perf_counter()
+    flux = await passerelle.appeler(
+        passerelle.client.chat.completions.create,
+        tokens=estimer_tokens(messages),
+        model=FUSION_MODEL,
+        messages=messages,
+        response_format=FORMAT_REPONSE,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    async for chunk in flux:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            diffusion.publier(delta)
+        # Dernier morceau : usage de la génération complète
+        compter_tokens(FUSION_MODEL, getattr(chunk, "usage", None))
+    DUREE_ETAPE.labels("fusion_flux").observe(time.perf_counter() - debut)
+
+    texte_ia = "".join(diffusion.morceaux)
+    await cache.set(cle, "fusion", texte_ia)
+    return texte_ia
+
+async def stream_fusion(image_texts: List[str], ocr_texts: List[str], user_texts: List[str]) -> AsyncIterator:
+    # Produit les morceaux de texte au fil de la génération, puis le résultat final (dict)
+    cle = cle_fusion(image_texts, ocr_texts, user_texts)
+
+    try:
+        en_cache = None
+        if not fusion_flight.en_cours(cle):
+            en_cache = await cache.get(cle)
+
+        if en_cache is not None:
+            texte_ia, statut_memo = en_cache, "hit"
+            yield texte_ia
+
+        else:
+            diffusion = Diffusion()
+            tache, partage = fusion_flight.lancer(
+                cle, lambda: generer_fusion(cle, diffusion, image_texts, ocr_texts, user_texts), diffusion,
+            )
+            if partage:
+                # Requête identique déjà en vol : ses morceaux sont rejoués puis suivis (aucun si elle n'est pas en flux)
+                diffusion = fusion_flight.diffusion(cle)
+            if diffusion is not None:
+                async for delta in diffusion.lire():
+                    yield delta
+            # shield : un client qui se déconnecte n'interrompt pas la génération des autres
+            texte_ia = await asyncio.shield(tache)
+            if diffusion is None:
+                yield texte_ia
+            statut_memo = "partage" if partage else "miss"
+
+        yield resultat_fusion(texte_ia, statut_memo)
 
     except Exception as e:
-        print("Erreur analyse image:", e)
-        return f"Erreur d'analyse OpenAI : {str(e)}"
+        yield resultat_fusion_erreur(e)
 
 async def fusionner_et_analyser(image_texts: List[str], ocr_texts: List[str], user_texts: List[str]) -> dict:
     try:
-        messages = [
-            {"role": "system", "content": (
-                "Tu es un expert en analyse d'objets industriels, techniques et électroniques. "
-                "Structure la réponse avec **Titre**, **Description**, **Fiche Technique**."
-            )}
-        ]
+        texte_ia, statut_memo = await fusion_memoisee(image_texts, ocr_texts, user_texts)
+        return resultat_fusion(texte_ia, statut_memo)
 
-        for text in image_texts + ocr_texts + user_texts:
-            if text:
-                messages.append({"role": "user", "content": text})
+    except OpenAIIndisponible:
+        # Refus immédiat de la passerelle : 503 + Retry-After plutôt qu'une fiche vide
+        raise
+    except Exception as e:
+        return resultat_fusion_erreur(e)
 
-        print("Contenu fusionné envoyé à OpenAI :", messages)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
 
-        chat_completion = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-        )
+def est_image(filename: str) -> bool:
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
 
-        texte_ia = chat_completion.choices[0].message.content
-        resultats_parses = parser_reponse_ia(texte_ia)
+async def analyser_fichier(fichier: FichierDepose, semaphore: asyncio.Semaphore,
+                           file_id: str = None, en_cache: bool = False,
+                           sur_page: Optional[Callable[[int, str], None]] = None):
+    nom = fichier.filename.lower()
 
-        return {
-            "details": {
-                "analyse_globale": texte_ia,
-            },
-            "title": resultats_parses["titre"],
-            "description": resultats_parses["description"],
-            "fiche_technique": resultats_parses["fiche_technique"]
-        }
+    async with semaphore:
+        if est_image(nom):
+            analyse_result = await analyse_image_with_openai(fichier, file_id)
+            return {
+                "filename": fichier.filename,
+                "type": "image",
+                "analyse_ia": analyse_result,
+                "cache": "hit" if en_cache else "miss",
+                # Résultat en cache : aucun run Assistants, donc aucun aller-retour économisé
+                "round_trips_economises": 0 if en_cache else ROUND_TRIPS_ECONOMISES,
+            }
+
+        if nom.endswith(".pdf"):
+            extracted_text = await extract_text_from_pdf(fichier, sur_page)
+            return {
+                "filename": fichier.filename,
+                "type": "pdf",
+                "texte_detecté": extracted_text,
+                "cache": "hit" if en_cache else "miss",
+            }
 
-    except Exception as e:
-        print("Erreur analyse fusionnée:", e)
-        return {
-            "details": {
-                "analyse_globale": f"Erreur pendant l'analyse fusionnée : {str(e)}"
-            },
-            "title": "",
-            "description": "",
-            "fiche_technique": ""
-        }
+    return None
 
 # ========== ROUTES PRODUITS EXISTANTES ==========
 
-@app.get("/products", response_model=list[schemas.Product])
-def read_products(db: Session = Depends(get_db)):
-    return crud.get_products(db)
+PRODUCTS_PAGE_SIZE = int(os.getenv("OBJEX_PRODUCTS_PAGE_SIZE", "50"))
+PRODUCTS_PAGE_MAX = int(os.getenv("OBJEX_PRODUCTS_PAGE_MAX", "500"))
+
+async def reponse_en_cache(request: Request, cle: str, version: int, modifie_le: datetime, fabrique):
+    # L'ETag dérive de la version de la ressource (collection pour les listes, ligne pour une fiche)
+    etag = etag_pour(cle, version)
+    headers = {"ETag": etag, "Last-Modified": http_date(modifie_le), "Cache-Control": "no-cache"}
+    if non_modifie(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    entree = response_cache.get(cle, version)
+    if entree is None:
+        contenu, extra = await fabrique()
+        entree = (json.dumps(jsonable_encoder(contenu), ensure_ascii=False).encode("utf-8"), extra)
+        response_cache.set(cle, version, *entree)
+    corps, extra = entree
+    return Response(content=corps, media_type="application/json", headers={**headers, **extra})
+
+@app.get("/products", response_model=None)
+async def read_products(request: Request, cursor: Optional[int] = None,
+                        limit: int = Query(PRODUCTS_PAGE_SIZE, ge=1, le=PRODUCTS_PAGE_MAX),
+                        fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    champs = None
+    if fields:
+        champs = [champ.strip() for champ in fields.split(",") if champ.strip()]
+        inconnus = [champ for champ in champs if champ not in schemas.Product.model_fields]
+        if inconnus:
+            raise HTTPException(status_code=400, detail=f"Champs inconnus : {', '.join(inconnus)}")
+        # L'id sert de curseur : toujours sélectionné
+        if "id" not in champs:
+            champs.insert(0, "id")
+
+    async def page():
+        # Une ligne de plus que demandé indique s'il existe une page suivante
+        rows = await crud_async.get_products(db, cursor=cursor, limit=limit + 1, fields=champs)
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = str(rows[-1].id)
+
+        if champs:
+            return [row._asdict() for row in rows], headers
+        return [schemas.Product.model_validate(row) for row in rows], headers
+
+    # Version de la collection : une lecture par clé primaire suffit à valider la page
+    version, modifie_le = await crud_async.get_collection_version(db)
+    cle = f"products:{cursor}:{limit}:{','.join(champs or [])}"
+    return await reponse_en_cache(request, cle, version, modifie_le, page)
 
 @app.post("/products", response_model=schemas.Product)
-def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
-    return crud.create_product(db, product)
+async def create_product(product: schemas.ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    db_product = await crud_async.create_product(db, product)
+    response_cache.invalider("products:")
+    return db_product
+
+@app.post("/products/bulk")
+async def create_products_bulk(request: Request, format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+                               db: Session = Depends(get_db)):
+    # NDJSON ou CSV d'enregistrements ProductCreate ; les erreurs sont rapportées ligne par ligne
+    path = await recevoir_corps(request, BULK_MAX_OCTETS)
+    try:
+        return await asyncio.to_thread(
+            importer_fichier, db, path, detecter_format_import(request.headers.get("content-type"), format)
+        )
+    finally:
+        os.unlink(path)
+        response_cache.invalider("products:")
+
+@app.get("/products/search", response_model=schemas.ProductSearch)
+def search_products(q: Optional[str] = None, marque: Optional[str] = None, modele: Optional[str] = None,
+                    indice_ip: Optional[str] = None, certifications: Optional[str] = None,
+                    limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0),
+                    db: Session = Depends(get_db)):
+    filtres = {
+        "marque": marque,
+        "modele": modele,
+        "indice_ip": indice_ip,
+        "certifications": certifications,
+    }
+    return rechercher(db, q, filtres, limit=limit, offset=offset)
 
 @app.get("/products/{product_id}", response_model=schemas.Product)
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = crud.get_product(db, product_id)
+async def read_product(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Une seule lecture par clé primaire : existence (404 avant « If-None-Match: * »), version de la ligne
+    # pour l'ETag et contenu ; les écritures sur d'autres fiches n'invalident pas celle-ci
+    db_product = await crud_async.get_product(db, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
-    return db_product
-
-@app.post("/save_analysis", response_model=schemas.Product)
-def save_analysis(product: schemas.ProductCreate, db: Session = Depends(get_db)):
-    return crud.create_product(db, product)
 
-# ========== ROUTE PRINCIPALE D'ANALYSE ==========
+    async def produit():
+        return schemas.Product.model_validate(db_product), {}
+
+    modifie_le = db_product.updated_at or db_product.created_at or datetime(1970, 1, 1)
+    return await reponse_en_cache(request, f"product:{product_id}", db_product.version, modifie_le, produit)
+
+# Colonnes renvoyées avec chaque voisin, selon sa table d'origine
+CHAMPS_SIMILAIRES = {
+    "products": (models.Product, ["title", "marque", "modele", "puissance"]),
+    "product_analyses": (models.ProductAnalysis, ["marque", "modele", "puissance"]),
+}
+
+@app.get("/products/{product_id}/similar", response_model=schemas.ProductSimilar)
+async def similar_products(product_id: int, limit: int = Query(10, ge=1, le=100),
+                           mode: str = Query("ivf", pattern="^(ivf|exact)$"), analyses: bool = False,
+                           db: AsyncSession = Depends(get_async_db)):
+    # Produits proches (et pièces / analyses compatibles avec analyses=true) ; mode=exact : parcours exhaustif
+    if not VECTEURS_ACTIFS:
+        # Fonction coupée (OBJEX_VECTEURS=0) : pas un état transitoire, le client ne doit pas réessayer
+        raise HTTPException(status_code=501, detail="Recherche de produits similaires désactivée")
+    if not indexeur_vecteurs.pret:
+        raise HTTPException(status_code=503, detail="Index des vecteurs en cours de chargement",
+                            headers={"Retry-After": "5"})
+
+    debut = time.perf_counter()
+    sources = ("products", "product_analyses") if analyses else ("products",)
+    try:
+        trouves = await indexeur_vecteurs.similaires(product_id, limit, mode == "exact", sources)
+    except OpenAIIndisponible:
+        raise
+    except Exception as e:
+        # Embedding calculé à la demande : une erreur OpenAI est une erreur amont, pas un 500
+        statut = statut_http(e)
+        if statut is None:
+            raise
+        print("Erreur embedding produit similaire:", e)
+        raise HTTPException(status_code=statut, detail=f"Calcul de l'embedding impossible : {e}")
+    if trouves is None:
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
+    duree_ms = round((time.perf_counter() - debut) * 1000, 2)
 
-@app.post("/analyse")
-async def analyse_indices(files: List[UploadFile] = File(default=[]), texts: List[str] = Form(default=[])):
-    print("Fichiers reçus :", [f.filename for f in files])
-    print("Textes reçus :", texts)
+    lignes = {}
+    for source in sources:
+        table, champs = CHAMPS_SIMILAIRES[source]
+        ids = [item_id for origine, item_id, _ in trouves if origine == source]
+        for ligne in await crud_async.get_rows_by_ids(db, table, ids, champs):
+            lignes[(source, ligne.id)] = ligne._asdict()
 
-    results = {
-        "analyse_fichiers": [],
-        "analyse_textes": [],
+    index = indexeur_vecteurs.index["products"]
+    return {
+        "product_id": product_id,
+        "mode": "ivf" if mode == "ivf" and index.ivf else "exact",
+        "duree_ms": duree_ms,
+        # Lignes supprimées depuis leur indexation : ignorées
+        "resultats": [
+            {**lignes[(source, item_id)], "source": source, "score": score}
+            for source, item_id, score in trouves if (source, item_id) in lignes
+        ],
     }
 
-    image_texts = []
-    ocr_texts = []
-    user_texts = texts
+@app.post("/save_analysis", response_model=schemas.Product)
+async def save_analysis(product: schemas.ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    db_product = await crud_async.create_product(db, product)
+    response_cache.invalider("products:")
+    return db_product
+
+@app.get("/db/pool")
+def read_db_pool():
+    return {
+        "sync": pool_stats(engine),
+        "async": pool_stats(async_engine),
+        "http_cache": response_cache.stats(),
+        "vecteurs": indexeur_vecteurs.stats(),
+    }
 
-    for file in files:
-        content = await file.read()
-        filename = file.filename.lower()
+@app.get("/metrics")
+def read_metrics():
+    return Response(content=exposer(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+async def read_job(job_id: str):
+    db_job = await jobs.lire(job_id)
+    if not db_job:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    return schemas.Job(
+        id=db_job.id,
+        status=db_job.status,
+        priority=db_job.priority,
+        attempts=db_job.attempts,
+        error=db_job.error,
+        result=json.loads(db_job.result) if db_job.result else None,
+        created_at=db_job.created_at,
+        updated_at=db_job.updated_at,
+    )
 
-        if filename.endswith((".jpg", ".jpeg", ".png")):
-            analyse_result = await analyse_image_with_openai(content, filename)
-            image_texts.append(analyse_result)
-            results["analyse_fichiers"].append({
-                "filename": file.filename,
-                "type": "image",
-                "analyse_ia": analyse_result
-            })
-
-        elif filename.endswith(".pdf"):
-            extracted_text = await extract_text_from_pdf(content)
-            ocr_texts.append(extracted_text)
-            results["analyse_fichiers"].append({
-                "filename": file.filename,
-                "type": "pdf",
-                "texte_detecté": extracted_text
-            })
+# ========== ROUTE PRINCIPALE D'ANALYSE ==========
 
-    fusion_result = await fusionner_et_analyser(image_texts, ocr_texts, user_texts)
+async def lancer_analyses(fichiers: List[FichierDepose], pages: Optional[asyncio.Queue] = None) -> List[asyncio.Task]:
+    # Résultats déjà en cache : ni upload ni appel modèle pour ces fichiers
+    cles = [cle_image(fichier) if est_image(fichier.filename) else cle_pdf(fichier) for fichier in fichiers]
+    en_cache = await cache.contient(cles) if cles else {}
+
+    # Téléversement groupé des images manquantes avant le fan-out des analyses
+    file_ids = {}
+    indices_images = [
+        i for i, fichier in enumerate(fichiers)
+        if est_image(fichier.filename) and not en_cache[cles[i]]
+    ]
+    if indices_images:
+        try:
+            # Pré-traitement (format réel, EXIF retiré, redimensionnement) en parallèle
+            images = await asyncio.gather(*(
+                preparer_image(fichiers[i].path, fichiers[i].filename.lower()) for i in indices_images
+            ))
+            with mesurer("vision_upload", fichiers=len(images)):
+                ids = await vision.televerser(images)
+            file_ids = dict(zip(indices_images, ids))
+        except Exception as e:
+            # Chaque analyse retentera son propre upload
+            print("Erreur upload groupé:", e)
+
+    def signaler_page(index: int):
+        # Pages des notices poussées dans la file du flux SSE : {index du fichier, numéro de page, texte}
+        if pages is None:
+            return None
+        return lambda numero, texte: pages.put_nowait({"index": index, "page": numero, "texte": texte})
+
+    semaphore = asyncio.Semaphore(ANALYSE_CONCURRENCY)
+    return [
+        asyncio.create_task(
+            analyser_fichier(fichier, semaphore, file_ids.get(i), en_cache.get(cles[i], False), signaler_page(i))
+        )
+        for i, fichier in enumerate(fichiers)
+    ]
 
+def textes_des_analyses(analyses):
+    image_texts = []
+    ocr_texts = []
+    for analyse in analyses:
+        if analyse is None:
+            continue
+        if analyse["type"] == "image":
+            image_texts.append(analyse["analyse_ia"])
+        else:
+            ocr_texts.append(analyse["texte_detecté"])
+    return image_texts, ocr_texts
+
+def reponse_analyse(analyses, fusion_result) -> dict:
     return {
         "message": "Analyse complète IA réussie ✅",
         "details": {
-            "analyse_fichiers": results["analyse_fichiers"],
-            "analyse_textes": results["analyse_textes"],
+            "analyse_fichiers": [analyse for analyse in analyses if analyse is not None],
+            "analyse_textes": [],
             "analyse_globale": fusion_result["details"]["analyse_globale"],
+            "fusion_cache": fusion_result["details"]["fusion_cache"],
+            "vision": vision.stats(),
+            "openai": passerelle.stats(),
+            "cache": cache.stats(),
         },
         "title": fusion_result["title"],
         "description": fusion_result["description"],
-        "fiche_technique": fusion_result["fiche_technique"]
-    }
\ No newline at end of file
+        "fiche_technique": fusion_result["fiche_technique"],
+        "produit": fusion_result["produit"],
+    }
+
+async def enregistrer_produit(resultat: dict, empreintes: List[int] = ()) -> dict:
+    # Sauvegarde dans la même requête que l'analyse : plus d'aller-retour par /save_analysis
+    async with AsyncSessionLocal() as db:
+        if resultat.get("doublon"):
+            # Objet déjà connu : pas de nouvelle fiche, les photos enrichissent le produit existant
+            resultat["product_id"] = resultat["doublon"]["product_id"]
+        elif resultat["produit"]:
+            db_product = await crud_async.create_product(db, schemas.ProductCreate(**resultat["produit"]))
+            response_cache.invalider("products:")
+            resultat["product_id"] = db_product.id
+
+        if empreintes and resultat.get("product_id"):
+            await ajouter_empreintes(db, resultat["product_id"], list(empreintes))
+    return resultat
+
+# ========== DOUBLONS ==========
+
+async def empreintes_fichiers(fichiers: List[FichierDepose]) -> List[int]:
+    chemins = [fichier.path for fichier in fichiers if est_image(fichier.filename)]
+    return await empreintes_images(chemins) if chemins else []
+
+async def chercher_doublon(empreintes: List[int], textes: List[str]) -> Optional[dict]:
+    if not DOUBLONS_ACTIFS or not (empreintes or textes):
+        return None
+    try:
+        async with AsyncSessionLocal() as db:
+            return await rechercher_doublon(db, empreintes, textes)
+    except Exception as e:
+        # Une recherche en échec ne bloque jamais l'analyse complète
+        print("Erreur recherche doublon:", e)
+        return None
+
+def reponse_doublon(analyses, doublon) -> dict:
+    # Même forme que reponse_analyse, remplie depuis la fiche existante
+    produit = doublon["produit"]
+    DOUBLONS.labels(doublon["critere"]).inc()
+    fusion_result = {
+        "details": {"analyse_globale": produit.resume_ia or "", "fusion_cache": "doublon"},
+        "title": produit.title,
+        "description": produit.description or "",
+        "fiche_technique": extraire_fiche(produit.resume_ia or "")["fiche_technique"] or "",
+        "produit": {champ: getattr(produit, champ) for champ in schemas.ProductCreate.model_fields},
+    }
+    resultat = reponse_analyse(analyses, fusion_result)
+    resultat["message"] = "Objet déjà connu ✅"
+    resultat["doublon"] = {cle: doublon[cle] for cle in ("product_id", "critere", "distance")}
+    return resultat
+
+def evenement_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def flux_analyse(fichiers: List[FichierDepose], user_texts, enregistrer: bool = False,
+                       verifier_doublons: bool = True):
+    try:
+        analyses = []
+        empreintes = await empreintes_fichiers(fichiers)
+        # Objet déjà connu (photo, numéro de série ou modèle saisis) : ni vision ni fusion
+        doublon = await chercher_doublon(empreintes, user_texts) if verifier_doublons else None
+
+        if doublon is None:
+            pages = asyncio.Queue()
+            taches = await lancer_analyses(fichiers, pages)
+            analyses = [None] * len(taches)
+
+            # Chaque page de notice est émise dès son extraction, chaque fichier dès que son analyse se termine
+            index_par_tache = {tache: i for i, tache in enumerate(taches)}
+            en_attente = set(taches)
+            page_suivante = asyncio.ensure_future(pages.get())
+            try:
+                while en_attente:
+                    terminees, _ = await asyncio.wait(en_attente | {page_suivante}, return_when=asyncio.FIRST_COMPLETED)
+                    if page_suivante in terminees:
+                        yield evenement_sse("page", page_suivante.result())
+                        page_suivante = asyncio.ensure_future(pages.get())
+                    for tache in terminees & en_attente:
+                        en_attente.discard(tache)
+                        # Pages restées en file : toujours émises avant le fichier qui les contient
+                        while not pages.empty():
+                            yield evenement_sse("page", pages.get_nowait())
+                        i = index_par_tache[tache]
+                        analyses[i] = tache.result()
+                        if analyses[i] is not None:
+                            yield evenement_sse("fichier", {"index": i, **analyses[i]})
+            finally:
+                page_suivante.cancel()
+
+            image_texts, ocr_texts = textes_des_analyses(analyses)
+            # Identifiants lus par la vision ou dans les notices : la fusion est évitée
+            if verifier_doublons:
+                doublon = await chercher_doublon([], image_texts + ocr_texts + list(user_texts))
+
+        if doublon is not None:
+            resultat = reponse_doublon(analyses, doublon)
+            yield evenement_sse("doublon", resultat["doublon"])
+        else:
+            parseur = ParseurIncremental()
+            fusion_result = None
+
+            async for morceau in stream_fusion(image_texts, ocr_texts, user_texts):
+                if isinstance(morceau, dict):
+                    fusion_result = morceau
+                    break
+                yield evenement_sse("token", morceau)
+                for champ, valeur in parseur.feed(morceau).items():
+                    yield evenement_sse("champ", {champ: valeur})
+
+            resultat = reponse_analyse(analyses, fusion_result)
+
+        if enregistrer:
+            resultat = await enregistrer_produit(resultat, empreintes)
+        yield evenement_sse("fin", resultat)
+
+    except Exception as e:
+        print("Erreur analyse en flux:", e)
+        yield evenement_sse("erreur", {"detail": str(e)})
+
+    finally:
+        supprimer_fichiers(fichiers)
+
+async def executer_job_analyse(fichiers: List[FichierDepose], user_texts, doublons: bool = True,
+                               save: bool = False) -> dict:
+    empreintes = await empreintes_fichiers(fichiers)
+    resultat = await analyser_job(fichiers, user_texts, empreintes, doublons)
+    # Même sauvegarde que la route synchrone : product_id dans le résultat du job
+    return await enregistrer_produit(resultat, empreintes) if save else resultat
+
+async def analyser_job(fichiers: List[FichierDepose], user_texts, empreintes: List[int], doublons: bool) -> dict:
+    doublon = await chercher_doublon(empreintes, user_texts) if doublons else None
+    if doublon is not None:
+        return reponse_doublon([], doublon)
+
+    analyses = await asyncio.gather(*await lancer_analyses(fichiers))
+    image_texts, ocr_texts = textes_des_analyses(analyses)
+    doublon = await chercher_doublon([], image_texts + ocr_texts + list(user_texts)) if doublons else None
+    if doublon is not None:
+        return reponse_doublon(analyses, doublon)
+
+    # Pas de résultat d'erreur ici : une exception laisse la file réessayer le job
+    texte_ia, statut_memo = await fusion_memoisee(image_texts, ocr_texts, user_texts)
+    return reponse_analyse(analyses, resultat_fusion(texte_ia, statut_memo))
+
+jobs = JobQueue(executer_job_analyse)
+
+# Corps lu par recevoir_formulaire (et non par FastAPI) : schéma déclaré pour la documentation
+FORMULAIRE_ANALYSE = {"requestBody": {"content": {"multipart/form-data": {"schema": {
+    "type": "object",
+    "properties": {
+        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+        "texts": {"type": "array", "items": {"type": "string"}},
+    },
+}}}}}
+
+@app.post("/analyse", openapi_extra=FORMULAIRE_ANALYSE)
+async def analyse_indices(request: Request, stream: bool = False, job: bool = False, priority: int = 0,
+                          save: bool = False, doublons: bool = True):
+    # Multipart découpé au fil de l'eau directement dans les fichiers du pipeline : 413 dès que
+    # Content-Length ou les octets reçus dépassent les limites, sans copie intermédiaire
+    with mesurer("upload"):
+        fichiers, champs = await recevoir_formulaire(request)
+    texts = champs.get("texts", [])
+    debug_echantillonne("Requête /analyse :", {"fichiers": [f.filename for f in fichiers], "textes": texts})
+
+    if job:
+        # La file reprend les fichiers à son compte ; en cas de refus ils sont supprimés ici
+        try:
+            job_id = await jobs.soumettre(fichiers, texts, priority, {"doublons": doublons, "save": save})
+        except QueuePleine as e:
+            supprimer_fichiers(fichiers)
+            raise HTTPException(status_code=503, detail=f"File d'analyses pleine : {e}")
+        except Exception:
+            supprimer_fichiers(fichiers)
+            raise
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+    # Disjoncteur ouvert : refus immédiat, avant toute analyse (les jobs, eux, attendent leur tour)
+    try:
+        passerelle.verifier()
+    except OpenAIIndisponible:
+        supprimer_fichiers(fichiers)
+        raise
+
+    if stream:
+        # Le flux supprime les fichiers une fois terminé
+        return StreamingResponse(
+            flux_analyse(fichiers, texts, save, doublons),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        empreintes = await empreintes_fichiers(fichiers)
+        # doublons=false force l'analyse complète (fiche à rafraîchir, faux positif)
+        doublon = await chercher_doublon(empreintes, texts) if doublons else None
+        if doublon is not None:
+            resultat = reponse_doublon([], doublon)
+        else:
+            # gather conserve l'ordre d'upload des résultats
+            analyses = await asyncio.gather(*await lancer_analyses(fichiers))
+            image_texts, ocr_texts = textes_des_analyses(analyses)
+
+            doublon = await chercher_doublon([], image_texts + ocr_texts + texts) if doublons else None
+            if doublon is not None:
+                resultat = reponse_doublon(analyses, doublon)
+            else:
+                resultat = reponse_analyse(analyses, await fusionner_et_analyser(image_texts, ocr_texts, texts))
+    finally:
+        supprimer_fichiers(fichiers)
+
+    if save:
+        resultat = await enregistrer_produit(resultat, empreintes)
+    return resultat
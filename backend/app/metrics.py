@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# ========== CONFIGURATION ==========
+
+# Logger propre à l'application : le niveau des bibliothèques (httpx, uvicorn) n'est pas touché
+logger = logging.getLogger("objex")
+logger.setLevel(os.getenv("OBJEX_LOG_LEVEL", "INFO").upper())
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+# Journalisation des contenus envoyés au modèle : échantillonnée et tronquée, jamais en INFO
+LOG_ECHANTILLON = float(os.getenv("OBJEX_LOG_ECHANTILLON", "0.01"))
+LOG_MAX_CARACTERES = int(os.getenv("OBJEX_LOG_MAX_CARACTERES", "500"))
+
+# Prix en dollars par million de jetons (entrée, sortie)
+PRIX_PAR_MILLION = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# uvicorn --workers N : compteurs et histogrammes écrits par chaque worker dans ce dossier (vidé avant le lancement)
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+# ========== MÉTRIQUES ==========
+
+DUREE_ETAPE = Histogram(
+    "objex_etape_duree_secondes",
+    "Durée des étapes du chemin critique",
+    ["etape"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80),
+)
+ERREURS_ETAPE = Counter("objex_etape_erreurs_total", "Étapes terminées par une exception", ["etape"])
+TOKENS = Counter("objex_openai_tokens_total", "Jetons consommés", ["modele", "sens"])
+COUT = Counter("objex_openai_cout_dollars_total", "Coût estimé des appels modèle", ["modele"])
+FUSIONS = Counter("objex_fusion_total", "Fusions par origine du résultat", ["resultat"])
+DOUBLONS = Counter("objex_doublons_total", "Analyses court-circuitées par un produit existant", ["critere"])
+
+
+@contextmanager
+def mesurer(etape: str, **attributs):
+    # Span de durée : alimente l'histogramme et une ligne de journal structurée en DEBUG
+    debut = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ERREURS_ETAPE.labels(etape).inc()
+        raise
+    finally:
+        duree = time.perf_counter() - debut
+        DUREE_ETAPE.labels(etape).observe(duree)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"span": etape, "duree_ms": round(duree * 1000, 1), **attributs}, ensure_ascii=False))
+
+
+def compter_tokens(modele: str, usage):
+    if usage is None:
+        return
+    entree = getattr(usage, "prompt_tokens", None) or 0
+    sortie = getattr(usage, "completion_tokens", None) or 0
+    TOKENS.labels(modele, "entree").inc(entree)
+    TOKENS.labels(modele, "sortie").inc(sortie)
+    prix_entree, prix_sortie = PRIX_PAR_MILLION.get(modele, (0.0, 0.0))
+    COUT.labels(modele).inc((entree * prix_entree + sortie * prix_sortie) / 1_000_000)
+
+
+def debug_echantillonne(message: str, contenu):
+    # Rien n'est sérialisé si le niveau DEBUG est coupé ou si l'appel n'est pas tiré au sort
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LOG_ECHANTILLON:
+        return
+    texte = contenu if isinstance(contenu, str) else json.dumps(contenu, ensure_ascii=False, default=str)
+    if len(texte) > LOG_MAX_CARACTERES:
+        texte = f"{texte[:LOG_MAX_CARACTERES]}… ({len(texte)} caractères)"
+    logger.debug("%s %s", message, texte)
+
+
+# ========== STATISTIQUES DES COMPOSANTS ==========
+
+class CollecteurStats:
+    # Lit à chaque scrape les compteurs déjà tenus par les caches et la passerelle (aucun double comptage)
+    def __init__(self, caches: Dict[str, Callable[[], dict]], openai_stats: Callable[[], dict]):
+        self.caches = caches
+        self.openai_stats = openai_stats
+
+    def collect(self):
+        hits = CounterMetricFamily("objex_cache_hits", "Lectures de cache réussies", labels=["cache"])
+        misses = CounterMetricFamily("objex_cache_misses", "Lectures de cache manquées", labels=["cache"])
+        ratio = GaugeMetricFamily("objex_cache_hit_ratio", "Taux de succès du cache", labels=["cache"])
+        for nom, stats in self.caches.items():
+            valeurs = stats()
+            hits.add_metric([nom], valeurs["hits"])
+            misses.add_metric([nom], valeurs["misses"])
+            ratio.add_metric([nom], valeurs["hit_ratio"])
+        yield hits
+        yield misses
+        yield ratio
+
+        valeurs = self.openai_stats()
+        appels = CounterMetricFamily("objex_openai_appels", "Appels OpenAI par issue", labels=["issue"])
+        appels.add_metric(["tentative"], valeurs["tentatives"])
+        appels.add_metric(["refus"], valeurs["refus"])
+        appels.add_metric(["echec"], valeurs["echecs"])
+        yield appels
+        disjoncteur = GaugeMetricFamily("objex_openai_disjoncteur_ouvert", "1 si le disjoncteur refuse les appels")
+        disjoncteur.add_metric([], 0 if valeurs["disjoncteur"] == "ferme" else 1)
+        yield disjoncteur
+
+
+_collecteurs = []
+
+
+def enregistrer_collecteur(collecteur: CollecteurStats):
+    REGISTRY.register(collecteur)
+    _collecteurs.append(collecteur)
+
+
+def exposer() -> bytes:
+    if not MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    # Multi-workers : métriques agrégées de tous les processus, plus les caches du worker qui répond
+    from prometheus_client import CollectorRegistry, multiprocess
+
+    registre = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registre)
+    for collecteur in _collecteurs:
+        registre.register(collecteur)
+    return generate_latest(registre)
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import inspect, text
+
+# Variables d'environnement chargées avant les modules internes qui lisent leur configuration à l'import
+load_dotenv()
+
+from app import crud, models
+from app.database import SessionLocal, engine as engine_defaut
+from app.doublons import initialiser_doublons
+from app.metrics import mesurer
+from app.search import initialiser_recherche
+
+try:
+    import fcntl
+except ImportError:  # ➡️ Windows : pas de flock, verrou par création exclusive du fichier
+    fcntl = None
+
+# ========== CONFIGURATION ==========
+
+# Schéma créé au démarrage de chaque worker (sous verrou) ; à désactiver quand le déploiement lance
+# « python -m app.migrations » une seule fois avant « uvicorn --workers N »
+MIGRATIONS_AU_DEMARRAGE = os.getenv("OBJEX_MIGRATIONS_AU_DEMARRAGE", "1") == "1"
+# Dossier des fichiers de verrou partagés par les workers d'une même machine
+VERROUS_DIR = os.getenv("OBJEX_VERROUS_DIR", ".")
+
+
+# ========== VERROU INTER-PROCESSUS ==========
+
+class VerrouProcessus:
+    # Sérialise une étape entre les workers uvicorn/gunicorn d'une même machine
+    def __init__(self, nom: str, attente: float = 0.05):
+        self.chemin = os.path.join(VERROUS_DIR, f".objex-{nom}.lock")
+        self.attente = attente
+        self._fichier = None
+
+    def acquerir(self):
+        if fcntl is not None:
+            self._fichier = open(self.chemin, "a+")
+            fcntl.flock(self._fichier.fileno(), fcntl.LOCK_EX)
+            return
+        while True:
+            try:
+                self._fichier = os.open(self.chemin, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                return
+            except FileExistsError:
+                time.sleep(self.attente)
+
+    def liberer(self):
+        if fcntl is not None:
+            fcntl.flock(self._fichier.fileno(), fcntl.LOCK_UN)
+            self._fichier.close()
+        else:
+            os.close(self._fichier)
+            os.remove(self.chemin)
+        self._fichier = None
+
+    def __enter__(self):
+        self.acquerir()
+        return self
+
+    def __exit__(self, *exc):
+        self.liberer()
+
+    async def __aenter__(self):
+        # Attente du verrou hors de la boucle d'événements
+        await asyncio.to_thread(self.acquerir)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.liberer()
+
+
+# ========== MIGRATIONS ==========
+
+# Index ajoutés à des tables existantes (create_all ne touche pas une table déjà créée)
+DDL_INDEX = [
+    "CREATE INDEX IF NOT EXISTS ix_product_analyses_image_filename ON product_analyses (image_filename)",
+]
+# Colonnes ajoutées à des tables existantes : (table, colonne, définition SQL)
+COLONNES_AJOUTEES = [
+    ("products", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ("products", "updated_at", "TIMESTAMP"),
+]
+
+
+def ajouter_colonnes(conn):
+    # ADD COLUMN n'a pas de IF NOT EXISTS sous SQLite : colonnes présentes lues au préalable
+    for table, colonne, definition in COLONNES_AJOUTEES:
+        existantes = {c["name"] for c in inspect(conn).get_columns(table)}
+        if colonne not in existantes:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {colonne} {definition}"))
+
+
+def migrer(engine=engine_defaut):
+    # Idempotent : tables, colonnes ajoutées, FTS5, index sur expression, versions des collections ;
+    # un seul worker à la fois, les suivants ne font que constater que tout existe
+    with VerrouProcessus("migrations"), mesurer("migrations"):
+        models.Base.metadata.create_all(bind=engine)
+        initialiser_recherche(engine)
+        initialiser_doublons(engine)
+        with engine.begin() as conn:
+            ajouter_colonnes(conn)
+            for ddl in DDL_INDEX:
+                conn.execute(text(ddl))
+        with SessionLocal() as db:
+            crud.ensure_collection_versions(db)
+
+
+if __name__ == "__main__":
+    # Étape unique du déploiement :
+    #   python -m app.migrations && OBJEX_MIGRATIONS_AU_DEMARRAGE=0 uvicorn app.main:app --workers 4
+    migrer()
+    print("Migrations appliquées")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer, LargeBinary, String, Text, DateTime
 from datetime import datetime
 from .database import Base
 
@@ -6,7 +6,7 @@ class ProductAnalysis(Base):
     __tablename__ = "product_analyses"
 
     id = Column(Integer, primary_key=True, index=True)
-    image_filename = Column(String, nullable=False)
+    image_filename = Column(String, nullable=False, index=True)  # ➡️ Fichier analysé, ou batch:<id>:product-<id>
     marque = Column(String, nullable=True)
     modele = Column(String, nullable=True)
     puissance = Column(String, nullable=True)
@@ -23,13 +23,79 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)  # ➡️ Titre général
     description = Column(Text, nullable=True)  # ➡️ Description libre
-    marque = Column(String, nullable=True)  # ➡️ Marque extraite
-    modele = Column(String, nullable=True)  # ➡️ Modèle
+    marque = Column(String, nullable=True, index=True)  # ➡️ Marque extraite
+    modele = Column(String, nullable=True, index=True)  # ➡️ Modèle
     puissance = Column(String, nullable=True)  # ➡️ Puissance (ex : 1000W)
     dimensions = Column(String, nullable=True)  # ➡️ Dimensions (ex : 460x560x100 mm)
-    indice_ip = Column(String, nullable=True)  # ➡️ IP24 par exemple
-    numero_serie = Column(String, nullable=True)  # ➡️ Numéro de série
-    certifications = Column(String, nullable=True)  # ➡️ CE, NF, etc.
+    indice_ip = Column(String, nullable=True, index=True)  # ➡️ IP24 par exemple
+    numero_serie = Column(String, nullable=True, index=True)  # ➡️ Numéro de série
+    certifications = Column(String, nullable=True, index=True)  # ➡️ CE, NF, etc.
     pays_fabrication = Column(String, nullable=True)  # ➡️ France, Chine, etc.
     resume_ia = Column(Text, nullable=True)  # ➡️ Résumé complet généré par l'IA
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # ➡️ +1 à chaque mise à jour (ETag)
+    updated_at = Column(DateTime, nullable=True, default=datetime.utcnow)  # ➡️ Last-Modified de la fiche
+
+# ✅ Cache des analyses (clé = empreinte du fichier + modèle + version du prompt)
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+
+    cle = Column(String, primary_key=True)  # ➡️ sha256 du contenu + version
+    kind = Column(String, nullable=False)  # ➡️ image / pdf
+    resultat = Column(Text, nullable=False)  # ➡️ Texte renvoyé par l'analyse
+    taille = Column(Integer, nullable=False)  # ➡️ Taille du résultat (octets)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_access = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# ✅ File d'attente des analyses en arrière-plan
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True)  # ➡️ uuid hex
+    status = Column(String, nullable=False, default="queued", index=True)  # ➡️ queued / running / done / failed
+    priority = Column(Integer, nullable=False, default=0)  # ➡️ Plus grand = traité en premier
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    payload = Column(Text, nullable=False)  # ➡️ JSON : textes + fichiers déposés sur disque
+    result = Column(Text, nullable=True)  # ➡️ JSON : réponse complète de /analyse
+    error = Column(Text, nullable=True)
+    available_at = Column(DateTime, default=datetime.utcnow)  # ➡️ Prochain essai (backoff)
+    lease_until = Column(DateTime, nullable=True)  # ➡️ Bail du worker : expiré = job repris
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ✅ Version des collections : incrémentée à chaque écriture, sert aux ETag / Last-Modified
+class CollectionVersion(Base):
+    __tablename__ = "collection_versions"
+
+    name = Column(String, primary_key=True)  # ➡️ products
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# ✅ Empreintes perceptuelles (dHash 64 bits) des photos d'un produit, pour reconnaître un objet déjà analysé
+class ProductImageHash(Base):
+    __tablename__ = "product_image_hashes"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    empreinte = Column(BigInteger, nullable=False)  # ➡️ 64 bits, signé (stockage SQLite)
+    # ➡️ 4 bandes de 16 bits indexées : deux empreintes à ≤ 3 bits près partagent au moins une bande
+    bande_0 = Column(Integer, nullable=False, index=True)
+    bande_1 = Column(Integer, nullable=False, index=True)
+    bande_2 = Column(Integer, nullable=False, index=True)
+    bande_3 = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# ✅ Embeddings des produits et des analyses (float32 normalisés, octets bruts) pour les recherches de similarité
+class Embedding(Base):
+    __tablename__ = "embeddings"
+
+    source = Column(String, primary_key=True)  # ➡️ products / product_analyses
+    item_id = Column(Integer, primary_key=True)  # ➡️ id de la ligne source
+    modele = Column(String, nullable=False)  # ➡️ Modèle + dimensions + version du texte : autre valeur = à recalculer
+    vecteur = Column(LargeBinary, nullable=False)  # ➡️ dimensions × 4 octets, little-endian
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,81 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+# ========== CONFIGURATION ==========
+
+# Processus dédiés à pdfplumber et nombre de pages confiées à chaque tâche
+PDF_PROCESSES = max(1, int(os.getenv("OBJEX_PDF_PROCESSES", str(min(4, os.cpu_count() or 1)))))
+PDF_PAGES_PAR_LOT = max(1, int(os.getenv("OBJEX_PDF_PAGES_PAR_LOT", "20")))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_PROCESSES)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ========== TRAVAIL CÔTÉ PROCESSUS ==========
+
+def _extraire_plage(source: Union[str, bytes], debut: int, fin: int) -> Tuple[List[str], int]:
+    # Une seule extraction par page ; renvoie aussi le nombre total de pages.
+    # source : chemin du fichier (lu directement par le processus) ou contenu en mémoire
+    # pdfplumber n'est importé que dans les processus d'extraction, jamais dans le serveur
+    import pdfplumber
+
+    ouvrable = io.BytesIO(source) if isinstance(source, bytes) else source
+    with pdfplumber.open(ouvrable) as pdf:
+        pages = pdf.pages[debut:fin]
+        textes = []
+        for page in pages:
+            textes.append(page.extract_text() or "")
+            page.close()
+        return textes, len(pdf.pages)
+
+
+def _importer(_) -> int:
+    import pdfplumber  # noqa: F401
+    return os.getpid()
+
+
+def prechauffer():
+    # Démarre les processus et y importe pdfplumber : la première notice n'attend ni fork ni import
+    list(get_pool().map(_importer, range(PDF_PROCESSES)))
+
+
+# ========== API ASYNCHRONE ==========
+
+async def stream_pdf_pages(source: Union[str, bytes]) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+
+    # Le premier lot donne aussi le nombre de pages : les autres lots partent ensuite en parallèle
+    premiers, total = await loop.run_in_executor(pool, _extraire_plage, source, 0, PDF_PAGES_PAR_LOT)
+    lots = [
+        loop.run_in_executor(pool, _extraire_plage, source, debut, debut + PDF_PAGES_PAR_LOT)
+        for debut in range(PDF_PAGES_PAR_LOT, total, PDF_PAGES_PAR_LOT)
+    ]
+
+    try:
+        for texte in premiers:
+            yield texte
+        for lot in lots:
+            textes, _ = await lot
+            for texte in textes:
+                yield texte
+    finally:
+        for lot in lots:
+            lot.cancel()
+
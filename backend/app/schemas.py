@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class ProductBase(BaseModel):
@@ -24,4 +24,54 @@ class ProductCreate(ProductBase):
 class Product(ProductBase):
     id: int
     created_at: Optional[datetime]
-    
\ No newline at end of file
+    
+
+class Job(BaseModel):
+    id: str
+    status: str
+    priority: int
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+class ProductSearchHit(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    marque: Optional[str] = None
+    modele: Optional[str] = None
+    indice_ip: Optional[str] = None
+    certifications: Optional[str] = None
+    created_at: Optional[datetime]
+    score: Optional[float] = None
+
+
+class Facet(BaseModel):
+    valeur: str
+    nombre: int
+
+
+class ProductSearch(BaseModel):
+    total: int
+    resultats: List[ProductSearchHit]
+    facettes: Dict[str, List[Facet]]
+
+
+class ProductSimilarHit(BaseModel):
+    source: str  # products / product_analyses
+    id: int
+    score: float
+    title: Optional[str] = None
+    marque: Optional[str] = None
+    modele: Optional[str] = None
+    puissance: Optional[str] = None
+
+
+class ProductSimilar(BaseModel):
+    product_id: int
+    mode: str
+    duree_ms: float
+    resultats: List[ProductSimilarHit]
@@ -0,0 +1,143 @@
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# ========== CONFIGURATION ==========
+
+FACETTES = ("marque", "modele", "indice_ip", "certifications")
+FACETTES_MAX_VALEURS = 10
+CHAMPS_RESULTAT = ("id", "title", "description", "marque", "modele", "indice_ip", "certifications", "created_at")
+
+# Index secondaires sur les colonnes structurées (mêmes noms que index=True dans models.Product)
+DDL_INDEX = [
+    f"CREATE INDEX IF NOT EXISTS ix_products_{colonne} ON products ({colonne})"
+    for colonne in FACETTES + ("numero_serie",)
+]
+
+# Table FTS5 à contenu externe : le texte n'est pas dupliqué, les triggers la tiennent à jour
+DDL_FTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        title, description, resume_ia,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, title, description, resume_ia)
+        VALUES (new.id, new.title, new.description, new.resume_ia);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, title, description, resume_ia)
+        VALUES ('delete', old.id, old.title, old.description, old.resume_ia);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, title, description, resume_ia)
+        VALUES ('delete', old.id, old.title, old.description, old.resume_ia);
+        INSERT INTO products_fts(rowid, title, description, resume_ia)
+        VALUES (new.id, new.title, new.description, new.resume_ia);
+    END""",
+]
+
+
+def fts_disponible(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def initialiser_recherche(engine):
+    # Idempotent : peut tourner à chaque démarrage, y compris sur une base existante
+    with engine.begin() as conn:
+        for ddl in DDL_INDEX:
+            conn.execute(text(ddl))
+
+        if not fts_disponible(engine):
+            return
+
+        for ddl in DDL_FTS:
+            conn.execute(text(ddl))
+
+        # Première création sur une base déjà remplie : indexation des lignes existantes
+        indexes = conn.execute(text("SELECT count(*) FROM products_fts_docsize")).scalar()
+        produits = conn.execute(text("SELECT count(*) FROM products")).scalar()
+        if indexes != produits:
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+
+
+# ========== REQUÊTES ==========
+
+def requete_fts(q: str) -> str:
+    # Chaque mot devient un terme préfixe entre guillemets : la syntaxe FTS5 de l'utilisateur est neutralisée
+    mots = re.findall(r"\w+", q, re.UNICODE)
+    return " ".join(f'"{mot}"*' for mot in mots)
+
+
+def _filtres(filtres: Dict[str, str]):
+    conditions = []
+    params = {}
+    for colonne, valeur in filtres.items():
+        if valeur is not None:
+            conditions.append(f"p.{colonne} = :f_{colonne}")
+            params[f"f_{colonne}"] = valeur
+    return conditions, params
+
+
+def rechercher(db: Session, q: Optional[str], filtres: Dict[str, str], limit: int = 20, offset: int = 0) -> dict:
+    fts = fts_disponible(db.get_bind())
+    conditions, params = _filtres(filtres)
+    colonnes = ", ".join(f"p.{champ}" for champ in CHAMPS_RESULTAT)
+
+    if q and q.strip() and fts and not requete_fts(q):
+        # Aucun mot cherchable (« !!! ») : rien ne correspond, plutôt que tout le catalogue
+        return {"total": 0, "resultats": [], "facettes": {colonne: [] for colonne in FACETTES}}
+
+    if q and fts and requete_fts(q):
+        params["q"] = requete_fts(q)
+        where = " AND ".join(conditions) or "1 = 1"
+        # bm25 : plus petit = plus pertinent ; le titre pèse plus que le résumé IA
+        sql = f"""
+            SELECT {colonnes}, bm25(products_fts, 10.0, 3.0, 1.0) AS score
+            FROM products_fts JOIN products p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH :q AND {where}
+            ORDER BY score
+            LIMIT :limit OFFSET :offset
+        """
+        conditions.append("p.id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH :q)")
+    else:
+        if q and not fts:
+            conditions.append("(p.title ILIKE :q OR p.description ILIKE :q OR p.resume_ia ILIKE :q)")
+            params["q"] = f"%{q}%"
+        where = " AND ".join(conditions) or "1 = 1"
+        sql = f"""
+            SELECT {colonnes}, NULL AS score
+            FROM products p
+            WHERE {where}
+            ORDER BY p.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    rows = db.execute(text(sql), {**params, "limit": limit, "offset": offset}).mappings().all()
+
+    # Total et facettes portent sur l'ensemble des produits correspondants, pas seulement la page
+    where = " AND ".join(conditions) or "1 = 1"
+    total = db.execute(text(f"SELECT count(*) FROM products p WHERE {where}"), params).scalar()
+
+    return {
+        "total": total,
+        "resultats": [dict(row) for row in rows],
+        "facettes": facettes(db, where, params),
+    }
+
+
+def facettes(db: Session, where: str, params: dict) -> Dict[str, List[dict]]:
+    resultat = {}
+    for colonne in FACETTES:
+        rows = db.execute(text(f"""
+            SELECT p.{colonne} AS valeur, count(*) AS nombre
+            FROM products p
+            WHERE {where} AND p.{colonne} IS NOT NULL AND p.{colonne} != ''
+            GROUP BY p.{colonne}
+            ORDER BY nombre DESC, valeur
+            LIMIT {FACETTES_MAX_VALEURS}
+        """), params).mappings().all()
+        resultat[colonne] = [dict(row) for row in rows]
+    return resultat
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # ➡️ python-multipart < 0.0.13 : module « multipart »
+    import multipart
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import parse_options_header
+
+# ========== CONFIGURATION ==========
+
+UPLOAD_MAX_FICHIER = int(os.getenv("OBJEX_UPLOAD_MAX_FICHIER", str(25 * 1024 * 1024)))
+UPLOAD_MAX_REQUETE = int(os.getenv("OBJEX_UPLOAD_MAX_REQUETE", str(120 * 1024 * 1024)))
+UPLOAD_MAX_CHAMP = 1024 * 1024  # ➡️ Champ texte du formulaire (gardé en mémoire)
+UPLOAD_CHUNK = 1024 * 1024
+UPLOAD_DIR = os.getenv("OBJEX_UPLOAD_DIR") or None  # ➡️ None = dossier temporaire du système
+
+
+# ========== FICHIER DÉPOSÉ SUR DISQUE ==========
+
+class FichierDepose:
+    # Upload écrit par morceaux dans un fichier temporaire : seul le chemin circule dans le pipeline
+    def __init__(self, filename: str, path: str, taille: int, empreinte):
+        self.filename = filename
+        self.path = path
+        self.taille = taille
+        self.empreinte = empreinte  # ➡️ objet hashlib.sha256 du contenu, réutilisé pour les clés de cache
+
+    def ouvrir(self):
+        return open(self.path, "rb")
+
+    def lire(self) -> bytes:
+        with self.ouvrir() as f:
+            return f.read()
+
+    def deplacer(self, dossier: str, nom: str) -> "FichierDepose":
+        os.makedirs(dossier, exist_ok=True)
+        destination = os.path.join(dossier, nom)
+        shutil.move(self.path, destination)
+        self.path = destination
+        return self
+
+    def supprimer(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def depuis_chemin(cls, filename: str, path: str) -> "FichierDepose":
+        empreinte = hashlib.sha256()
+        taille = 0
+        with open(path, "rb") as f:
+            while morceau := f.read(UPLOAD_CHUNK):
+                empreinte.update(morceau)
+                taille += len(morceau)
+        return cls(filename, path, taille, empreinte)
+
+
+def supprimer_fichiers(fichiers: List[FichierDepose]):
+    for fichier in fichiers:
+        fichier.supprimer()
+
+
+# ========== RÉCEPTION DES UPLOADS ==========
+
+def verifier_longueur(request: Request, max_octets: int):
+    # Taille annoncée par le client : refus avant d'avoir lu le moindre octet du corps
+    longueur = request.headers.get("content-length", "")
+    if longueur.isdigit() and int(longueur) > max_octets:
+        raise HTTPException(status_code=413, detail=f"Requête trop volumineuse (max {max_octets} octets)")
+
+
+class LecteurMultipart:
+    # Découpe le corps multipart au fil de l'eau : chaque fichier est écrit (et haché) directement dans
+    # son fichier temporaire, sans passer par les fichiers de Starlette ; les limites sont vérifiées
+    # avant d'écrire chaque morceau
+    def __init__(self, boundary: bytes):
+        self.boundary = boundary
+        self.fichiers: List[FichierDepose] = []
+        self.champs: Dict[str, List[str]] = {}
+        self.erreur: Optional[HTTPException] = None
+        self._sorties = []  # ➡️ fichiers ouverts, dans l'ordre de self.fichiers
+        self._a_ecrire: List[Tuple[int, bytes]] = []
+        self._a_fermer: List[int] = []
+        self._entete_nom = b""
+        self._entete_valeur = b""
+        self._disposition = b""
+        self._nom = ""
+        self._index: Optional[int] = None
+        self._donnees = bytearray()
+
+    # Callbacks du parseur (synchrones) : rien n'est écrit sur disque ici
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._index = None
+        self._donnees = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._entete_nom += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._entete_valeur += data[start:end]
+
+    def on_header_end(self):
+        if self._entete_nom.lower() == b"content-disposition":
+            self._disposition = self._entete_valeur
+        self._entete_nom = b""
+        self._entete_valeur = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._nom = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            sortie = tempfile.NamedTemporaryFile(prefix="objex-", dir=UPLOAD_DIR, delete=False)
+            self._sorties.append(sortie)
+            self.fichiers.append(FichierDepose(options[b"filename"].decode("utf-8", "replace"), sortie.name, 0,
+                                               hashlib.sha256()))
+            self._index = len(self.fichiers) - 1
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        morceau = data[start:end]
+        if self._index is None:
+            if len(self._donnees) + len(morceau) > UPLOAD_MAX_CHAMP:
+                self.erreur = self.erreur or HTTPException(
+                    status_code=413, detail=f"Champ {self._nom} trop volumineux (max {UPLOAD_MAX_CHAMP} octets)"
+                )
+            else:
+                self._donnees.extend(morceau)
+            return
+
+        fichier = self.fichiers[self._index]
+        fichier.taille += len(morceau)
+        if fichier.taille > UPLOAD_MAX_FICHIER:
+            self.erreur = self.erreur or HTTPException(
+                status_code=413,
+                detail=f"Fichier {fichier.filename} trop volumineux (max {UPLOAD_MAX_FICHIER} octets)"
+            )
+        self._a_ecrire.append((self._index, morceau))
+
+    def on_part_end(self):
+        if self._index is None:
+            self.champs.setdefault(self._nom, []).append(self._donnees.decode("utf-8", "replace"))
+        else:
+            self._a_fermer.append(self._index)
+
+    # Écritures regroupées : un seul passage par un thread pour chaque morceau reçu du client
+
+    def _ecrire(self):
+        for index, morceau in self._a_ecrire:
+            self.fichiers[index].empreinte.update(morceau)
+            self._sorties[index].write(morceau)
+        for index in self._a_fermer:
+            self._sorties[index].close()
+        self._a_ecrire.clear()
+        self._a_fermer.clear()
+
+    def _fermer(self):
+        for sortie in self._sorties:
+            sortie.close()
+
+    async def lire(self, flux: AsyncIterator[bytes]):
+        parseur = multipart.MultipartParser(self.boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+        total = 0
+        try:
+            async for morceau in flux:
+                total += len(morceau)
+                if total > UPLOAD_MAX_REQUETE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Requête trop volumineuse (max {UPLOAD_MAX_REQUETE} octets)"
+                    )
+                parseur.write(morceau)
+                if self.erreur is not None:
+                    raise self.erreur
+                if self._a_ecrire or self._a_fermer:
+                    await asyncio.to_thread(self._ecrire)
+            parseur.finalize()
+        except FormParserError as e:
+            raise HTTPException(status_code=400, detail=f"Corps multipart invalide : {e}")
+        finally:
+            self._fermer()
+
+
+async def recevoir_formulaire(request: Request) -> Tuple[List[FichierDepose], Dict[str, List[str]]]:
+    # Fichiers déposés sur disque et champs texte (valeurs multiples) d'un formulaire
+    verifier_longueur(request, UPLOAD_MAX_REQUETE)
+    type_contenu, options = parse_options_header(request.headers.get("content-type", ""))
+    if type_contenu != b"multipart/form-data":
+        # Formulaire urlencodé ou corps vide : champs texte seulement
+        formulaire = await request.form()
+        return [], {cle: [str(v) for v in formulaire.getlist(cle)] for cle in formulaire.keys()}
+    if b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Corps multipart sans boundary")
+
+    lecteur = LecteurMultipart(options[b"boundary"])
+    try:
+        await lecteur.lire(request.stream())
+    except BaseException:
+        supprimer_fichiers(lecteur.fichiers)
+        raise
+    return lecteur.fichiers, lecteur.champs
+
+
+async def recevoir_corps(request: Request, max_octets: int) -> str:
+    # Corps brut de la requête (import en masse) recopié au fil de l'eau dans un fichier temporaire
+    verifier_longueur(request, max_octets)
+    total = 0
+    sortie = tempfile.NamedTemporaryFile(prefix="objex-", dir=UPLOAD_DIR, delete=False)
+    try:
+        with sortie:
+            async for morceau in request.stream():
+                total += len(morceau)
+                if total > max_octets:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Requête trop volumineuse (max {max_octets} octets)"
+                    )
+                await asyncio.to_thread(sortie.write, morceau)
+    except BaseException:
+        os.unlink(sortie.name)
+        raise
+    return sortie.name
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, delete, select
+
+from app import models
+from app.database import SessionLocal
+from app.gateway import OpenAIIndisponible
+from app.metrics import compter_tokens, mesurer
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from app.ivf import IndexVecteurs
+
+# ========== CONFIGURATION ==========
+
+VECTEURS_ACTIFS = os.getenv("OBJEX_VECTEURS", "1") == "1"
+EMBEDDINGS_MODELE = os.getenv("OBJEX_EMBEDDINGS_MODELE", "text-embedding-3-small")
+# 256 dimensions : 1 Kio par ligne, 1 Gio en mémoire pour 1M de produits
+EMBEDDINGS_DIMENSIONS = int(os.getenv("OBJEX_EMBEDDINGS_DIMENSIONS", "256"))
+EMBEDDINGS_LOT = int(os.getenv("OBJEX_EMBEDDINGS_LOT", "256"))  # ➡️ Textes par appel à l'API
+EMBEDDINGS_PAUSE = float(os.getenv("OBJEX_EMBEDDINGS_PAUSE", "5"))  # ➡️ Attente quand rien n'est à indexer
+EMBEDDINGS_RESCAN = float(os.getenv("OBJEX_EMBEDDINGS_RESCAN", "600"))  # ➡️ Relecture complète (lignes modifiées)
+
+# Index IVF : au-dessous du seuil, le parcours exhaustif répond déjà en quelques millisecondes
+VECTEURS_SEUIL_IVF = int(os.getenv("OBJEX_VECTEURS_SEUIL_IVF", "50000"))
+VECTEURS_LISTES = int(os.getenv("OBJEX_VECTEURS_LISTES", "0"))  # ➡️ 0 = racine carrée du nombre de lignes
+VECTEURS_SONDES = int(os.getenv("OBJEX_VECTEURS_SONDES", "16"))  # ➡️ Listes parcourues par requête
+VECTEURS_RECENTS_MAX = float(os.getenv("OBJEX_VECTEURS_RECENTS_MAX", "0.2"))  # ➡️ Ajouts hors IVF avant reconstruction
+KMEANS_ITERATIONS = 10
+KMEANS_ECHANTILLON = 64  # ➡️ Lignes d'apprentissage par liste
+CHARGEMENT_LOT = 50000
+
+# Texte soumis au modèle d'embeddings pour chaque source ; à versionner avec TEXTE_VERSION
+TEXTE_VERSION = "1"
+TEXTE_MAX = 2000
+SOURCES = {
+    "products": (models.Product, ("title", "marque", "modele", "puissance", "dimensions", "indice_ip",
+                                  "certifications", "pays_fabrication", "description", "resume_ia")),
+    "product_analyses": (models.ProductAnalysis, ("marque", "modele", "puissance", "numero_serie", "resume_ia")),
+}
+SIGNATURE = f"{EMBEDDINGS_MODELE}-{EMBEDDINGS_DIMENSIONS}-{TEXTE_VERSION}"
+
+# Identifiants à (re)calculer en priorité, signalés par crud (création, ré-analyse)
+_a_indexer: Dict[str, set] = {source: set() for source in SOURCES}
+_verrou_signaux = threading.Lock()
+_reveils = []
+
+
+def signaler(source: str, ids: Iterable[int]):
+    # Appelable depuis n'importe quel thread (routes synchrones, to_thread)
+    with _verrou_signaux:
+        _a_indexer[source].update(ids)
+    for reveil in _reveils:
+        reveil()
+
+
+def texte(ligne, champs: Sequence[str]) -> str:
+    return " | ".join(str(getattr(ligne, champ)) for champ in champs if getattr(ligne, champ))[:TEXTE_MAX]
+
+
+# ========== CALCUL ET PERSISTANCE ==========
+
+class IndexeurVecteurs:
+    # Tâche de fond : charge les vecteurs enregistrés, calcule par lots ceux qui manquent
+    # (nouvelles lignes, lignes signalées, changement de modèle) et alimente les index en mémoire
+    def __init__(self, passerelle, session_factory=SessionLocal):
+        self.passerelle = passerelle
+        self.session_factory = session_factory
+        # Index (numpy) créés au démarrage de la tâche : rien à charger quand la fonction est désactivée
+        self.index: Dict[str, "IndexVecteurs"] = {}
+        self.pret = False
+        self._curseurs = {source: 0 for source in SOURCES}
+        self._dernier_rescan = time.monotonic()
+        self._tache: Optional[asyncio.Task] = None
+        self._reveil = asyncio.Event()
+        self._boucle_evenements = None
+
+    async def demarrer(self):
+        if not VECTEURS_ACTIFS or self._tache is not None:
+            return
+        from app.ivf import IndexVecteurs
+
+        self.index = {source: IndexVecteurs() for source in SOURCES}
+        self._boucle_evenements = asyncio.get_running_loop()
+        _reveils.append(self.reveiller)
+        self._tache = asyncio.create_task(self._boucle())
+
+    async def arreter(self):
+        if self.reveiller in _reveils:
+            _reveils.remove(self.reveiller)
+        if self._tache is not None:
+            self._tache.cancel()
+            await asyncio.gather(self._tache, return_exceptions=True)
+            self._tache = None
+
+    def reveiller(self):
+        if self._boucle_evenements is not None and not self._boucle_evenements.is_closed():
+            self._boucle_evenements.call_soon_threadsafe(self._reveil.set)
+
+    # ========== API ==========
+
+    async def calculer(self, textes: List[str]) -> "np.ndarray":
+        from app.ivf import depuis_liste
+
+        with mesurer("embeddings", textes=len(textes)):
+            reponse = await self.passerelle.appeler(
+                self.passerelle.client.embeddings.create,
+                tokens=sum(len(t) for t in textes) // 4,
+                model=EMBEDDINGS_MODELE,
+                input=textes,
+                dimensions=EMBEDDINGS_DIMENSIONS,
+            )
+        compter_tokens(EMBEDDINGS_MODELE, getattr(reponse, "usage", None))
+        donnees = sorted(reponse.data, key=lambda d: d.index)
+        return depuis_liste([d.embedding for d in donnees])
+
+    async def similaires(self, product_id: int, limite: int, exact: bool = False,
+                         sources: Sequence[str] = ("products",)) -> Optional[List[Tuple[str, int, float]]]:
+        index = self.index["products"]
+        vecteur = index.vecteur(product_id)
+        if vecteur is None:
+            # Produit pas encore indexé : calculé à la demande, puis enregistré comme les autres
+            lignes = await asyncio.to_thread(self._lignes, "products", [product_id])
+            if not lignes:
+                return None
+            vecteurs = await self.calculer([t for _, t in lignes])
+            await asyncio.to_thread(self._enregistrer, "products", [product_id], vecteurs)
+            index.ajouter([product_id], vecteurs)
+            vecteur = vecteurs[0]
+
+        resultats = []
+        for source in sources:
+            # numpy libère le GIL : la recherche ne bloque pas la boucle d'événements
+            trouves = await asyncio.to_thread(
+                self.index[source].rechercher, vecteur, limite, exact, product_id if source == "products" else None
+            )
+            resultats.extend((source, item_id, score) for item_id, score in trouves)
+        return sorted(resultats, key=lambda r: r[2], reverse=True)[:limite]
+
+    def stats(self) -> dict:
+        return {"pret": self.pret, "modele": SIGNATURE, **{source: index.stats() for source, index in self.index.items()}}
+
+    # ========== BOUCLE ==========
+
+    async def _boucle(self):
+        try:
+            with mesurer("vecteurs_chargement"):
+                await asyncio.to_thread(self._charger)
+        except Exception as e:
+            print("Erreur chargement des vecteurs:", e)
+        self.pret = True
+
+        while True:
+            attente = EMBEDDINGS_PAUSE
+            try:
+                traites = 0
+                for source in SOURCES:
+                    traites += await self._indexer_lot(source)
+                if traites:
+                    attente = 0
+            except OpenAIIndisponible as e:
+                attente = max(EMBEDDINGS_PAUSE, e.retry_after)
+            except Exception as e:
+                print("Erreur indexation des vecteurs:", e)
+
+            for index in self.index.values():
+                if index.a_reconstruire():
+                    try:
+                        await asyncio.to_thread(index.construire_ivf)
+                    except Exception as e:
+                        print("Erreur construction IVF:", e)
+
+            if attente:
+                self._reveil.clear()
+                try:
+                    await asyncio.wait_for(self._reveil.wait(), timeout=attente)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _indexer_lot(self, source: str) -> int:
+        with _verrou_signaux:
+            signales = [_a_indexer[source].pop() for _ in range(min(EMBEDDINGS_LOT, len(_a_indexer[source])))]
+        lignes = await asyncio.to_thread(self._a_calculer, source, signales)
+        if not lignes:
+            return 0
+        ids = [item_id for item_id, _ in lignes]
+        vecteurs = await self.calculer([t for _, t in lignes])
+        await asyncio.to_thread(self._enregistrer, source, ids, vecteurs)
+        self.index[source].ajouter(ids, vecteurs)
+        return len(ids)
+
+    # ========== BASE (threads) ==========
+
+    def _charger(self):
+        from app.ivf import depuis_octets
+
+        # Lecture par clé, par lots : les octets sont convertis d'un bloc en matrice float32
+        for source, index in self.index.items():
+            dernier = -1
+            while True:
+                with self.session_factory() as db:
+                    lignes = db.execute(
+                        select(models.Embedding.item_id, models.Embedding.vecteur)
+                        .where(models.Embedding.source == source, models.Embedding.modele == SIGNATURE,
+                               models.Embedding.item_id > dernier)
+                        .order_by(models.Embedding.item_id)
+                        .limit(CHARGEMENT_LOT)
+                    ).all()
+                if not lignes:
+                    break
+                index.ajouter([l.item_id for l in lignes], depuis_octets([l.vecteur for l in lignes], index.dimensions))
+                dernier = lignes[-1].item_id
+            if index.a_reconstruire():
+                index.construire_ivf()
+
+    def _lignes(self, source: str, ids: List[int]) -> List[Tuple[int, str]]:
+        table, champs = SOURCES[source]
+        with self.session_factory() as db:
+            lignes = db.execute(select(table.id, *(getattr(table, c) for c in champs)).where(table.id.in_(ids))).all()
+        return [(ligne.id, texte(ligne, champs)) for ligne in lignes if texte(ligne, champs)]
+
+    def _a_calculer(self, source: str, signales: List[int]) -> List[Tuple[int, str]]:
+        # Lignes signalées, complétées par les lignes sans vecteur à jour (parcours par clé depuis le curseur)
+        lignes = self._lignes(source, signales) if signales else []
+        place = EMBEDDINGS_LOT - len(lignes)
+        if place <= 0:
+            return lignes
+
+        table, champs = SOURCES[source]
+        embedding = models.Embedding
+        with self.session_factory() as db:
+            manquantes = db.execute(
+                select(table.id, *(getattr(table, c) for c in champs))
+                .outerjoin(embedding, and_(embedding.source == source, embedding.item_id == table.id,
+                                           embedding.modele == SIGNATURE))
+                .where(table.id > self._curseurs[source], embedding.item_id.is_(None))
+                .order_by(table.id)
+                .limit(place)
+            ).all()
+
+        if manquantes:
+            self._curseurs[source] = manquantes[-1].id
+        elif time.monotonic() - self._dernier_rescan > EMBEDDINGS_RESCAN:
+            # Fin du parcours : on repartira du début (vecteurs supprimés par une ré-analyse, nouveau modèle)
+            self._curseurs = {s: 0 for s in SOURCES}
+            self._dernier_rescan = time.monotonic()
+
+        deja = {item_id for item_id, _ in lignes}
+        for ligne in manquantes:
+            contenu = texte(ligne, champs)
+            if ligne.id not in deja and contenu:
+                lignes.append((ligne.id, contenu))
+        return lignes
+
+    def _enregistrer(self, source: str, ids: List[int], vecteurs: "np.ndarray"):
+        donnees = vecteurs.astype("<f4", copy=False)
+        with self.session_factory() as db:
+            db.execute(delete(models.Embedding).where(models.Embedding.source == source,
+                                                      models.Embedding.item_id.in_(ids)))
+            db.execute(models.Embedding.__table__.insert(), [
+                {"source": source, "item_id": item_id, "modele": SIGNATURE, "vecteur": donnees[i].tobytes()}
+                for i, item_id in enumerate(ids)
+            ])
+            with mesurer("db_commit"):
+                db.commit()
@@ -0,0 +1,226 @@
+import asyncio
+import io
+import os
+import time
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+from app.metrics import compter_tokens
+from app.migrations import VerrouProcessus
+
+# ========== CONFIGURATION ==========
+
+VISION_MODEL = "gpt-4o"
+VISION_ASSISTANT_NAME = "Objex Vision Assistant"
+# À incrémenter à chaque changement d'instructions : invalide le cache des analyses et l'assistant distant
+VISION_PROMPT_VERSION = "1"
+VISION_INSTRUCTIONS = (
+    "Tu es un expert en analyse de produits industriels. "
+    "Analyse précisément les fichiers et textes fournis. "
+    "Structure stricte : Titre, Description, Fiche Technique."
+)
+
+# Polling des runs Assistants (secondes) : intervalle initial, plafond, délai global
+VISION_POLL_MIN = float(os.getenv("OBJEX_VISION_POLL_MIN", "0.5"))
+VISION_POLL_MAX = float(os.getenv("OBJEX_VISION_POLL_MAX", "4"))
+VISION_TIMEOUT = float(os.getenv("OBJEX_VISION_TIMEOUT", "120"))
+RUN_STATUTS_FINAUX = ("completed", "failed", "cancelled", "expired", "incomplete", "requires_action")
+
+# Uploads simultanés max pour un lot de fichiers
+VISION_UPLOAD_CONCURRENCY = max(1, int(os.getenv("OBJEX_VISION_UPLOAD_CONCURRENCY", "4")))
+
+# Jetons réservés sur le budget TPM pour une analyse d'image (image haute définition + réponse)
+VISION_TOKENS_ESTIMES = int(os.getenv("OBJEX_VISION_TOKENS_ESTIMES", "2500"))
+
+# Appels évités par analyse par rapport à l'ancien flux :
+# assistants.create (assistant réutilisé) + threads.create et messages.create (create_and_run)
+ROUND_TRIPS_ECONOMISES = 3
+
+
+# ========== GESTIONNAIRE ASSISTANT / FICHIERS ==========
+
+class VisionAssistantManager:
+    def __init__(self, passerelle):
+        # Tous les appels passent par la passerelle : pool HTTP, budgets, nouvelles tentatives, disjoncteur
+        self.passerelle = passerelle
+        self.assistant_id: Optional[str] = None
+        self._assistant_lock = asyncio.Lock()
+        self._nettoyage: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self.analyses = 0
+        self.round_trips_economises = 0
+
+    @property
+    def client(self):
+        # Client créé par la passerelle au premier usage
+        return self.passerelle.client
+
+    async def demarrer(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._boucle_nettoyage())
+        await self.assistant()
+
+    async def arreter(self, delai: float = 10.0):
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._nettoyage.join(), timeout=delai)
+        except asyncio.TimeoutError:
+            print("Nettoyage OpenAI incomplet à l'arrêt :", self._nettoyage.qsize(), "objets restants")
+        self._worker.cancel()
+        self._worker = None
+
+    async def assistant(self) -> str:
+        if self.assistant_id:
+            return self.assistant_id
+
+        # Verrou entre workers : un seul crée l'assistant, les autres le retrouvent dans la liste
+        async with self._assistant_lock, VerrouProcessus("assistant-vision"):
+            if self.assistant_id:
+                return self.assistant_id
+
+            # Réutilise l'assistant d'un démarrage précédent s'il existe déjà côté OpenAI avec les mêmes
+            # instructions ; sinon un nouvel assistant est créé (les analyses sont cachées sous la version)
+            existant = await self._retrouver_assistant()
+            if existant:
+                self.assistant_id = existant
+                return self.assistant_id
+
+            assistant = await self.passerelle.appeler(
+                self.client.beta.assistants.create,
+                idempotent=False,
+                name=VISION_ASSISTANT_NAME,
+                instructions=VISION_INSTRUCTIONS,
+                model=VISION_MODEL,
+                tools=[{"type": "code_interpreter"}],
+                metadata={"prompt_version": VISION_PROMPT_VERSION},
+            )
+            self.assistant_id = assistant.id
+            return self.assistant_id
+
+    async def _retrouver_assistant(self) -> Optional[str]:
+        # Parcours de toutes les pages de la liste (100 assistants par page)
+        apres = None
+        while True:
+            options = {"after": apres} if apres else {}
+            page = await self.passerelle.appeler(self.client.beta.assistants.list, limit=100, **options)
+            assistants = getattr(page, "data", None) or []
+            for assistant in assistants:
+                metadata = getattr(assistant, "metadata", None) or {}
+                if (assistant.name == VISION_ASSISTANT_NAME and assistant.model == VISION_MODEL
+                        and metadata.get("prompt_version") == VISION_PROMPT_VERSION
+                        and assistant.instructions == VISION_INSTRUCTIONS):
+                    return assistant.id
+            if not assistants or not getattr(page, "has_more", False):
+                return None
+            apres = assistants[-1].id
+
+    async def televerser(self, fichiers: List[Tuple[str, Union[bytes, BinaryIO], str]]) -> List[str]:
+        # fichiers : (nom, contenu ou fichier ouvert, type MIME) ; renvoie les file_id dans le même ordre
+        semaphore = asyncio.Semaphore(VISION_UPLOAD_CONCURRENCY)
+
+        async def televerser_un(filename: str, content, mime: str) -> str:
+            source = io.BytesIO(content) if isinstance(content, bytes) else content
+            async with semaphore:
+                uploaded_file = await self.passerelle.appeler(
+                    self.client.files.create,
+                    idempotent=False,
+                    file=(filename, source, mime),
+                    purpose="assistants"
+                )
+                return uploaded_file.id
+
+        return list(await asyncio.gather(*(televerser_un(*f) for f in fichiers)))
+
+    async def analyser(self, file_id: str) -> str:
+        # Le fichier est déjà téléversé : supprimé même si l'assistant ne peut être obtenu
+        try:
+            assistant_id = await self.assistant()
+            run = await self.passerelle.appeler(
+                self.client.beta.threads.create_and_run,
+                tokens=VISION_TOKENS_ESTIMES,
+                idempotent=False,
+                assistant_id=assistant_id,
+                thread={
+                    "messages": [{
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": "Merci d'analyser cette image industrielle."},
+                            {"type": "image_file", "image_file": {"file_id": file_id}}
+                        ]
+                    }]
+                },
+            )
+
+            try:
+                termine = await self.attendre_run(run.thread_id, run)
+                compter_tokens(VISION_MODEL, getattr(termine, "usage", None))
+                messages = await self.passerelle.appeler(
+                    self.client.beta.threads.messages.list, thread_id=run.thread_id, order="desc", limit=1
+                )
+            finally:
+                self.planifier_nettoyage(thread_id=run.thread_id)
+        finally:
+            self.planifier_nettoyage(file_id=file_id)
+
+        self.analyses += 1
+        self.round_trips_economises += ROUND_TRIPS_ECONOMISES
+        return messages.data[0].content[0].text.value
+
+    async def attendre_run(self, thread_id: str, run):
+        # Polling asynchrone : l'intervalle grandit progressivement, borné par un délai global
+        deadline = time.monotonic() + VISION_TIMEOUT
+        intervalle = VISION_POLL_MIN
+
+        while run.status not in RUN_STATUTS_FINAUX:
+            restant = deadline - time.monotonic()
+            if restant <= 0:
+                await self.passerelle.appeler(self.client.beta.threads.runs.cancel, thread_id=thread_id, run_id=run.id)
+                raise TimeoutError(f"run {run.id} non terminé après {VISION_TIMEOUT:.0f}s")
+
+            await asyncio.sleep(min(intervalle, restant))
+            intervalle = min(intervalle * 1.5, VISION_POLL_MAX)
+            run = await self.passerelle.appeler(
+                self.client.beta.threads.runs.retrieve, thread_id=thread_id, run_id=run.id
+            )
+
+        if run.status != "completed":
+            raise RuntimeError(f"run {run.id} terminé avec le statut {run.status}")
+
+        return run
+
+    # ========== NETTOYAGE EN ARRIÈRE-PLAN ==========
+
+    def planifier_nettoyage(self, thread_id: Optional[str] = None, file_id: Optional[str] = None):
+        if thread_id:
+            self._nettoyage.put_nowait(("thread", thread_id))
+        if file_id:
+            self._nettoyage.put_nowait(("file", file_id))
+
+    async def _boucle_nettoyage(self):
+        while True:
+            lot = [await self._nettoyage.get()]
+            while not self._nettoyage.empty() and len(lot) < 20:
+                lot.append(self._nettoyage.get_nowait())
+
+            resultats = await asyncio.gather(
+                *(self._supprimer(kind, objet_id) for kind, objet_id in lot),
+                return_exceptions=True
+            )
+            for (kind, objet_id), resultat in zip(lot, resultats):
+                if isinstance(resultat, Exception):
+                    print(f"Erreur suppression {kind} {objet_id}:", resultat)
+                self._nettoyage.task_done()
+
+    async def _supprimer(self, kind: str, objet_id: str):
+        if kind == "thread":
+            await self.passerelle.appeler(self.client.beta.threads.delete, objet_id)
+        else:
+            await self.passerelle.appeler(self.client.files.delete, objet_id)
+
+    def stats(self) -> dict:
+        return {
+            "analyses": self.analyses,
+            "round_trips_economises": self.round_trips_economises,
+            "round_trips_economises_par_analyse": ROUND_TRIPS_ECONOMISES,
+            "nettoyages_en_attente": self._nettoyage.qsize(),
+        }
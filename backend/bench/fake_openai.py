@@ -0,0 +1,182 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app import batch_stub
+from app.batch_stub import completion, nouvel_id
+
+# Faux serveur OpenAI pour les benchmarks : Assistants (vision), chat completions (fusion, flux compris),
+# fichiers et API Batch (repris de app.batch_stub). Latence et erreurs injectées par variables d'environnement :
+#   uvicorn bench.fake_openai:app --port 8089
+
+# ========== CONFIGURATION ==========
+
+FAKE_LATENCE_MS = float(os.getenv("OBJEX_FAKE_LATENCE_MS", "50"))  # ➡️ Latence de chaque requête HTTP
+FAKE_JITTER_MS = float(os.getenv("OBJEX_FAKE_JITTER_MS", "20"))
+FAKE_DUREE_RUN_MS = float(os.getenv("OBJEX_FAKE_DUREE_RUN_MS", "1500"))  # ➡️ Durée d'un run vision
+FAKE_DUREE_JETON_MS = float(os.getenv("OBJEX_FAKE_DUREE_JETON_MS", "5"))  # ➡️ Entre deux morceaux du flux
+FAKE_TAUX_ERREUR = float(os.getenv("OBJEX_FAKE_TAUX_ERREUR", "0"))  # ➡️ Part de réponses 500
+FAKE_TAUX_429 = float(os.getenv("OBJEX_FAKE_TAUX_429", "0"))  # ➡️ Part de réponses 429
+
+REPONSE_VISION = (
+    "**Titre** : Radiateur électrique\n"
+    "**Description** : Radiateur à inertie sèche, plaque signalétique lisible.\n"
+    "**Fiche Technique** :\n- Marque : Acme\n- Modèle : RX-1000\n- Puissance : 1000W\n- Indice IP : IP24"
+)
+
+app = FastAPI(title="Faux serveur OpenAI")
+app.include_router(batch_stub.router)
+runs = {}
+compteurs = {"requetes": 0, "erreurs_injectees": 0}
+
+
+@app.middleware("http")
+async def latence_et_erreurs(request: Request, call_next):
+    compteurs["requetes"] += 1
+    await asyncio.sleep(max(0.0, FAKE_LATENCE_MS + random.uniform(-FAKE_JITTER_MS, FAKE_JITTER_MS)) / 1000)
+    tirage = random.random()
+    if tirage < FAKE_TAUX_429:
+        compteurs["erreurs_injectees"] += 1
+        return JSONResponse(
+            status_code=429, headers={"retry-after": "0.5"},
+            content={"error": {"message": "Rate limit (injecté)", "type": "requests", "code": "rate_limit_exceeded"}},
+        )
+    if tirage < FAKE_TAUX_429 + FAKE_TAUX_ERREUR:
+        compteurs["erreurs_injectees"] += 1
+        return JSONResponse(status_code=500, content={"error": {"message": "Erreur injectée", "type": "server_error"}})
+    return await call_next(request)
+
+
+# ========== ASSISTANTS / THREADS ==========
+
+@app.get("/v1/assistants")
+async def lister_assistants():
+    return {"object": "list", "data": [], "has_more": False}
+
+
+@app.post("/v1/assistants")
+async def creer_assistant(request: Request):
+    corps = await request.json()
+    return {
+        "id": nouvel_id("asst"), "object": "assistant", "created_at": int(time.time()),
+        "name": corps.get("name"), "model": corps.get("model"), "instructions": corps.get("instructions"),
+        "tools": corps.get("tools", []),
+    }
+
+
+def objet_run(run_id: str) -> dict:
+    run = runs[run_id]
+    termine = time.monotonic() >= run["fin"]
+    return {
+        "id": run_id, "object": "thread.run", "thread_id": run["thread_id"], "assistant_id": run["assistant_id"],
+        "created_at": run["created_at"], "status": "completed" if termine else "in_progress",
+        "usage": {"prompt_tokens": 900, "completion_tokens": 150, "total_tokens": 1050} if termine else None,
+    }
+
+
+@app.post("/v1/threads/runs")
+async def creer_et_lancer(request: Request):
+    corps = await request.json()
+    run_id = nouvel_id("run")
+    runs[run_id] = {
+        "thread_id": nouvel_id("thread"), "assistant_id": corps.get("assistant_id"),
+        "created_at": int(time.time()), "fin": time.monotonic() + FAKE_DUREE_RUN_MS / 1000,
+    }
+    return objet_run(run_id)
+
+
+@app.get("/v1/threads/{thread_id}/runs/{run_id}")
+async def lire_run(thread_id: str, run_id: str):
+    return objet_run(run_id)
+
+
+@app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+async def annuler_run(thread_id: str, run_id: str):
+    runs.pop(run_id, None)
+    return {"id": run_id, "object": "thread.run", "thread_id": thread_id, "status": "cancelled"}
+
+
+@app.get("/v1/threads/{thread_id}/messages")
+async def lister_messages(thread_id: str):
+    return {"object": "list", "has_more": False, "data": [{
+        "id": nouvel_id("msg"), "object": "thread.message", "thread_id": thread_id, "role": "assistant",
+        "created_at": int(time.time()),
+        "content": [{"type": "text", "text": {"value": REPONSE_VISION, "annotations": []}}],
+    }]}
+
+
+@app.delete("/v1/threads/{thread_id}")
+async def supprimer_thread(thread_id: str):
+    for run_id in [run_id for run_id, run in runs.items() if run["thread_id"] == thread_id]:
+        runs.pop(run_id, None)
+    return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+
+
+# ========== CHAT COMPLETIONS ==========
+
+@app.post("/v1/chat/completions")
+async def chat(request: Request):
+    corps = await request.json()
+    reponse = completion({"body": corps})
+    if not corps.get("stream"):
+        return reponse
+
+    contenu = reponse["choices"][0]["message"]["content"]
+    avec_usage = (corps.get("stream_options") or {}).get("include_usage")
+
+    async def flux():
+        base = {"id": reponse["id"], "object": "chat.completion.chunk", "created": reponse["created"], "model": reponse["model"]}
+        for debut in range(0, len(contenu), 8):
+            morceau = {**base, "choices": [{"index": 0, "delta": {"content": contenu[debut:debut + 8]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(morceau, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(FAKE_DUREE_JETON_MS / 1000)
+        yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+        if avec_usage:
+            yield f"data: {json.dumps({**base, 'choices': [], 'usage': reponse['usage']})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(flux(), media_type="text/event-stream")
+
+
+# ========== EMBEDDINGS ==========
+
+def embedding(texte: str, dimensions: int):
+    # Hachage des mots (signe et position) : des textes proches donnent des vecteurs proches
+    vecteur = [0.0] * dimensions
+    for mot in re.findall(r"\w+", texte.lower()):
+        empreinte = hashlib.blake2b(mot.encode(), digest_size=8).digest()
+        position = int.from_bytes(empreinte[:4], "little") % dimensions
+        vecteur[position] += 1.0 if empreinte[4] & 1 else -1.0
+    norme = math.sqrt(sum(v * v for v in vecteur)) or 1.0
+    return [v / norme for v in vecteur]
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    corps = await request.json()
+    textes = corps["input"] if isinstance(corps["input"], list) else [corps["input"]]
+    dimensions = corps.get("dimensions") or 1536
+    donnees = []
+    for i, texte in enumerate(textes):
+        vecteur = embedding(texte, dimensions)
+        if corps.get("encoding_format") == "base64":
+            vecteur = base64.b64encode(struct.pack(f"<{dimensions}f", *vecteur)).decode()
+        donnees.append({"object": "embedding", "index": i, "embedding": vecteur})
+    jetons = sum(len(texte) for texte in textes) // 4
+    return {"object": "list", "data": donnees, "model": corps.get("model"),
+            "usage": {"prompt_tokens": jetons, "total_tokens": jetons}}
+
+
+@app.get("/stats")
+async def stats():
+    return {**compteurs, "runs_en_memoire": len(runs), "fichiers_en_memoire": len(batch_stub.fichiers)}
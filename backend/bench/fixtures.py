@@ -0,0 +1,65 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+# Fichiers synthétiques pour /analyse : chaque graine donne un contenu différent (pas de hit de cache)
+
+MARQUES = ("Acme", "Thermor", "Atlantic", "Legrand", "Schneider", "ABB", "Siemens", "Bosch", "Makita", "Grundfos")
+OBJETS = ("Radiateur", "Moteur", "Pompe", "Disjoncteur", "Perceuse", "Chauffe-eau", "Variateur", "Ventilateur")
+
+
+def ligne_plaque(graine: int) -> str:
+    alea = random.Random(graine)
+    return (
+        f"{alea.choice(OBJETS)} {alea.choice(MARQUES)} RX-{alea.randint(100, 9999)} "
+        f"{alea.choice((500, 750, 1000, 1500, 2000))}W IP{alea.choice((20, 24, 44, 55, 65))} "
+        f"SN{alea.randint(10 ** 7, 10 ** 8 - 1)}"
+    )
+
+
+def image_plaque(graine: int = 0, largeur: int = 3000, hauteur: int = 2000, format: str = "JPEG") -> bytes:
+    # Photo de plaque signalétique : grande (comme un smartphone) pour exercer le redimensionnement
+    alea = random.Random(graine)
+    image = Image.new("RGB", (largeur, hauteur), (alea.randint(150, 220),) * 3)
+    dessin = ImageDraw.Draw(image)
+    marge_x, marge_y = largeur // 6, hauteur // 4
+    dessin.rectangle((marge_x, marge_y, largeur - marge_x, hauteur - marge_y), fill=(235, 235, 235), outline=(20, 20, 20), width=8)
+    for i, texte in enumerate(ligne_plaque(graine).split()):
+        dessin.text((marge_x + 40, marge_y + 40 + i * 60), texte, fill=(10, 10, 10))
+    # Bruit léger : empreinte (et donc clé de cache) unique par graine
+    for _ in range(200):
+        image.putpixel((alea.randrange(largeur), alea.randrange(hauteur)), (alea.randrange(256),) * 3)
+    sortie = io.BytesIO()
+    image.save(sortie, format=format, quality=90)
+    return sortie.getvalue()
+
+
+def pdf_notice(graine: int = 0, pages: int = 5) -> bytes:
+    # PDF minimal écrit à la main (Helvetica, une ligne de texte par page), lisible par pdfplumber
+    def echapper(texte: str) -> str:
+        return texte.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objets = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(pages))}] /Count {pages} >>",
+    ]
+    for i in range(pages):
+        objets.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {3 + 2 * pages} 0 R >> >> >>"
+        )
+        flux = f"BT /F1 11 Tf 50 780 Td (Page {i + 1} - {echapper(ligne_plaque(graine * 1000 + i))}) Tj ET"
+        objets.append(f"<< /Length {len(flux)} >>\nstream\n{flux}\nendstream")
+    objets.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    sortie = b"%PDF-1.4\n"
+    positions = []
+    for numero, objet in enumerate(objets, start=1):
+        positions.append(len(sortie))
+        sortie += f"{numero} 0 obj\n{objet}\nendobj\n".encode("latin-1")
+    xref = len(sortie)
+    sortie += f"xref\n0 {len(objets) + 1}\n0000000000 65535 f \n".encode()
+    sortie += "".join(f"{position:010d} 00000 n \n" for position in positions).encode()
+    sortie += f"trailer\n<< /Size {len(objets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return sortie
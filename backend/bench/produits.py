@@ -0,0 +1,58 @@
+import argparse
+import random
+import time
+
+from app import crud
+from app.database import SessionLocal, engine
+from app.migrations import migrer
+from bench.fixtures import MARQUES, OBJETS
+
+# Remplit la table products pour les tests à l'échelle (pagination, recherche, ETag) :
+#   OBJEX_DATABASE_URL=sqlite:///./bench.db python -m bench.produits --nombre 100000
+
+PAYS = ("France", "Allemagne", "Chine", "Italie", "Espagne", "Pologne", "Japon")
+CERTIFICATIONS = ("CE", "CE, NF", "CE, RoHS", "CE, UL", "NF")
+LOT = 5000
+
+
+def produit(alea: random.Random) -> dict:
+    objet, marque = alea.choice(OBJETS), alea.choice(MARQUES)
+    modele = f"RX-{alea.randint(100, 9999)}"
+    puissance = f"{alea.choice((500, 750, 1000, 1500, 2000))}W"
+    indice_ip = f"IP{alea.choice((20, 24, 44, 55, 65))}"
+    return {
+        "title": f"{objet} {marque} {modele}",
+        "description": f"{objet} {marque} d'occasion, plaque signalétique lisible, {puissance}.",
+        "marque": marque,
+        "modele": modele,
+        "puissance": puissance,
+        "dimensions": f"{alea.randint(200, 900)}x{alea.randint(200, 900)}x{alea.randint(50, 300)} mm",
+        "indice_ip": indice_ip,
+        "numero_serie": f"SN{alea.randint(10 ** 7, 10 ** 8 - 1)}",
+        "certifications": alea.choice(CERTIFICATIONS),
+        "pays_fabrication": alea.choice(PAYS),
+        "resume_ia": f"**Titre** : {objet} {marque}\n**Fiche Technique** :\n- Marque : {marque}\n"
+                     f"- Modèle : {modele}\n- Puissance : {puissance}\n- Indice IP : {indice_ip}",
+    }
+
+
+def generer(nombre: int, graine: int = 0) -> dict:
+    migrer(engine)
+    alea = random.Random(graine)
+    debut = time.perf_counter()
+    inseres = 0
+    with SessionLocal() as db:
+        while inseres < nombre:
+            taille = min(LOT, nombre - inseres)
+            ajoutes, _ = crud.create_products_bulk(db, [(i, produit(alea)) for i in range(taille)])
+            inseres += ajoutes
+    duree = time.perf_counter() - debut
+    return {"inseres": inseres, "duree_s": round(duree, 2), "lignes_par_seconde": round(inseres / duree) if duree else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench.produits")
+    parser.add_argument("--nombre", type=int, default=10000)
+    parser.add_argument("--graine", type=int, default=0)
+    args = parser.parse_args()
+    print(generer(args.nombre, args.graine))
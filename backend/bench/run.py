@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.fixtures import MARQUES, image_plaque, ligne_plaque, pdf_notice
+
+# Benchmarks de bout en bout sans crédit OpenAI : l'application tourne dans un processus uvicorn à part,
+# branchée sur bench.fake_openai, avec une base SQLite temporaire pré-remplie.
+#   cd backend && python -m bench.run --requetes 200 --concurrence 16 --produits 50000 --sortie bench.json
+#   python -m bench.run --reference bench.json --tolerance 0.2   # code de sortie 1 si régression (CI)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMARRAGE_MAX = 60.0  # ➡️ Secondes pour que chaque serveur réponde
+
+
+# ========== SCÉNARIOS ==========
+
+def scenarios(nb_produits: int, cache: bool, taille_image: tuple) -> Dict[str, callable]:
+    # Chaque scénario construit la i-ème requête (kwargs de httpx) ; tout est préparé avant le chronométrage
+    def graine(i: int) -> int:
+        return 0 if cache else i
+
+    def produit_aleatoire(i: int) -> int:
+        return random.Random(i).randint(1, max(1, nb_produits))
+
+    return {
+        "products_liste": lambda i: {"method": "GET", "url": "/products", "params": {
+            "limit": 50, "cursor": random.Random(i).randint(0, max(0, nb_produits - 50)),
+        }},
+        "products_liste_champs": lambda i: {"method": "GET", "url": "/products", "params": {
+            "limit": 200, "fields": "id,title,marque", "cursor": random.Random(i).randint(0, max(0, nb_produits - 200)),
+        }},
+        "products_detail": lambda i: {"method": "GET", "url": f"/products/{produit_aleatoire(i)}"},
+        "products_similaires": lambda i: {"method": "GET", "url": f"/products/{produit_aleatoire(i)}/similar",
+                                          "params": {"limit": 10}},
+        "products_recherche": lambda i: {"method": "GET", "url": "/products/search", "params": {
+            "q": random.Random(i).choice(MARQUES), "limit": 20,
+        }},
+        "save_analysis": lambda i: {"method": "POST", "url": "/save_analysis", "json": {
+            "title": ligne_plaque(i), "marque": "Acme", "puissance": "1000W", "resume_ia": ligne_plaque(i),
+        }},
+        "analyse_texte": lambda i: {"method": "POST", "url": "/analyse", "data": {"texts": [ligne_plaque(graine(i))]}},
+        "analyse_image": lambda i: {"method": "POST", "url": "/analyse", "files": [
+            ("files", (f"plaque-{i}.jpg", image_plaque(graine(i), *taille_image), "image/jpeg")),
+        ]},
+        "analyse_pdf": lambda i: {"method": "POST", "url": "/analyse", "files": [
+            ("files", (f"notice-{i}.pdf", pdf_notice(graine(i), pages=20), "application/pdf")),
+        ]},
+        # Graines décalées : ne pas retomber sur les fusions déjà mises en cache par analyse_texte
+        "analyse_flux": lambda i: {"method": "POST", "url": "/analyse", "params": {"stream": "true"},
+                                   "data": {"texts": [ligne_plaque(10 ** 6 + graine(i))]}},
+    }
+
+
+# ========== PROCESSUS ==========
+
+def port_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def demarrer(module: str, port: int, env: dict, dossier: str) -> subprocess.Popen:
+    processus = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=dossier, env=env,
+    )
+    url = f"http://127.0.0.1:{port}/docs"
+    limite = time.monotonic() + DEMARRAGE_MAX
+    while time.monotonic() < limite:
+        if processus.poll() is not None:
+            raise RuntimeError(f"{module} s'est arrêté au démarrage (code {processus.returncode})")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return processus
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    processus.terminate()
+    raise RuntimeError(f"{module} ne répond pas après {DEMARRAGE_MAX:.0f}s")
+
+
+def arreter(processus: Optional[subprocess.Popen]):
+    if processus is not None and processus.poll() is None:
+        processus.terminate()
+        try:
+            processus.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processus.kill()
+
+
+def memoire_mo(pid: int) -> Dict[str, Optional[float]]:
+    # VmRSS : résidente actuelle ; VmHWM : pic depuis le dernier clear_refs (Linux uniquement)
+    valeurs = {"rss_mo": None, "rss_pic_mo": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for ligne in f:
+                if ligne.startswith("VmRSS:"):
+                    valeurs["rss_mo"] = round(int(ligne.split()[1]) / 1024, 1)
+                elif ligne.startswith("VmHWM:"):
+                    valeurs["rss_pic_mo"] = round(int(ligne.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return valeurs
+
+
+def reinitialiser_pic_memoire(pid: int):
+    # Sans cette remise à zéro, le pic mesuré serait celui de tous les scénarios précédents
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+# ========== MESURE ==========
+
+def centile(valeurs: List[float], p: float) -> Optional[float]:
+    if not valeurs:
+        return None
+    triees = sorted(valeurs)
+    return triees[min(len(triees) - 1, int(round(p / 100 * (len(triees) - 1))))]
+
+
+async def executer(client: httpx.AsyncClient, chauffe: List[dict], requetes: List[dict], concurrence: int,
+                   pid: int) -> dict:
+    # Requêtes de chauffe (connexions, assistant, caches de plan SQL) hors chronométrage ; contenus distincts
+    # de ceux mesurés pour ne pas pré-remplir le cache d'analyse
+    for requete in chauffe:
+        await client.request(**requete)
+    reinitialiser_pic_memoire(pid)
+
+    semaphore = asyncio.Semaphore(concurrence)
+    latences = []
+    statuts = {}
+
+    async def une(requete: dict):
+        async with semaphore:
+            debut = time.perf_counter()
+            try:
+                reponse = await client.request(**requete)
+                statut = reponse.status_code
+            except httpx.HTTPError as e:
+                statut = type(e).__name__
+            latences.append(time.perf_counter() - debut)
+            statuts[statut] = statuts.get(statut, 0) + 1
+
+    debut = time.perf_counter()
+    await asyncio.gather(*(une(requete) for requete in requetes))
+    duree = time.perf_counter() - debut
+
+    erreurs = sum(nombre for statut, nombre in statuts.items() if not (isinstance(statut, int) and statut < 400))
+    return {
+        "requetes": len(requetes),
+        "erreurs": erreurs,
+        "statuts": {str(statut): nombre for statut, nombre in statuts.items()},
+        "p50_ms": round(centile(latences, 50) * 1000, 1),
+        "p90_ms": round(centile(latences, 90) * 1000, 1),
+        "p99_ms": round(centile(latences, 99) * 1000, 1),
+        "debit_rps": round(len(requetes) / duree, 1) if duree else None,
+        **memoire_mo(pid),
+    }
+
+
+def regressions(resultats: dict, reference: dict, tolerance: float) -> List[str]:
+    problemes = []
+    for nom, mesure in resultats.items():
+        base = reference.get(nom)
+        if not base:
+            continue
+        if base.get("p99_ms") and mesure["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            problemes.append(f"{nom} : p99 {mesure['p99_ms']} ms (référence {base['p99_ms']} ms)")
+        if base.get("debit_rps") and mesure["debit_rps"] < base["debit_rps"] * (1 - tolerance):
+            problemes.append(f"{nom} : débit {mesure['debit_rps']} req/s (référence {base['debit_rps']} req/s)")
+        if mesure["erreurs"] > base.get("erreurs", 0):
+            problemes.append(f"{nom} : {mesure['erreurs']} erreurs (référence {base.get('erreurs', 0)})")
+    return problemes
+
+
+# ========== LIGNE DE COMMANDE ==========
+
+async def campagne(args, url: str, pid: int, nb_produits: int) -> dict:
+    tous = scenarios(nb_produits, args.cache, (args.largeur_image, args.hauteur_image))
+    noms = args.scenarios.split(",") if args.scenarios else list(tous)
+    inconnus = [nom for nom in noms if nom not in tous]
+    if inconnus:
+        raise SystemExit(f"Scénarios inconnus : {', '.join(inconnus)} (disponibles : {', '.join(tous)})")
+
+    resultats = {}
+    limites = httpx.Limits(max_connections=args.concurrence, max_keepalive_connections=args.concurrence)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limites) as client:
+        for nom in noms:
+            chauffe = [tous[nom](-1 - i) for i in range(min(3, args.requetes))]
+            requetes = [tous[nom](i) for i in range(args.requetes)]
+            resultats[nom] = await executer(client, chauffe, requetes, args.concurrence, pid)
+            mesure = resultats[nom]
+            print(
+                f"{nom:<24} p50 {mesure['p50_ms']:>8} ms  p99 {mesure['p99_ms']:>8} ms  "
+                f"{mesure['debit_rps']:>7} req/s  erreurs {mesure['erreurs']:>4}  pic RSS {mesure['rss_pic_mo']} Mo"
+            )
+    return resultats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description="Benchmarks ObjeX avec un faux OpenAI")
+    parser.add_argument("--scenarios", help="liste séparée par des virgules (défaut : tous)")
+    parser.add_argument("--requetes", type=int, default=100, help="requêtes par scénario")
+    parser.add_argument("--concurrence", type=int, default=8)
+    parser.add_argument("--produits", type=int, default=10000, help="taille de la table products")
+    parser.add_argument("--cache", action="store_true", help="rejouer le même contenu (mesure du chemin en cache)")
+    parser.add_argument("--largeur-image", type=int, default=3000)
+    parser.add_argument("--hauteur-image", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--latence-ms", type=float, help="latence du faux OpenAI (OBJEX_FAKE_LATENCE_MS)")
+    parser.add_argument("--taux-erreur", type=float, help="part de 500 injectées (OBJEX_FAKE_TAUX_ERREUR)")
+    parser.add_argument("--taux-429", type=float, help="part de 429 injectées (OBJEX_FAKE_TAUX_429)")
+    parser.add_argument("--sortie", help="fichier JSON des résultats")
+    parser.add_argument("--reference", help="résultats JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="objex-bench-") as dossier:
+        env = {
+            **os.environ,
+            "PYTHONPATH": BACKEND_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""),
+            "OBJEX_DATABASE_URL": f"sqlite:///{os.path.join(dossier, 'bench.db')}",
+            "OBJEX_UPLOAD_DIR": dossier,
+            "OPENAI_API_KEY": "bench",
+            # Budgets du compte hors sujet ici : la passerelle ne doit pas brider la mesure
+            "OBJEX_OPENAI_RPM": os.environ.get("OBJEX_OPENAI_RPM", "0"),
+            "OBJEX_OPENAI_TPM": os.environ.get("OBJEX_OPENAI_TPM", "0"),
+        }
+        for option, variable in ((args.latence_ms, "OBJEX_FAKE_LATENCE_MS"), (args.taux_erreur, "OBJEX_FAKE_TAUX_ERREUR"),
+                                 (args.taux_429, "OBJEX_FAKE_TAUX_429")):
+            if option is not None:
+                env[variable] = str(option)
+
+        if args.produits:
+            print("Génération des produits :", subprocess.run(
+                [sys.executable, "-m", "bench.produits", "--nombre", str(args.produits)],
+                cwd=dossier, env=env, check=True, capture_output=True, text=True,
+            ).stdout.strip())
+
+        faux = application = None
+        try:
+            port_faux = port_libre()
+            faux = demarrer("bench.fake_openai:app", port_faux, env, dossier)
+            env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port_faux}/v1"
+            port_app = port_libre()
+            application = demarrer("app.main:app", port_app, env, dossier)
+            resultats = asyncio.run(campagne(args, f"http://127.0.0.1:{port_app}", application.pid, args.produits))
+        finally:
+            arreter(application)
+            arreter(faux)
+
+    if args.sortie:
+        with open(args.sortie, "w") as f:
+            json.dump(resultats, f, indent=2, ensure_ascii=False)
+
+    if args.reference:
+        with open(args.reference) as f:
+            problemes = regressions(resultats, json.load(f), args.tolerance)
+        for probleme in problemes:
+            print("RÉGRESSION", probleme)
+        if problemes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
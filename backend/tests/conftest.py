@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Base SQLite jetable et aucun appel réseau : fixé avant tout import de l'application
+_DOSSIER = tempfile.mkdtemp(prefix="objex-tests-")
+os.environ.setdefault("OBJEX_DATABASE_URL", f"sqlite:///{_DOSSIER}/objex.db")
+os.environ.setdefault("OBJEX_VERROUS_DIR", _DOSSIER)
+os.environ.setdefault("OBJEX_JOBS_DIR", os.path.join(_DOSSIER, "jobs"))
+os.environ.setdefault("OBJEX_VECTEURS", "0")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def base():
+    # Schéma complet (tables, FTS5, index) dans la base jetable
+    from app.migrations import migrer
+
+    migrer()
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+from app import main, models
+from app.database import SessionLocal
+from app.uploads import FichierDepose
+
+
+def test_job_save_enregistre_le_produit(base, monkeypatch):
+    async def fusion_memoisee(image_texts, ocr_texts, user_texts):
+        return json.dumps({"title": "Compresseur Acme", "marque": "Acme", "modele": "CX-900"}), "miss"
+
+    monkeypatch.setattr(main, "fusion_memoisee", fusion_memoisee)
+    resultat = asyncio.run(main.executer_job_analyse([], ["Compresseur Acme CX-900"], doublons=False, save=True))
+
+    assert resultat["product_id"]
+    with SessionLocal() as db:
+        assert db.get(models.Product, resultat["product_id"]).title == "Compresseur Acme"
+
+
+def test_job_sans_save_n_enregistre_rien(base, monkeypatch):
+    async def fusion_memoisee(image_texts, ocr_texts, user_texts):
+        return json.dumps({"title": "Meuleuse Acme"}), "miss"
+
+    monkeypatch.setattr(main, "fusion_memoisee", fusion_memoisee)
+    resultat = asyncio.run(main.executer_job_analyse([], ["Meuleuse Acme"], doublons=False))
+    assert "product_id" not in resultat
+
+
+def test_round_trips_economises_nuls_sur_un_hit(tmp_path, monkeypatch):
+    async def analyse_image(fichier, file_id=None):
+        return "Perceuse"
+
+    monkeypatch.setattr(main, "analyse_image_with_openai", analyse_image)
+    (tmp_path / "photo.jpg").write_bytes(b"jpeg")
+    fichier = FichierDepose.depuis_chemin("photo.jpg", str(tmp_path / "photo.jpg"))
+
+    async def analyser(en_cache):
+        return await main.analyser_fichier(fichier, asyncio.Semaphore(1), en_cache=en_cache)
+
+    assert asyncio.run(analyser(True))["round_trips_economises"] == 0
+    assert asyncio.run(analyser(False))["round_trips_economises"] == main.ROUND_TRIPS_ECONOMISES
+
+
+def test_fichier_pre_televerse_nettoye_sur_un_hit_tardif(tmp_path, monkeypatch):
+    # Une requête identique a rempli le cache entre contient() et l'analyse : le file_id reste inutilisé
+    async def lire_cache(cle):
+        return "Perceuse"
+
+    nettoyes = []
+    monkeypatch.setattr(main.cache, "get", lire_cache)
+    monkeypatch.setattr(main.vision, "planifier_nettoyage", lambda thread_id=None, file_id=None: nettoyes.append(file_id))
+    (tmp_path / "photo.jpg").write_bytes(b"jpeg")
+    fichier = FichierDepose.depuis_chemin("photo.jpg", str(tmp_path / "photo.jpg"))
+
+    assert asyncio.run(main.analyse_image_with_openai(fichier, "file-1")) == "Perceuse"
+    assert nettoyes == ["file-1"]
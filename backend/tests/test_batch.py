@@ -0,0 +1,19 @@
+import json
+
+from app import batch, crud, models, schemas
+from app.database import SessionLocal
+
+
+def test_appliquer_lot_deux_fois_n_ajoute_rien(base):
+    with SessionLocal() as db:
+        produit = crud.create_product(db, schemas.ProductCreate(title="Pompe Acme"))
+        lot = [(produit.id, json.dumps({"title": "Pompe Acme P-200", "marque": "Acme", "modele": "P-200"}))]
+
+        assert batch.appliquer_lot(db, "batch_test", lot) == 1
+        assert batch.appliquer_lot(db, "batch_test", lot) == 0
+
+        lignes = db.query(models.ProductAnalysis).filter(
+            models.ProductAnalysis.image_filename == batch.reference_analyse("batch_test", produit.id)
+        ).count()
+        assert lignes == 1
+        assert db.get(models.Product, produit.id).modele == "P-200"
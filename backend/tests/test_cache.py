@@ -0,0 +1,79 @@
+import asyncio
+
+from app import main
+from app.cache import Diffusion, SingleFlight
+
+
+def test_single_flight_partage_une_execution():
+    async def scenario():
+        flight = SingleFlight()
+        appels = []
+
+        async def calculer():
+            appels.append(1)
+            await asyncio.sleep(0.01)
+            return "fiche"
+
+        resultats = await asyncio.gather(*(flight.executer("cle", calculer) for _ in range(3)))
+        assert appels == [1]
+        assert sorted(partage for _, partage in resultats) == [False, True, True]
+        assert not flight.en_cours("cle")
+
+    asyncio.run(scenario())
+
+
+def test_diffusion_rejoue_puis_suit():
+    async def scenario():
+        diffusion = Diffusion()
+        diffusion.publier("a")
+
+        async def lecteur():
+            return [morceau async for morceau in diffusion.lire()]
+
+        lecture = asyncio.create_task(lecteur())
+        await asyncio.sleep(0)
+        diffusion.publier("b")
+        diffusion.clore()
+        assert await lecture == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_flux_identiques_un_seul_appel_amont(monkeypatch):
+    appels = []
+
+    class CacheVide:
+        async def get(self, cle):
+            return None
+
+        async def set(self, cle, kind, valeur):
+            pass
+
+    class Morceau:
+        def __init__(self, texte):
+            self.usage = None
+            self.choices = [type("Choix", (), {"delta": type("Delta", (), {"content": texte})()})()]
+
+    async def flux():
+        for texte in ('{"title": ', '"Perceuse"', "}"):
+            await asyncio.sleep(0.01)
+            yield Morceau(texte)
+
+    async def appeler(fonction, *args, **kwargs):
+        appels.append(kwargs.get("stream"))
+        return flux()
+
+    monkeypatch.setattr(main, "cache", CacheVide())
+    monkeypatch.setattr(main.passerelle, "appeler", appeler)
+
+    async def lire():
+        return [morceau async for morceau in main.stream_fusion(["Photo"], [], ["note"])]
+
+    async def scenario():
+        return await asyncio.gather(lire(), lire(), lire())
+
+    sorties = asyncio.run(scenario())
+    assert appels == [True]
+    for sortie in sorties:
+        assert "".join(m for m in sortie if isinstance(m, str)) == '{"title": "Perceuse"}'
+    assert sorted(sortie[-1]["details"]["fusion_cache"] for sortie in sorties) == ["miss", "partage", "partage"]
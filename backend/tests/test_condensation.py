@@ -0,0 +1,51 @@
+import asyncio
+
+from app import condensation, main
+
+
+def notice(lignes: int = 2002) -> str:
+    # Notice longue : texte de remplissage, caractéristiques au milieu
+    contenu = [f"Ligne {i} : consignes générales d'utilisation et de sécurité de l'appareil." for i in range(lignes)]
+    contenu[1000:1003] = ["Caractéristiques techniques", "Puissance : 1500 W", "Indice de protection : IP65"]
+    return "\n".join(contenu)
+
+
+def test_decouper_respecte_les_lignes():
+    texte = notice()
+    morceaux = condensation.decouper(texte)
+    assert len(morceaux) > 1
+    lignes = set(texte.splitlines())
+    for morceau in morceaux:
+        assert all(ligne in lignes for ligne in morceau.splitlines())
+
+
+def test_condensation_garde_les_lignes_utiles_dans_l_ordre():
+    texte = notice()
+    [condense] = asyncio.run(condensation.condenser([texte], budget=700))
+    assert condensation.jetons(condense) <= 700
+    assert "Puissance : 1500 W\nIndice de protection : IP65" in condense
+    assert condense.index("Ligne 0 ") < condense.index("Puissance")
+    assert condensation.SEPARATEUR in condense
+
+
+def test_fusion_envoie_la_notice_condensee_avec_ses_lignes(monkeypatch):
+    envoyes = []
+
+    class CacheVide:
+        async def get(self, cle):
+            return None
+
+        async def set(self, cle, kind, valeur):
+            pass
+
+    async def appeler(fonction, *args, messages=None, **kwargs):
+        envoyes.extend(messages)
+        raise RuntimeError("pas d'appel réseau")
+
+    monkeypatch.setattr(main, "cache", CacheVide())
+    monkeypatch.setattr(main.passerelle, "appeler", appeler)
+    asyncio.run(main.fusionner_et_analyser(["Photo"], [notice()], []))
+
+    [prompt_notice] = [m["content"] for m in envoyes if "Puissance" in m["content"]]
+    assert "Caractéristiques techniques\nPuissance : 1500 W\nIndice de protection : IP65" in prompt_notice
+    assert prompt_notice.count("\n") > 10
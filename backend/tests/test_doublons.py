@@ -0,0 +1,22 @@
+from app import doublons
+
+
+def test_serial_number_ne_capture_pas_le_libelle():
+    cles = doublons.identifiants(["Serial number: X12345"])
+    assert cles["series"] == {"X12345"}
+    assert doublons.identifiants(["Serial number: voir étiquette"])["series"] == set()
+
+
+def test_formes_courantes_de_numero_de_serie():
+    assert "123456" in doublons.identifiants(["S/N : 1234-56"])["series"]
+    assert "12345678" in doublons.identifiants(["Plaque SN12345678"])["series"]
+
+
+def test_marque_modele_seuls_desactive_par_defaut():
+    assert doublons.DOUBLON_MODELE is False
+
+
+def test_empreintes_proches():
+    a = 0x0F0F0F0F0F0F0F0F
+    assert doublons.distance(a, a ^ 0b101) == 2
+    assert any(x == y for x, y in zip(doublons.bandes(a), doublons.bandes(a ^ 0b101)))
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+from app import main, pdf
+from app.uploads import FichierDepose
+from bench.fixtures import pdf_notice
+
+
+def evenements(flux: str):
+    for bloc in flux.strip().split("\n\n"):
+        event, data = bloc.split("\n", 1)
+        yield event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_pages_pdf_emises_avant_le_fichier(base, tmp_path, monkeypatch):
+    chemin = tmp_path / "notice.pdf"
+    # Graine propre à ce test : jamais en cache dans la base de test
+    chemin.write_bytes(pdf_notice(graine=606, pages=3))
+
+    async def stream_fusion(image_texts, ocr_texts, user_texts):
+        yield main.resultat_fusion(json.dumps({"title": "Notice"}), "miss")
+
+    monkeypatch.setattr(main, "stream_fusion", stream_fusion)
+    monkeypatch.setattr(pdf, "PDF_PAGES_PAR_LOT", 1)
+
+    async def lire():
+        fichier = FichierDepose.depuis_chemin("notice.pdf", str(chemin))
+        return "".join([morceau async for morceau in main.flux_analyse([fichier], [], verifier_doublons=False)])
+
+    try:
+        recus = list(evenements(asyncio.run(lire())))
+    finally:
+        pdf.shutdown_pool()
+
+    noms = [event for event, _ in recus]
+    assert noms[:4] == ["page", "page", "page", "fichier"]
+    assert [data["page"] for event, data in recus if event == "page"] == [1, 2, 3]
+    assert all(data["index"] == 0 and data["texte"] for event, data in recus if event == "page")
+    assert noms[-1] == "fin"
@@ -0,0 +1,14 @@
+from app import main
+
+
+def test_cle_fusion_ignore_ordre_et_espaces():
+    a = main.cle_fusion(["Photo 2", "Photo 1", "Photo 1"], ["Notice\nligne 2"], [])
+    b = main.cle_fusion(["Photo 1", "  Photo   2 "], ["Notice ligne 2"], [""])
+    assert a == b
+    assert a != main.cle_fusion(["Photo 1"], ["Notice ligne 2"], [])
+
+
+def test_prompt_garde_ordre_et_retours_a_la_ligne():
+    messages = main.messages_fusion(["Photo 2", "Photo 1", "Photo 1"], ["Marque : Acme\nModèle : RX-1"], ["", "note"])
+    contenus = [message["content"] for message in messages[1:]]
+    assert contenus == ["Photo 2", "Photo 1", "Photo 1", "Marque : Acme\nModèle : RX-1", "note"]
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.gateway import Disjoncteur, OpenAIIndisponible, Passerelle, SeauJetons
+
+
+def passerelle_semi_ouverte() -> Passerelle:
+    passerelle = Passerelle(api_key="test")
+    passerelle.disjoncteur = Disjoncteur(seuil=1, pause=60)
+    passerelle.disjoncteur.echec()
+    passerelle.disjoncteur.ouvert_jusqua = time.monotonic() - 1
+    assert passerelle.disjoncteur.etat == "semi-ouvert"
+    return passerelle
+
+
+def test_essai_semi_ouvert_annule_libere_le_disjoncteur():
+    async def scenario():
+        passerelle = passerelle_semi_ouverte()
+        lance = asyncio.Event()
+
+        async def appel_lent():
+            lance.set()
+            await asyncio.sleep(10)
+
+        essai = asyncio.create_task(passerelle.appeler(appel_lent))
+        await lance.wait()
+        with pytest.raises(OpenAIIndisponible):
+            passerelle.verifier()
+        essai.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await essai
+
+        # L'essai annulé n'a rien prouvé : un nouvel essai est autorisé
+        passerelle.verifier()
+
+        async def appel_ok():
+            return "ok"
+
+        assert await passerelle.appeler(appel_ok) == "ok"
+        assert passerelle.disjoncteur.etat == "ferme"
+
+    asyncio.run(scenario())
+
+
+def test_ouvert_refuse_sans_appeler():
+    async def scenario():
+        passerelle = Passerelle(api_key="test")
+        passerelle.disjoncteur = Disjoncteur(seuil=1, pause=60)
+        passerelle.disjoncteur.echec()
+        appels = []
+
+        async def appel():
+            appels.append(1)
+
+        with pytest.raises(OpenAIIndisponible):
+            await passerelle.appeler(appel)
+        assert appels == [] and passerelle.refus == 1
+
+    asyncio.run(scenario())
+
+
+def erreur_openai(statut: int):
+    requete = httpx.Request("POST", "http://openai/v1/chat/completions")
+    reponse = httpx.Response(statut, request=requete, headers={"retry-after": "0"})
+    classe = openai.RateLimitError if statut == 429 else openai.InternalServerError
+    return classe("erreur", response=reponse, body=None)
+
+
+def test_429_rejoue_puis_reussit():
+    async def scenario():
+        passerelle = Passerelle(api_key="test")
+        erreurs = [erreur_openai(429)]
+
+        async def appel():
+            if erreurs:
+                raise erreurs.pop()
+            return "ok"
+
+        assert await passerelle.appeler(appel) == "ok"
+        assert passerelle.tentatives == 2 and passerelle.echecs == 0
+
+    asyncio.run(scenario())
+
+
+def test_5xx_non_idempotent_jamais_rejoue():
+    async def scenario():
+        passerelle = Passerelle(api_key="test")
+        appels = []
+
+        async def appel():
+            appels.append(1)
+            raise erreur_openai(500)
+
+        with pytest.raises(Exception):
+            await passerelle.appeler(appel, idempotent=False)
+        assert appels == [1] and passerelle.disjoncteur.echecs == 1
+
+    asyncio.run(scenario())
+
+
+def test_budget_sature_refus_immediat():
+    async def scenario():
+        seau = SeauJetons(60)
+        await seau.prendre(60)
+        with pytest.raises(OpenAIIndisponible):
+            await seau.prendre(30, attente_max=1)
+
+    asyncio.run(scenario())
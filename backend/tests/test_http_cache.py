@@ -0,0 +1,84 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+
+from app import crud, main, migrations
+from app.database import SessionLocal, async_engine
+
+
+# Sans « with » : pas de lifespan (ni jobs, ni préchauffage) ; la fixture base migre la base de test
+http = TestClient(main.app)
+
+
+def test_produit_absent_404_meme_avec_if_none_match(base):
+    reponse = http.get("/products/999999", headers={"If-None-Match": "*"})
+    assert reponse.status_code == 404
+
+
+def test_etag_valide_puis_invalide_apres_ecriture(base):
+    premiere = http.get("/products")
+    etag = premiere.headers["etag"]
+    assert http.get("/products", headers={"If-None-Match": etag}).status_code == 304
+
+    http.post("/products", json={"title": "Perceuse Acme"})
+    apres = http.get("/products", headers={"If-None-Match": etag})
+    assert apres.status_code == 200
+    assert apres.headers["etag"] != etag
+    assert any(produit["title"] == "Perceuse Acme" for produit in apres.json())
+
+
+def test_if_modified_since_dans_la_meme_seconde_ne_masque_pas_une_ecriture(base):
+    lecture = http.get("/products")
+    dernier = lecture.headers["last-modified"]
+    http.post("/products", json={"title": "Scie Acme"})
+    reponse = http.get("/products", headers={"If-Modified-Since": dernier})
+    assert reponse.status_code == 200
+    assert any(produit["title"] == "Scie Acme" for produit in reponse.json())
+
+
+def creer_produit(titre: str) -> int:
+    return http.post("/products", json={"title": titre}).json()["id"]
+
+
+def test_etag_d_une_fiche_inchange_apres_un_autre_ajout(base):
+    produit_id = creer_produit("Ponceuse Acme")
+    etag = http.get(f"/products/{produit_id}").headers["etag"]
+
+    creer_produit("Rabot Acme")
+    assert http.get(f"/products/{produit_id}", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_etag_d_une_fiche_change_apres_sa_reanalyse(base):
+    produit_id = creer_produit("Visseuse Acme")
+    etag = http.get(f"/products/{produit_id}").headers["etag"]
+
+    with SessionLocal() as db:
+        crud.apply_reanalyses_bulk(db, [{"id": produit_id, "resume_ia": "Visseuse 18 V"}], [])
+    reponse = http.get(f"/products/{produit_id}", headers={"If-None-Match": etag})
+    assert reponse.status_code == 200
+    assert reponse.headers["etag"] != etag
+    assert reponse.json()["resume_ia"] == "Visseuse 18 V"
+
+
+def test_lecture_d_une_fiche_en_une_requete(base):
+    produit_id = creer_produit("Cloueur Acme")
+    requetes = []
+
+    def compter(conn, cursor, statement, *args):
+        requetes.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", compter)
+    try:
+        assert http.get(f"/products/{produit_id}").status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", compter)
+    assert len(requetes) == 1
+
+
+def test_migration_ajoute_la_version_aux_anciennes_fiches(tmp_path):
+    ancienne = create_engine(f"sqlite:///{tmp_path}/ancienne.db")
+    with ancienne.begin() as conn:
+        conn.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL)"))
+        conn.execute(text("INSERT INTO products (title) VALUES ('Perceuse')"))
+        migrations.ajouter_colonnes(conn)
+        migrations.ajouter_colonnes(conn)
+        assert conn.execute(text("SELECT version FROM products")).scalar() == 1
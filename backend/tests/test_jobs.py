@@ -0,0 +1,154 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from app import jobs, models
+from app.database import SessionLocal
+
+
+def job_en_cours(attempts: int, bail: timedelta) -> str:
+    job_id = uuid.uuid4().hex
+    with SessionLocal() as db:
+        db.add(models.AnalysisJob(
+            id=job_id, status="running", attempts=attempts, max_attempts=3,
+            payload=json.dumps({"texts": [], "fichiers": []}),
+            lease_until=datetime.utcnow() + bail,
+        ))
+        db.commit()
+    return job_id
+
+
+def lire(job_id: str) -> models.AnalysisJob:
+    with SessionLocal() as db:
+        return db.get(models.AnalysisJob, job_id)
+
+
+def vider_file():
+    with SessionLocal() as db:
+        db.query(models.AnalysisJob).delete()
+        db.commit()
+
+
+def test_bail_expire_repris_si_tentatives_restantes(base):
+    vider_file()
+    job_id = job_en_cours(1, timedelta(seconds=-1))
+    file = jobs.JobQueue(None)
+    assert file._reserver()[0] == job_id
+    job = lire(job_id)
+    assert job.status == "running" and job.attempts == 2
+
+
+def test_bail_expire_sans_tentative_restante_echoue(base):
+    vider_file()
+    job_id = job_en_cours(3, timedelta(seconds=-1))
+    file = jobs.JobQueue(None)
+    assert file._reserver() is None
+    assert file._reserver() is None
+    job = lire(job_id)
+    assert job.status == "failed" and job.attempts == 3
+
+
+def test_bail_prolonge_pendant_le_traitement(base, monkeypatch):
+    vider_file()
+    monkeypatch.setattr(jobs, "JOBS_HEARTBEAT", 0.05)
+    job_id = job_en_cours(1, timedelta(seconds=1))
+    bail_initial = lire(job_id).lease_until
+    baux = []
+
+    async def executer(fichiers, texts):
+        await asyncio.sleep(0.3)
+        baux.append(lire(job_id).lease_until)
+        return {"ok": True}
+
+    asyncio.run(jobs.JobQueue(executer)._traiter(job_id, {"texts": [], "fichiers": []}))
+    assert baux[0] > bail_initial + timedelta(seconds=60)
+    assert lire(job_id).status == "done"
+
+
+def test_options_de_la_requete_transmises_au_job(base):
+    vider_file()
+    recus = []
+
+    async def executer(fichiers, texts, **options):
+        recus.append((texts, options))
+        return {"ok": True}
+
+    async def scenario():
+        file = jobs.JobQueue(executer)
+        job_id = await file.soumettre([], ["note"], options={"doublons": False})
+        await file._traiter(*file._reserver())
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert recus == [(["note"], {"doublons": False})]
+    assert lire(job_id).status == "done"
+
+
+def test_worker_survit_a_une_erreur_de_terminaison(base, monkeypatch):
+    vider_file()
+    monkeypatch.setattr(jobs, "JOBS_POLL", 0.05)
+    terminer = jobs.JobQueue._terminer
+    appels = []
+
+    def terminer_instable(self, job_id, resultat):
+        appels.append(job_id)
+        if len(appels) == 1:
+            raise RuntimeError("database is locked")
+        terminer(self, job_id, resultat)
+
+    monkeypatch.setattr(jobs.JobQueue, "_terminer", terminer_instable)
+
+    async def executer(fichiers, texts, **options):
+        return {"ok": True}
+
+    async def attendre(file, job_id):
+        for _ in range(100):
+            if (await file.lire(job_id)).status == "done":
+                return True
+            await asyncio.sleep(0.02)
+        return False
+
+    async def scenario():
+        file = jobs.JobQueue(executer, workers=1)
+        await file.demarrer()
+        try:
+            await file.soumettre([], ["premier"])
+            for _ in range(100):
+                if appels:
+                    break
+                await asyncio.sleep(0.02)
+            assert not file._workers[0].done()
+            suivant = await file.soumettre([], ["second"])
+            return await attendre(file, suivant)
+        finally:
+            await file.arreter()
+
+    assert asyncio.run(scenario())
+    assert len(appels) == 2
+
+
+def test_arret_remet_le_job_en_file(base):
+    vider_file()
+    demarre = []
+
+    async def executer(fichiers, texts, **options):
+        demarre.append(True)
+        await asyncio.sleep(60)
+        return {"ok": True}
+
+    async def scenario():
+        file = jobs.JobQueue(executer, workers=1)
+        await file.demarrer()
+        job_id = await file.soumettre([], ["long"])
+        for _ in range(100):
+            if demarre:
+                break
+            await asyncio.sleep(0.02)
+        await file.arreter()
+        return job_id, file._reserver()
+
+    job_id, reprise = asyncio.run(scenario())
+    # Repris aussitôt par le processus suivant, sans attendre le bail ni perdre une tentative
+    assert reprise[0] == job_id
+    assert lire(job_id).attempts == 1
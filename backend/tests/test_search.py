@@ -0,0 +1,32 @@
+from app import crud, schemas
+from app.database import SessionLocal
+from app.search import rechercher
+
+
+def ajouter(*titres):
+    with SessionLocal() as db:
+        for titre in titres:
+            crud.create_product(db, schemas.ProductCreate(title=titre, marque="Zorblax"))
+
+
+def test_recherche_par_prefixe_et_filtre(base):
+    ajouter("Tronçonneuse Zorblax ZT-40", "Débroussailleuse Zorblax ZD-20")
+    with SessionLocal() as db:
+        resultat = rechercher(db, "tronconn", {"marque": "Zorblax"})
+    assert resultat["total"] == 1
+    assert resultat["resultats"][0]["title"] == "Tronçonneuse Zorblax ZT-40"
+    assert resultat["facettes"]["marque"] == [{"valeur": "Zorblax", "nombre": 1}]
+
+
+def test_requete_sans_mot_ne_renvoie_rien(base):
+    ajouter("Perforateur Zorblax ZP-10")
+    with SessionLocal() as db:
+        resultat = rechercher(db, "!!!", {})
+        assert resultat["total"] == 0 and resultat["resultats"] == []
+        # Sans q du tout, tout le catalogue reste listé
+        assert rechercher(db, None, {})["total"] > 0
+
+
+def test_syntaxe_fts_neutralisee(base):
+    with SessionLocal() as db:
+        assert rechercher(db, 'ZP-10 "*(', {})["total"] == 1
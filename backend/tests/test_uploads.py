@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app import main, models, uploads
+from app.database import SessionLocal
+
+BOUNDARY = "objex-test"
+
+
+def corps_multipart(fichiers, textes) -> bytes:
+    parties = []
+    for nom, contenu in fichiers:
+        parties.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{nom}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + contenu + b"\r\n"
+        )
+    for texte in textes:
+        parties.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="texts"\r\n\r\n{texte}\r\n'.encode())
+    return b"".join(parties) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def requete(corps: bytes, morceau: int = 4096, longueur: bool = True):
+    # Corps livré par morceaux ; lus compte les messages effectivement consommés
+    messages = [corps[i:i + morceau] for i in range(0, len(corps), morceau)] or [b""]
+    lus = []
+
+    async def recevoir():
+        lus.append(1)
+        index = len(lus) - 1
+        return {"type": "http.request", "body": messages[index], "more_body": index < len(messages) - 1}
+
+    entetes = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if longueur:
+        entetes.append((b"content-length", str(len(corps)).encode()))
+    return Request({"type": "http", "method": "POST", "path": "/analyse", "headers": entetes}, recevoir), lus, messages
+
+
+def test_fichiers_ecrits_et_haches_au_fil_de_l_eau(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    image = os.urandom(50_000)
+    requete_http, _, _ = requete(corps_multipart([("a.jpg", image), ("b.txt", b"notice")], ["note", "autre"]))
+
+    fichiers, champs = asyncio.run(uploads.recevoir_formulaire(requete_http))
+    try:
+        assert [f.filename for f in fichiers] == ["a.jpg", "b.txt"]
+        assert fichiers[0].lire() == image and fichiers[0].taille == len(image)
+        assert fichiers[0].empreinte.hexdigest() == hashlib.sha256(image).hexdigest()
+        assert champs == {"texts": ["note", "autre"]}
+    finally:
+        uploads.supprimer_fichiers(fichiers)
+
+
+def test_content_length_trop_grand_refuse_sans_lire_le_corps(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_REQUETE", 1000)
+    requete_http, lus, _ = requete(corps_multipart([("a.jpg", os.urandom(5000))], []))
+
+    with pytest.raises(HTTPException) as erreur:
+        asyncio.run(uploads.recevoir_formulaire(requete_http))
+    assert erreur.value.status_code == 413
+    assert lus == []
+
+
+def test_fichier_trop_grand_refuse_avant_la_fin_du_corps(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_FICHIER", 10_000)
+    # Sans Content-Length (envoi par morceaux) : la limite s'applique aux octets reçus
+    requete_http, lus, messages = requete(corps_multipart([("a.jpg", os.urandom(100_000))], []), longueur=False)
+
+    with pytest.raises(HTTPException) as erreur:
+        asyncio.run(uploads.recevoir_formulaire(requete_http))
+    assert erreur.value.status_code == 413
+    assert len(lus) < len(messages)
+    assert os.listdir(tmp_path) == []
+
+
+def test_analyse_en_job_recoit_fichiers_et_textes(base, tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    reponse = TestClient(main.app).post(
+        "/analyse?job=true",
+        files=[("files", ("notice.pdf", b"%PDF-factice", "application/pdf"))],
+        data={"texts": ["Perceuse"]},
+    )
+    assert reponse.status_code == 202
+    with SessionLocal() as db:
+        payload = json.loads(db.get(models.AnalysisJob, reponse.json()["job_id"]).payload)
+    assert payload["texts"] == ["Perceuse"]
+    assert [f["filename"] for f in payload["fichiers"]] == ["notice.pdf"]
+    with open(payload["fichiers"][0]["path"], "rb") as f:
+        assert f.read() == b"%PDF-factice"
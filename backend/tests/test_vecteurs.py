@@ -0,0 +1,44 @@
+import httpx
+import numpy as np
+import openai
+from fastapi.testclient import TestClient
+
+from app import main
+from app.ivf import IndexVecteurs, normaliser
+
+http = TestClient(main.app)
+
+
+def test_ivf_retrouve_les_memes_voisins_que_le_parcours_exact():
+    alea = np.random.default_rng(0)
+    centres = normaliser(alea.normal(size=(20, 16)).astype(np.float32))
+    vecteurs = normaliser(centres[alea.integers(0, 20, 4000)] + 0.05 * alea.normal(size=(4000, 16)).astype(np.float32))
+    index = IndexVecteurs(dimensions=16)
+    index.ajouter(list(range(4000)), vecteurs)
+    exacts = [item_id for item_id, _ in index.rechercher(vecteurs[0], 5, exact=True, exclure=0)]
+    index.construire_ivf()
+    assert index.ivf
+    approches = [item_id for item_id, _ in index.rechercher(vecteurs[0], 5, exclure=0)]
+    assert 0 not in approches
+    assert len(set(exacts) & set(approches)) >= 4
+
+
+def test_similaires_desactive_501(base):
+    assert main.VECTEURS_ACTIFS is False
+    assert http.get("/products/1/similar").status_code == 501
+
+
+def test_erreurs_openai_converties(base, monkeypatch):
+    monkeypatch.setattr(main, "VECTEURS_ACTIFS", True)
+    monkeypatch.setattr(main.indexeur_vecteurs, "pret", True)
+    requete = httpx.Request("POST", "http://openai/v1/embeddings")
+    erreurs = {
+        503: openai.APIConnectionError(request=requete),
+        502: openai.BadRequestError("invalide", response=httpx.Response(400, request=requete), body=None),
+    }
+    for statut, erreur in erreurs.items():
+        async def similaires(*args, erreur=erreur):
+            raise erreur
+
+        monkeypatch.setattr(main.indexeur_vecteurs, "similaires", similaires)
+        assert http.get("/products/1/similar").status_code == statut
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import vision
+from app.gateway import OpenAIIndisponible
+
+
+class PasserelleFactice:
+    # Appelle directement la fonction : ni budget, ni disjoncteur
+    def __init__(self, client):
+        self.client = client
+
+    async def appeler(self, fonction, *args, tokens=0, idempotent=True, **kwargs):
+        return await fonction(*args, **kwargs)
+
+
+def assistant_distant(assistant_id: str, version: str, instructions: str = vision.VISION_INSTRUCTIONS):
+    return SimpleNamespace(id=assistant_id, name=vision.VISION_ASSISTANT_NAME, model=vision.VISION_MODEL,
+                           instructions=instructions, metadata={"prompt_version": version})
+
+
+def client_assistants(pages):
+    appels = {"list": [], "create": []}
+
+    async def lister(limit, after=None):
+        appels["list"].append(after)
+        return pages[len(appels["list"]) - 1]
+
+    async def creer(**kwargs):
+        appels["create"].append(kwargs)
+        return SimpleNamespace(id="asst-nouveau")
+
+    client = SimpleNamespace(beta=SimpleNamespace(assistants=SimpleNamespace(list=lister, create=creer)))
+    return client, appels
+
+
+def test_assistant_d_une_autre_version_non_reutilise():
+    ancien = assistant_distant("asst-ancien", "0", instructions="anciennes instructions")
+    client, appels = client_assistants([SimpleNamespace(data=[ancien], has_more=False)])
+    gestionnaire = vision.VisionAssistantManager(PasserelleFactice(client))
+
+    assert asyncio.run(gestionnaire.assistant()) == "asst-nouveau"
+    assert appels["create"][0]["metadata"] == {"prompt_version": vision.VISION_PROMPT_VERSION}
+
+
+def test_assistant_retrouve_au_dela_de_la_premiere_page():
+    autre = assistant_distant("asst-ancien", "0")
+    courant = assistant_distant("asst-courant", vision.VISION_PROMPT_VERSION)
+    client, appels = client_assistants([
+        SimpleNamespace(data=[autre], has_more=True),
+        SimpleNamespace(data=[courant], has_more=False),
+    ])
+    gestionnaire = vision.VisionAssistantManager(PasserelleFactice(client))
+
+    assert asyncio.run(gestionnaire.assistant()) == "asst-courant"
+    assert appels["list"] == [None, "asst-ancien"]
+    assert appels["create"] == []
+
+
+def test_fichier_nettoye_si_l_assistant_est_indisponible():
+    async def lister(limit, after=None):
+        raise OpenAIIndisponible("disjoncteur ouvert", 30)
+
+    client = SimpleNamespace(beta=SimpleNamespace(assistants=SimpleNamespace(list=lister)))
+    gestionnaire = vision.VisionAssistantManager(PasserelleFactice(client))
+
+    async def scenario():
+        with pytest.raises(OpenAIIndisponible):
+            await gestionnaire.analyser("file-1")
+        return gestionnaire._nettoyage.get_nowait()
+
+    assert asyncio.run(scenario()) == ("file", "file-1")
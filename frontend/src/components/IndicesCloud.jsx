@@ -45,37 +45,12 @@ const IndicesCloud = ({ selectedProduct }) => {
     setIndices((prev) => prev.filter((indice) => indice.id !== id));
   };
 
-  const extraireInfos = (ficheTechnique) => {
-    const lignes = ficheTechnique.split("\n").map(l => l.trim());
-
-    const infos = {
-      marque: "Non précisé",
-      modele: "Non précisé",
-      puissance: "Non précisé",
-      dimensions: "Non précisé",
-      indice_protection: "Non précisé",
-      numero_serie: "Non précisé",
-      certifications: "Non précisé",
-      pays_fabrication: "Non précisé",
-      annee_fabrication: "Non précisé",
-      autres: "Non précisé"
-    };
-
-    lignes.forEach(line => {
-      const lower = line.toLowerCase();
-      if (lower.includes("marque")) infos.marque = line.split(":")[1]?.trim() || infos.marque;
-      if (lower.includes("modèle")) infos.modele = line.split(":")[1]?.trim() || infos.modele;
-      if (lower.includes("puissance")) infos.puissance = line.split(":")[1]?.trim() || infos.puissance;
-      if (lower.includes("dimension")) infos.dimensions = line.split(":")[1]?.trim() || infos.dimensions;
-      if (lower.includes("ip")) infos.indice_protection = line.split(":")[1]?.trim() || infos.indice_protection;
-      if (lower.includes("numéro de série")) infos.numero_serie = line.split(":")[1]?.trim() || infos.numero_serie;
-      if (lower.includes("certifications") || lower.includes("certification")) infos.certifications = line.split(":")[1]?.trim() || infos.certifications;
-      if (lower.includes("pays de fabrication")) infos.pays_fabrication = line.split(":")[1]?.trim() || infos.pays_fabrication;
-      if (lower.includes("année de fabrication")) infos.annee_fabrication = line.split(":")[1]?.trim() || infos.annee_fabrication;
-    });
-
-    return infos;
-  };
+  // Affichage des champs structurés reçus pendant le flux (la sortie brute du modèle est du JSON)
+  const rendreChamps = (champs) => [
+    champs.title && `**Titre** : ${champs.title}`,
+    champs.description && `**Description** : ${champs.description}`,
+    champs.fiche_technique && `**Fiche Technique** :\n${champs.fiche_technique}`,
+  ].filter(Boolean).join("\n");
 
   const handleAnalyse = async () => {
     if (indices.length === 0 || isLoading) return;
@@ -90,11 +65,72 @@ const IndicesCloud = ({ selectedProduct }) => {
         }
       });
 
-      const response = await axios.post(`${API_URL}/analyse`, formData, {
-        headers: { "Content-Type": "multipart/form-data" },
+      // Mode flux (SSE) : fichiers, jetons et champs arrivent au fil de l'analyse
+      const response = await fetch(`${API_URL}/analyse?stream=true`, {
+        method: "POST",
+        body: formData,
       });
-      setAnalyseResult(response.data);
-      console.log("analyseResult:", response.data);
+      if (!response.ok || !response.body) {
+        throw new Error(`Réponse HTTP ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let texte = "";
+      let champs = {};
+      let partiel = { title: "", description: "", details: { analyse_fichiers: [], analyse_globale: "" } };
+
+      const appliquerEvenement = (event, data) => {
+        if (event === "fichier") {
+          partiel = {
+            ...partiel,
+            details: { ...partiel.details, analyse_fichiers: [...partiel.details.analyse_fichiers, data] },
+          };
+        } else if (event === "token") {
+          texte += data;
+          if (!texte.trimStart().startsWith("{")) {
+            partiel = { ...partiel, details: { ...partiel.details, analyse_globale: texte } };
+          }
+        } else if (event === "champ") {
+          champs = { ...champs, ...data };
+          partiel = {
+            ...partiel,
+            title: champs.title || partiel.title,
+            description: champs.description || partiel.description,
+          };
+          if (texte.trimStart().startsWith("{")) {
+            partiel = { ...partiel, details: { ...partiel.details, analyse_globale: rendreChamps(champs) } };
+          }
+        } else if (event === "fin") {
+          partiel = data;
+        } else if (event === "erreur") {
+          throw new Error(data.detail);
+        }
+        setAnalyseResult(partiel);
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let separateur;
+        while ((separateur = buffer.indexOf("\n\n")) !== -1) {
+          const bloc = buffer.slice(0, separateur);
+          buffer = buffer.slice(separateur + 2);
+
+          let event = "message";
+          let data = "";
+          bloc.split("\n").forEach((ligne) => {
+            if (ligne.startsWith("event: ")) event = ligne.slice(7);
+            else if (ligne.startsWith("data: ")) data += ligne.slice(6);
+          });
+          appliquerEvenement(event, JSON.parse(data));
+        }
+      }
+
+      console.log("analyseResult:", partiel);
       setIndices([]);
     } catch (error) {
       console.error("Erreur lors de l'analyse", error);
@@ -116,29 +152,15 @@ const IndicesCloud = ({ selectedProduct }) => {
   };
 
   const handleSaveAnalysis = async () => {
-    if (!analyseResult) return;
-
-    const ficheTechnique = analyseResult.fiche_technique 
-                        || analyseResult.details?.analyse_globale 
-                        || "";
-    const infosTechniques = extraireInfos(ficheTechnique);
+    if (!analyseResult?.produit) return;
+    if (analyseResult.doublon) {
+      // Objet déjà en base : la fiche existante a été renvoyée, rien à créer
+      alert(`Produit déjà enregistré (n° ${analyseResult.doublon.product_id}) ✅`);
+      return;
+    }
 
-    const productToSave = {
-      title: analyseResult.title || "Produit sans titre",
-      description: analyseResult.description || "Pas de description disponible",
-      fiche_technique: ficheTechnique,
-      resume_ia: analyseResult.details?.analyse_globale || "", 
-      marque: infosTechniques.marque,
-      modele: infosTechniques.modele,
-      puissance: infosTechniques.puissance,
-      dimensions: infosTechniques.dimensions,
-      indice_protection: infosTechniques.indice_protection,
-      numero_serie: infosTechniques.numero_serie,
-      certifications: infosTechniques.certifications,
-      pays_fabrication: infosTechniques.pays_fabrication,
-      annee_fabrication: infosTechniques.annee_fabrication,
-      autres_caracteristiques: infosTechniques.autres,
-    };
+    // Fiche déjà structurée par le serveur (sortie JSON du modèle) : envoyée telle quelle
+    const productToSave = analyseResult.produit;
 
     try {
       await axios.post(`${API_URL}/save_analysis`, productToSave);
@@ -254,7 +276,7 @@ const IndicesCloud = ({ selectedProduct }) => {
         </div>
       )}
 
-      {analyseResult && (
+      {analyseResult?.message && (
         <div className="absolute bottom-8 flex justify-center z-10">
           <button
             onClick={handleSaveAnalysis}
@@ -3,18 +3,30 @@ import axios from "axios";
 import { motion } from "framer-motion";
 import { Link } from "react-router-dom";
 
+const PAGE_SIZE = 30;
+
 export default function ProductList() {
   const [products, setProducts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
-    async function fetchProducts() {
-      try {
-        const res = await axios.get("http://localhost:8000/products");
-        setProducts(res.data);
-      } catch (error) {
-        console.error("Erreur chargement produits:", error);
-      }
+  // Seuls les champs affichés sont demandés ; la page suivante part du dernier id reçu
+  async function fetchProducts(cursor = null) {
+    try {
+      const res = await axios.get("http://localhost:8000/products", {
+        params: {
+          fields: "id,title,description",
+          limit: PAGE_SIZE,
+          ...(cursor !== null ? { cursor } : {}),
+        },
+      });
+      setProducts((prev) => (cursor !== null ? [...prev, ...res.data] : res.data));
+      setNextCursor(res.headers["x-next-cursor"] ?? null);
+    } catch (error) {
+      console.error("Erreur chargement produits:", error);
     }
+  }
+
+  useEffect(() => {
     fetchProducts();
   }, []);
 
@@ -32,6 +44,16 @@ export default function ProductList() {
           </Link>
         </motion.div>
       ))}
+      {nextCursor !== null && (
+        <div className="col-span-full flex justify-center">
+          <button
+            onClick={() => fetchProducts(nextCursor)}
+            className="bg-blue-500 text-white px-6 py-2 rounded-full hover:bg-blue-600 shadow"
+          >
+            Charger plus
+          </button>
+        </div>
+      )}
     </div>
   );
 }
\ No newline at end of file